@@ -0,0 +1,163 @@
+"""
+answer_cache.py
+
+In-memory cache of LLM answers for repeated and near-duplicate questions.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from itertools import count
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_signature(results: list) -> frozenset:
+    """
+    Identifies the set of chunks retrieved for a question.
+    """
+    return frozenset(
+        (res['chunk']['pdf_name'], res['chunk']['page'], res['chunk']['chunk_id'])
+        for res in results
+    )
+
+
+class AnswerCache:
+    """
+    Returns a stored answer when a new question of the same project retrieved the same set
+    of chunks and its embedding is within `max_distance` cosine distance of a cached question.
+    Entries expire after `ttl_seconds`, the least recently used ones are evicted above
+    `max_entries`, and a project's entries are dropped when it is re-ingested or deleted.
+
+    The answers are kept in the memory of each process. With a `db_path`, every
+    invalidation also bumps the project's generation in SQLite, and entries stored under
+    an older generation are dropped on lookup, so an invalidation made by one server
+    worker or command-line tool reaches the caches of all the others.
+    """
+
+    def __init__(self, max_distance: float = 0.05, max_entries: int = 1000, ttl_seconds: float = 86400, db_path: str = None):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        # entry_id -> (project_id, signature, unit question vector, answer, created_at, generation)
+        self._entries = OrderedDict()
+        # (project_id, signature) -> entry_ids
+        self._by_signature = {}
+        self._ids = count()
+        self._lock = threading.Lock()
+
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            with self._connect() as conn, conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS generations (
+                        project_id TEXT PRIMARY KEY,
+                        generation INTEGER NOT NULL
+                    )
+                """)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def _generation(self, project_id: str) -> int:
+        """
+        Returns how many times the project's answers were invalidated by any process.
+        """
+        if not self.db_path:
+            return 0
+        with self._connect() as conn:
+            row = conn.execute("SELECT generation FROM generations WHERE project_id = ?", (project_id,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, project_id: str, question_vector, signature: frozenset):
+        """
+        Returns the cached answer of the closest matching question, or None.
+        """
+        query = self._unit(question_vector)
+        now = time.time()
+        generation = self._generation(project_id)
+        with self._lock:
+            best_id, best_similarity = None, 1 - self.max_distance
+            for entry_id in list(self._by_signature.get((project_id, signature), ())):
+                _, _, vector, _, created_at, entry_generation = self._entries[entry_id]
+                if now - created_at > self.ttl_seconds or entry_generation != generation:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(np.dot(query, vector))
+                if similarity >= best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id][3]
+
+    def put(self, project_id: str, question_vector, signature: frozenset, answer: str):
+        """
+        Stores the answer to a question.
+        """
+        generation = self._generation(project_id)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (
+                project_id, signature, self._unit(question_vector), answer, time.time(), generation
+            )
+            self._by_signature.setdefault((project_id, signature), set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_project(self, project_id: str):
+        """
+        Drops every cached answer of the project, in every process sharing `db_path`.
+        """
+        if self.db_path:
+            with self._connect() as conn, conn:
+                conn.execute(
+                    "INSERT INTO generations (project_id, generation) VALUES (?, 1) "
+                    "ON CONFLICT (project_id) DO UPDATE SET generation = generation + 1",
+                    (project_id,)
+                )
+        with self._lock:
+            for entry_id in [eid for eid, entry in self._entries.items() if entry[0] == project_id]:
+                self._remove(entry_id)
+        logger.info(f"Invalidated cached answers of project '{project_id}'")
+
+    def _remove(self, entry_id: int):
+        project_id, signature, _, _, _, _ = self._entries.pop(entry_id)
+        entry_ids = self._by_signature[(project_id, signature)]
+        entry_ids.discard(entry_id)
+        if not entry_ids:
+            del self._by_signature[(project_id, signature)]
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters and the number of cached answers.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -6,21 +6,39 @@ Main Flask application, routes, and SocketIO setup.
 
 import config
 import os
+import json
 import uuid
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_socketio import SocketIO, emit
 from werkzeug.utils import secure_filename
 
 import openai
-import nltk
-from sentence_transformers import SentenceTransformer
 import qdrant_client
 
 # Import our modules
-from pdf_processor import PDFProcessor
-from qdrant_manager import QdrantManager
+from pdf_processor import PDFProcessor, chunking_options, extraction_options
+from embedding_backends import cache_model_name, load_embedding_model, token_budget, token_counter
+from embedding_pool import EmbeddingPool
+from qdrant_manager import QdrantManager, SharedQdrantManager
+from faiss_manager import FaissManager
+from ingestion_pipeline import IngestionPipeline
+from document_registry import DocumentRegistry, file_content_hash
+from project_registry import ProjectRegistry
+from page_store import PageStore
+from embedding_cache import EmbeddingCache, CachedEncoder
+from embedding_batcher import EmbeddingBatcher
+from job_queue import JobQueue, JobReporter, QueueFullError
+from lexical_index import LexicalIndex, load_stopwords
+from retrieval import HybridRetriever
+from vector_store import Collection, SearchFilter
+from context_packer import pack_prompt
+from answer_cache import AnswerCache, chunk_signature
+from metrics import MetricsRegistry, span
+from startup import Lazy, ensure_nltk_data, log_startup
 
 # -----------------------------------------------------------------------------
 #                         NLTK and Logging Configuration
@@ -28,8 +46,15 @@ from qdrant_manager import QdrantManager
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-nltk.download('punkt_tab')
-nltk.download("punkt")
+import_started = time.perf_counter()
+
+# Checks the local tokenizer data first, the network is only used for missing data
+ensure_nltk_data(('punkt_tab', 'punkt'), data_dir=config.NLTK_DATA_DIR, download=config.NLTK_DOWNLOAD)
+try:
+    ensure_nltk_data(('corpora/stopwords',), data_dir=config.NLTK_DATA_DIR, download=config.NLTK_DOWNLOAD)
+except RuntimeError as e:
+    # Keyword search works without it, its queries then keep their stopwords
+    logger.warning(str(e))
 
 # -----------------------------------------------------------------------------
 #                           Flask & SocketIO Setup
@@ -46,24 +71,249 @@ socketio = SocketIO(
 )
 
 # -----------------------------------------------------------------------------
-#                       Model and Qdrant Configuration
+#                     Model and Vector Store Configuration
 # -----------------------------------------------------------------------------
+# The model and the clients are created on first use, or by load_components() at startup
+
+# Processes encoding the chunks of every ingestion job, see start_embedding_pool()
+embedding_pool = None
+
+# Same encode() API whichever inference backend is configured
+model = Lazy('embedding model', lambda: load_embedding_model(
+    config.SENTENCE_TRANSFORMER,
+    config.EMBEDDING_BACKEND,
+    quantization=config.EMBEDDING_ONNX_QUANTIZATION,
+    threads=config.EMBEDDING_THREADS,
+    export_folder=config.EMBEDDING_ONNX_FOLDER
+))
+
+# Chunk sizes are measured with the model's tokenizer, see config.CHUNK_SIZE_UNIT.
+# Holds the model's token budget and a token counter
+tokenization = Lazy('tokenizer', lambda: (token_budget(model), token_counter(model)))
+
+# Encoder used for chunks and questions, served from the embedding cache when enabled
+if config.EMBEDDING_CACHE_ENABLED:
+    embedding_cache = EmbeddingCache(
+        config.EMBEDDING_CACHE_DB,
+        # Backends produce slightly different vectors, so each gets its own entries
+        cache_model_name(config.SENTENCE_TRANSFORMER, config.EMBEDDING_BACKEND, config.EMBEDDING_ONNX_QUANTIZATION),
+        config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+    )
+    encoder = CachedEncoder(model, embedding_cache)
+else:
+    embedding_cache = None
+    encoder = model
+
+# Answers reused for repeated and near-duplicate questions
+answer_cache = AnswerCache(
+    max_distance=config.ANSWER_CACHE_MAX_DISTANCE,
+    max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+    db_path=config.ANSWER_CACHE_DB
+) if config.ANSWER_CACHE_ENABLED else None
+
+# Concurrent question encodes share batched forward passes
+query_batcher = EmbeddingBatcher(
+    encoder,
+    max_wait_ms=config.QUERY_BATCH_WAIT_MS,
+    max_batch_size=config.QUERY_BATCH_MAX_SIZE
+)
+
 
-model = SentenceTransformer(config.SENTENCE_TRANSFORMER)
-qdrant = qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT))
+def create_vector_store():
+    """
+    Creates the vector store of the configured backend.
+    """
+    if config.VECTOR_STORE == 'faiss':
+        return FaissManager(
+            config.FAISS_INDEX_FOLDER,
+            model,
+            large_index_type=config.FAISS_LARGE_INDEX_TYPE,
+            large_index_threshold=config.FAISS_LARGE_INDEX_THRESHOLD,
+            hnsw_ef_search=config.FAISS_HNSW_EF_SEARCH,
+            ivf_nprobe=config.FAISS_IVF_NPROBE,
+            use_mmap=config.FAISS_MMAP
+        )
+    qdrant = qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT))
+    settings = dict(
+        storage_profiles=config.STORAGE_PROFILES,
+        default_profile=config.DEFAULT_STORAGE_PROFILE,
+        rescore=config.SEARCH_RESCORE,
+        oversampling=config.SEARCH_OVERSAMPLING,
+        upsert_max_points=config.UPSERT_MAX_POINTS,
+        upsert_max_bytes=config.UPSERT_MAX_BYTES,
+        upsert_in_flight=config.UPSERT_IN_FLIGHT,
+        upsert_retries=config.UPSERT_RETRIES,
+        upsert_backoff=config.UPSERT_RETRY_BACKOFF_SECONDS
+    )
+    if config.QDRANT_LAYOUT == 'shared':
+        return SharedQdrantManager(qdrant, model, collection_name=config.SHARED_COLLECTION, **settings)
+    return QdrantManager(qdrant, model, **settings)
+
+
+vector_store = Lazy('vector store', create_vector_store)
+
+# Documents and chunk points stored in each project
+document_registry = DocumentRegistry(config.DOCUMENT_REGISTRY_DB)
+
+# Extracted pages of the ingested PDFs, chunked again without parsing the PDF
+page_store = PageStore(config.PAGE_STORE_DB, config.PAGE_STORE_COMPRESSION_LEVEL) if config.PAGE_STORE_ENABLED else None
+
+# Project list used by the routes, filled from the vector store the first time it is read
+project_registry = ProjectRegistry(
+    config.PROJECT_REGISTRY_DB,
+    ttl_seconds=config.PROJECT_REGISTRY_TTL_SECONDS,
+    seed=lambda: [collection.name for collection in vector_store.get_collections()]
+)
 
-# Create our Qdrant manager
-qdrant_manager = QdrantManager(qdrant, model)
+# BM25 keyword index searched alongside the vector store
+lexical_index = LexicalIndex(
+    config.LEXICAL_INDEX_DB,
+    stopwords=load_stopwords(config.LEXICAL_STOPWORD_LANGUAGES),
+    min_term_length=config.LEXICAL_MIN_TERM_LENGTH
+)
+retriever = HybridRetriever(
+    vector_store,
+    lexical_index,
+    dense_candidates=config.DENSE_CANDIDATES,
+    lexical_candidates=config.LEXICAL_CANDIDATES,
+    result_limit=config.RETRIEVAL_RESULTS,
+    rrf_k=config.RRF_K,
+    lexical_min_score=config.LEXICAL_MIN_SCORE
+)
 
 # -----------------------------------------------------------------------------
 #                      OpenAI Configuration (unchanged)
 # -----------------------------------------------------------------------------
 OPEN_AI_ORG_ID = os.getenv('OPEN_AI_ORG_ID')
 OPEN_AI_API_KEY = os.getenv('OPEN_AI_API_KEY')
+# Points the client at another OpenAI-compatible endpoint, e.g. completion_stub.py
+OPEN_AI_BASE_URL = os.getenv('OPEN_AI_BASE_URL')
 openai.organization = OPEN_AI_ORG_ID
 
 # Keep the custom client usage as requested
-open_ai_client = openai.Client(api_key=OPEN_AI_API_KEY)
+open_ai_client = Lazy('OpenAI client', lambda: openai.Client(api_key=OPEN_AI_API_KEY, base_url=OPEN_AI_BASE_URL))
+
+# -----------------------------------------------------------------------------
+#                                Startup
+# -----------------------------------------------------------------------------
+WARM_UP_TEXT = "What does this document say about warm-up? It is a short question. It has three sentences."
+
+
+def embedding_pool_workers(server_workers: int) -> int:
+    """
+    Returns the embedding processes of one of `server_workers` server processes: its
+    share of EMBEDDING_POOL_WORKERS, which counts the processes of the whole server, and
+    no more than its share of the cores. Every server process gets at least one.
+    """
+    share = config.EMBEDDING_POOL_WORKERS // server_workers
+    cores = (os.cpu_count() or 1) // (server_workers * config.EMBEDDING_POOL_THREADS)
+    return max(1, min(share, cores))
+
+
+def start_embedding_pool(server_workers: int = 1):
+    """
+    Forks the embedding processes of the ingestion jobs when EMBEDDING_POOL_WORKERS is
+    set. It must run before the process runs the model or starts threads, so the server
+    calls it first thing, and gunicorn calls it in every worker right after the fork,
+    with the number of workers sharing the host, see embedding_pool_workers.
+    """
+    global embedding_pool
+    if config.EMBEDDING_POOL_WORKERS > 0 and embedding_pool is None:
+        workers = embedding_pool_workers(server_workers)
+        logger.info(f"Starting {workers} embedding processes in server process {os.getpid()}")
+        embedding_pool = EmbeddingPool(
+            config.SENTENCE_TRANSFORMER,
+            config.EMBEDDING_BACKEND,
+            quantization=config.EMBEDDING_ONNX_QUANTIZATION,
+            workers=workers,
+            threads_per_worker=config.EMBEDDING_POOL_THREADS,
+            min_slice_size=config.EMBEDDING_POOL_SLICE_SIZE,
+            # The pools of several server processes would pin their processes to the same cores
+            pin_threads=server_workers == 1,
+            export_folder=config.EMBEDDING_ONNX_FOLDER
+        )
+
+
+def ingestion_encoder():
+    """
+    Returns the encoder of the ingestion jobs: the embedding pool when it is running,
+    else the app's model, behind the embedding cache when it is enabled.
+    """
+    source = embedding_pool if embedding_pool is not None else model
+    return CachedEncoder(source, embedding_cache) if embedding_cache is not None else source
+
+
+def load_components(include_model: bool = True):
+    """
+    Creates the lazily initialized components now instead of on their first request.
+    """
+    components = [vector_store, open_ai_client]
+    if include_model:
+        components = [model, tokenization] + components
+    for component in components:
+        component.get()
+
+
+def warm_up():
+    """
+    Runs a short text through the sentence tokenizer, the token counter and the model,
+    so the first request does not pay for their first-call setup.
+    """
+    started = time.perf_counter()
+    sentences = PDFProcessor.chunk_text(WARM_UP_TEXT, max_words=8, overlap_sentences=0)
+    _, count_tokens = tokenization.get()
+    count_tokens(sentences)
+    model.encode(sentences, convert_to_numpy=True)
+    logger.info(f"Warmed up in {time.perf_counter() - started:.2f}s")
+
+
+# Shared by all /query_batch requests so the limit holds across concurrent batches
+llm_executor = ThreadPoolExecutor(max_workers=config.QUERY_BATCH_LLM_CONCURRENCY, thread_name_prefix='llm')
+
+# -----------------------------------------------------------------------------
+#                                Metrics
+# -----------------------------------------------------------------------------
+metrics = MetricsRegistry()
+QUERY_STAGE_SECONDS = metrics.histogram(
+    'pdf_query_stage_seconds', 'Latency of each query stage', ('route', 'stage')
+)
+QUERY_TTFT_SECONDS = metrics.histogram(
+    'pdf_query_time_to_first_token_seconds', 'Time from a streamed question to its first answer token'
+)
+QUERIES = metrics.counter('pdf_queries_total', 'Questions answered by route and outcome', ('route', 'outcome'))
+INGEST_STAGE_SECONDS = metrics.histogram(
+    'pdf_ingest_stage_seconds', 'Time spent in each stage of a PDF ingestion', ('stage',)
+)
+INGESTED_DOCUMENTS = metrics.counter('pdf_ingested_documents_total', 'Processed PDFs by outcome', ('outcome',))
+INGESTED_PAGES = metrics.counter('pdf_ingested_pages_total', 'PDF pages extracted')
+INGESTED_CHUNKS = metrics.counter('pdf_ingested_chunks_total', 'Chunks cut from ingested PDFs')
+UPSERTED_POINTS = metrics.counter('pdf_upserted_points_total', 'Points embedded and written to the vector store')
+CHUNK_TOKENS = metrics.counter('pdf_chunk_tokens_total', 'Embedding-model tokens of the ingested chunks')
+TRUNCATED_CHUNKS = metrics.counter('pdf_truncated_chunks_total', 'Ingested chunks longer than the embedding model reads')
+LLM_TOKENS = metrics.counter('pdf_llm_tokens_total', 'Tokens billed by the LLM', ('kind',))
+metrics.callback(
+    'pdf_embedding_cache_lookups_total', 'Embedding cache lookups by result',
+    lambda: {('hit',): embedding_cache.hits, ('miss',): embedding_cache.misses} if embedding_cache is not None else {},
+    ('result',), 'counter'
+)
+metrics.callback(
+    'pdf_answer_cache_lookups_total', 'Answer cache lookups by result',
+    lambda: {('hit',): answer_cache.hits, ('miss',): answer_cache.misses} if answer_cache is not None else {},
+    ('result',), 'counter'
+)
+metrics.callback(
+    'pdf_ingestion_jobs_queued', 'Ingestion jobs waiting for a worker',
+    lambda: {(): job_queue.queued_count()}
+)
+
+
+def response_timings(timings: dict):
+    """
+    Returns the per-stage timings to put in a JSON response, or None when they are disabled.
+    """
+    return timings if config.METRICS_RESPONSE_TIMINGS else None
+
 
 # -----------------------------------------------------------------------------
 #                           Upload Folder Config
@@ -79,11 +329,16 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB limit
 @app.route('/')
 def home():
     """
-    Renders the home page with a list of existing Qdrant collections (projects).
+    Renders the home page with a list of the existing projects.
     """
     try:
-        projects = qdrant_manager.get_collections()
-        return render_template('index.html', projects=projects)
+        projects = [Collection(name=name) for name in project_registry.list()]
+        return render_template(
+            'index.html',
+            projects=projects,
+            storage_profiles=list(config.STORAGE_PROFILES),
+            default_storage_profile=config.DEFAULT_STORAGE_PROFILE
+        )
     except Exception as e:
         logger.error(f"Error fetching projects: {e}")
         return jsonify({"error": f"Error fetching projects: {str(e)}"}), 500
@@ -99,28 +354,84 @@ def delete_project():
         if not project_id:
             return jsonify({"error": "Project ID is required."}), 400
 
-        existing = [c.name for c in qdrant_manager.get_collections()]
-        if project_id not in existing:
+        if not project_registry.exists(project_id):
             return jsonify({"error": f"Project '{project_id}' does not exist."}), 404
 
-        qdrant_manager.delete_collection(project_id)
+        vector_store.delete_collection(project_id)
+        project_registry.remove(project_id)
+        document_registry.delete_project(project_id)
+        lexical_index.delete_project(project_id)
+        if answer_cache is not None:
+            answer_cache.invalidate_project(project_id)
         return jsonify({"message": f"Project '{project_id}' has been successfully deleted."}), 200
     except Exception as e:
         logger.error(f"Error deleting project: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+def remove_document(project_id: str, pdf_name: str):
+    """
+    Deletes a document's points from the vector store and the keyword index and forgets it.
+    """
+    vector_store.delete_document(project_id, pdf_name)
+    lexical_index.delete_document(project_id, pdf_name)
+    document_registry.delete_document(project_id, pdf_name)
+    if answer_cache is not None:
+        answer_cache.invalidate_project(project_id)
+
+
+@app.route('/documents', methods=['GET'])
+def list_documents():
+    """
+    Returns the documents stored in a project.
+    """
+    project_id = request.args.get('project_id')
+    if not project_id:
+        return jsonify({"error": "Project ID is required."}), 400
+    return jsonify({"documents": document_registry.list_documents(project_id)}), 200
+
+
+@app.route('/delete_document', methods=['POST'])
+def delete_document():
+    """
+    Removes a single PDF from a project. To replace a PDF, upload the new revision under
+    the same file name, or with its name in the upload's "replaces" field.
+    """
+    project_id = request.form.get('project_id')
+    pdf_name = request.form.get('pdf_name')
+    if not project_id or not pdf_name:
+        return jsonify({"error": "Project ID and PDF name are required."}), 400
+
+    try:
+        if not project_registry.exists(project_id):
+            return jsonify({"error": f"Project '{project_id}' does not exist."}), 404
+
+        remove_document(project_id, pdf_name)
+        logger.info(f"Deleted document '{pdf_name}' from project '{project_id}'")
+        return jsonify({"message": f"Document '{pdf_name}' has been deleted from '{project_id}'."}), 200
+    except Exception as e:
+        logger.error(f"Error deleting document: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/add_project', methods=['POST'])
 def add_project():
     """
-    Create a new Qdrant collection (project).
+    Create a new Qdrant collection (project) with the selected storage profile.
     """
     project_id = request.form.get('project_id')
+    storage_profile = request.form.get('storage_profile') or config.DEFAULT_STORAGE_PROFILE
     if not project_id:
         return jsonify({"error": "Project ID is required."}), 400
+    if storage_profile not in config.STORAGE_PROFILES:
+        return jsonify({"error": f"Unknown storage profile '{storage_profile}'."}), 400
+
+    if project_registry.exists(project_id):
+        return jsonify({"error": f"Project '{project_id}' already exists."}), 409
 
     try:
-        qdrant_manager.create_collection(project_id)
+        vector_store.create_collection(project_id, storage_profile)
+        project_registry.add(project_id, storage_profile)
         return jsonify({"message": f"Project '{project_id}' has been successfully created."}), 200
     except Exception as e:
         logger.error(f"Error creating project: {e}")
@@ -139,11 +450,14 @@ def show_upload_pdf_form():
 @app.route('/upload_pdf', methods=['POST'])
 def upload_pdf():
     """
-    Handle PDF upload and start background processing via SocketIO.
+    Handle PDF upload and queue it for background processing.
+    Progress is sent to the optional socket_id and can be polled at /jobs/<job_id>.
     """
     project_id = request.form.get('project_id')
     pdf_file = request.files.get('file')
     socket_id = request.form.get('socket_id')
+    # Name of an older document that this PDF supersedes, deleted once it is ingested
+    replaces = request.form.get('replaces') or None
 
     logger.info(f"Received upload request for project_id: {project_id} from socket_id: {socket_id}")
 
@@ -153,14 +467,15 @@ def upload_pdf():
     if not pdf_file:
         logger.warning("No PDF file uploaded.")
         return jsonify({"error": "No PDF uploaded."}), 400
-    if not socket_id:
-        logger.warning("No Socket ID provided.")
-        return jsonify({"error": "No socket ID provided for progress updates."}), 400
     if not pdf_file.filename.lower().endswith('.pdf'):
         logger.warning("Uploaded file is not a PDF.")
         return jsonify({"error": "Uploaded file is not a PDF."}), 400
+    if job_queue.queued_count() >= job_queue.max_queued:
+        logger.warning("Ingestion queue is full.")
+        return jsonify({"error": "Too many uploads are waiting, please retry later."}), 429
 
     try:
+        expire_failed_uploads()
         filename = secure_filename(pdf_file.filename)
         unique_id = str(uuid.uuid4())
         saved_filename = f"{unique_id}_{filename}"
@@ -168,87 +483,185 @@ def upload_pdf():
         pdf_file.save(save_path)
         logger.info(f"Saved PDF file to {save_path}")
 
-        # Start background task for processing
-        socketio.start_background_task(
-            process_pdf,
-            project_id,
-            pdf_file.filename,
-            save_path,
-            socket_id
-        )
-        logger.info(f"Started background task for processing PDF: {save_path}")
-
-        return jsonify({"message": "PDF upload successful and processing started."}), 200
+        # Queue the job for processing
+        try:
+            job_id = job_queue.submit(
+                project_id,
+                pdf_file.filename,
+                socket_id=socket_id,
+                pdf_path=save_path,
+                replaces=replaces
+            )
+        except QueueFullError as e:
+            os.remove(save_path)
+            logger.warning(str(e))
+            return jsonify({"error": "Too many uploads are waiting, please retry later."}), 429
+        logger.info(f"Queued job {job_id} for processing PDF: {save_path}")
+
+        return jsonify({
+            "message": "PDF upload successful and processing queued.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}"
+        }), 202
     except Exception as e:
         error_message = f"Error processing PDF: {str(e)}"
         logger.error(error_message)
         return jsonify({"error": error_message}), 500
 
 
-def process_pdf(project_id: str, original_file_name: str, pdf_path: str, socket_id: str):
+def process_pdf(reporter: JobReporter, project_id: str, original_file_name: str, pdf_path: str, replaces: str = None):
     """
-    Background thread function to chunk, embed, and upload the PDF content to Qdrant.
+    Ingestion job to chunk, embed, and upload the PDF content to Qdrant.
+    The stages run as a streaming pipeline, see IngestionPipeline. Progress is reported
+    through the job's reporter, which also forwards it to the uploader's socket.
+    The time spent in each stage is recorded in the metrics and in the job.
+
+    When `replaces` names another document of the project, that document is deleted
+    once this one is stored.
+
+    Stored chunks are checkpointed in the job. If the job fails, the PDF is kept for
+    FAILED_JOB_RETENTION_HOURS so the job can be resumed at /jobs/<job_id>/resume without
+    embedding those chunks again.
+
+    The extracted pages are saved in the page store, so a file that was uploaded before
+    is chunked from there without parsing the PDF.
     """
+    started = time.perf_counter()
+    stages = {}
+    keep_file = False
     try:
-        socketio.emit('processing_progress', {'progress': 0}, room=socket_id)
-        socketio.emit('status', {'message': 'Starting PDF processing...'}, room=socket_id)
-
-        # Ensure Qdrant collection
-        qdrant_manager.ensure_collection_exists(project_id)
+        reporter.emit('processing_progress', {'progress': 0})
+        reporter.emit('status', {'message': 'Starting PDF processing...'})
+        if not os.path.exists(pdf_path):
+            reporter.emit('processing_error', {'message': 'The uploaded PDF is no longer available, please upload it again'})
+            return
 
-        # Chunk PDF
-        pdf_chunks = PDFProcessor.chunk_pdf_text(
+        with span(INGEST_STAGE_SECONDS, stages, stage='prepare'):
+            # Ensure Qdrant collection
+            vector_store.ensure_collection_exists(project_id)
+            project_registry.add(project_id)
+
+            # Skip documents that are already stored unchanged
+            pdf_name = PDFProcessor.pretty_print_filename(original_file_name)
+            content_hash = file_content_hash(pdf_path)
+            unchanged = document_registry.get_content_hash(project_id, pdf_name) == content_hash
+        if unchanged:
+            INGESTED_DOCUMENTS.inc(outcome='unchanged')
+            logger.info(f"'{original_file_name}' is unchanged in project '{project_id}', skipping")
+            reporter.emit('processing_progress', {'progress': 100})
+            reporter.emit('processing_complete', {
+                'message': 'PDF is already up to date'
+            })
+            return
+        existing_points = document_registry.get_chunk_points(project_id, pdf_name)
+        # Chunks stored by a previous run of this job
+        checkpoint = reporter.load_checkpoint()
+        if checkpoint:
+            logger.info(f"Resuming '{original_file_name}' with {len(checkpoint)} chunks already stored")
+            reporter.emit('status', {'message': f'Resuming with {len(checkpoint)} chunks already stored...'})
+
+        # Chunk, embed and upload the PDF as a stream of batches
+        token_limit, count_tokens = tokenization.get()
+        chunking_stats = {}
+        # A file uploaded before, to any project, is not parsed again
+        stored_pages = page_store.load(content_hash, config.PDF_TEXT_ENGINE) if page_store is not None else None
+        # Pages extracted from the PDF are written to the page store as they come
+        page_writer = page_store.writer(content_hash, config.PDF_TEXT_ENGINE) if page_store is not None and stored_pages is None else None
+        if stored_pages is not None:
+            logger.info(f"Read the {len(stored_pages)} pages of '{original_file_name}' from the page store")
+        pdf_chunks = PDFProcessor.iter_pdf_chunks(
             pdf_file_path=pdf_path,
             original_file_name=original_file_name,
-            socketio_instance=socketio,
-            socket_id=socket_id,
-            max_words=300,
-            overlap_sentences=1
+            socketio_instance=reporter,
+            socket_id=reporter.socket_id,
+            stats=chunking_stats,
+            pages=stored_pages,
+            page_sink=page_writer,
+            **chunking_options(token_limit, count_tokens),
+            **extraction_options()
         )
-
-        if not pdf_chunks:
-            socketio.emit('processing_error', {'message': 'No text could be extracted from PDF'}, room=socket_id)
-            return
-
-        socketio.emit('status', {'message': 'Generating embeddings...'}, room=socket_id)
-
-        # Embed chunk texts
-        chunk_texts = [chunk['text'] for chunk in pdf_chunks]
-        embeddings = model.encode(chunk_texts).astype('float32').tolist()
-
-        socketio.emit('status', {'message': 'Uploading to Qdrant...'}, room=socket_id)
-
-        # Prepare points
-        points = []
-        for chunk, embedding in zip(pdf_chunks, embeddings):
-            points.append({
-                "id": str(uuid.uuid4()),
-                "vector": embedding,
-                "payload": {
-                    "pdf_name": chunk['pdf_name'],
-                    "page": chunk['page'],
-                    "chunk_id": chunk['chunk_id'],
-                    "text": chunk['text']
-                }
+        pipeline = IngestionPipeline(
+            ingestion_encoder(),
+            vector_store,
+            reporter,
+            reporter.socket_id,
+            batch_size=config.INGESTION_BATCH_SIZE,
+            queue_size=config.INGESTION_QUEUE_SIZE,
+            lexical_index=lexical_index,
+            checkpoint=reporter.checkpoint if vector_store.writes_through else None
+        )
+        with span(INGEST_STAGE_SECONDS, stages, stage='pipeline'):
+            stats = pipeline.run(project_id, pdf_chunks, content_hash, {**existing_points, **checkpoint})
+        logger.info(f"Ingestion stats for '{original_file_name}': {stats}")
+        if page_writer is not None:
+            page_writer.finish()
+
+        # Busy time of each pipeline stage, they overlap in the pipeline time
+        for stage, key in (('extract_chunk', 'chunk_seconds'), ('embed', 'embed_seconds'), ('upsert', 'upsert_seconds')):
+            INGEST_STAGE_SECONDS.observe(stats[key], stage=stage)
+            stages[f"{stage}_ms"] = stats[key] * 1000
+        INGESTED_PAGES.inc(chunking_stats.get('pages', 0))
+        INGESTED_CHUNKS.inc(chunking_stats.get('chunks', 0))
+        UPSERTED_POINTS.inc(stats['upserted'])
+        CHUNK_TOKENS.inc(chunking_stats.get('tokens', 0))
+        TRUNCATED_CHUNKS.inc(chunking_stats.get('truncated_chunks', 0))
+
+        truncated_chunks = chunking_stats.get('truncated_chunks', 0)
+        logger.info(f"Chunking stats for '{original_file_name}': {chunking_stats}")
+        if truncated_chunks:
+            reporter.emit('status', {
+                'message': f"{truncated_chunks} of {chunking_stats['chunks']} chunks exceed the model's "
+                           f"{token_limit} tokens, {chunking_stats['truncated_tokens']} of "
+                           f"{chunking_stats['tokens']} tokens are not embedded"
             })
+        if embedding_cache is not None:
+            logger.info(f"Embedding cache stats: {embedding_cache.stats()}")
 
-        # Upsert
-        qdrant_manager.upsert_points(project_id, points)
+        if not pipeline.chunk_points:
+            INGESTED_DOCUMENTS.inc(outcome='empty')
+            reporter.emit('processing_error', {'message': 'No text could be extracted from PDF'})
+            return
 
-        socketio.emit('processing_progress', {'progress': 100}, room=socket_id)
-        socketio.emit('processing_complete', {
+        with span(INGEST_STAGE_SECONDS, stages, stage='finalize'):
+            # Remove the chunks of the previous revision that no longer exist
+            kept_points = set(pipeline.chunk_points.values())
+            stale_points = [pid for pid in existing_points.values() if pid not in kept_points]
+            if stale_points:
+                vector_store.delete_points(project_id, stale_points)
+                lexical_index.delete_points(project_id, stale_points)
+                logger.info(f"Deleted {len(stale_points)} stale points of '{original_file_name}'")
+
+            document_registry.save_document(project_id, pdf_name, content_hash, pipeline.chunk_points)
+            if replaces and replaces != pdf_name:
+                remove_document(project_id, replaces)
+                logger.info(f"'{original_file_name}' replaced '{replaces}' in project '{project_id}'")
+            if answer_cache is not None:
+                answer_cache.invalidate_project(project_id)
+        INGESTED_DOCUMENTS.inc(outcome='ingested')
+
+        reporter.emit('processing_progress', {'progress': 100})
+        reporter.emit('processing_complete', {
             'message': 'PDF processed and uploaded successfully'
-        }, room=socket_id)
+        })
 
     except Exception as e:
+        INGESTED_DOCUMENTS.inc(outcome='failed')
         error_message = f"Error processing PDF: {str(e)}"
         logger.error(error_message)
-        socketio.emit('processing_error', {'message': error_message}, room=socket_id)
+        reporter.emit('processing_error', {'message': error_message})
+        keep_file = True
 
     finally:
-        # Delete the uploaded file
+        total = time.perf_counter() - started
+        INGEST_STAGE_SECONDS.observe(total, stage='total')
+        stages['total_ms'] = total * 1000
+        reporter.record_stages(stages)
+
+        # Delete the uploaded file, unless the job failed and may be resumed
         try:
-            if os.path.exists(pdf_path):
+            if keep_file:
+                logger.info(f"Kept file of failed job {reporter.job_id}: {pdf_path}")
+            elif os.path.exists(pdf_path):
                 os.remove(pdf_path)
                 logger.info(f"Deleted file: {pdf_path}")
             else:
@@ -257,13 +670,74 @@ def process_pdf(project_id: str, original_file_name: str, pdf_path: str, socket_
             logger.error(f"Error deleting file '{pdf_path}': {file_del_error}")
 
 
+# -----------------------------------------------------------------------------
+#                          Ingestion Job Queue
+# -----------------------------------------------------------------------------
+job_queue = JobQueue(
+    config.JOBS_DB,
+    process_pdf,
+    socketio,
+    workers=config.INGESTION_WORKERS,
+    max_queued=config.INGESTION_MAX_QUEUED
+)
+
+
+def expire_failed_uploads():
+    """
+    Deletes the PDFs of the uploads that failed more than FAILED_JOB_RETENTION_HOURS ago.
+    Their jobs can no longer be resumed.
+    """
+    for args in job_queue.expire_failed(config.FAILED_JOB_RETENTION_HOURS * 3600):
+        pdf_path = args.get('pdf_path')
+        try:
+            if pdf_path and os.path.exists(pdf_path):
+                os.remove(pdf_path)
+                logger.info(f"Deleted file of expired job: {pdf_path}")
+        except Exception as e:
+            logger.error(f"Error deleting file '{pdf_path}': {e}")
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Returns the status, progress and timings of an ingestion job.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' does not exist."}), 404
+    if not config.METRICS_RESPONSE_TIMINGS:
+        job.pop('stages')
+    return jsonify(job), 200
+
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """
+    Queues a failed ingestion job again. It skips the chunks it had already stored.
+    """
+    try:
+        job_queue.resume(job_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except QueueFullError as e:
+        logger.warning(str(e))
+        return jsonify({"error": "Too many uploads are waiting, please retry later."}), 429
+    logger.info(f"Resumed job {job_id}")
+    return jsonify({
+        "message": "Processing resumed.",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+    }), 202
+
+
 @app.route('/query_project', methods=['GET'])
 def show_query_project_form():
     """
     Renders a form for querying a project.
     """
     project_id = request.args.get('project_id', default='', type=str)
-    return render_template('query_project.html', project_id=project_id)
+    documents = document_registry.list_documents(project_id) if project_id else []
+    return render_template('query_project.html', project_id=project_id, documents=documents)
 
 
 @app.route('/query_project', methods=['POST'])
@@ -277,50 +751,320 @@ def query_project():
 
     if not project_id or not question:
         return jsonify({"error": "Project ID and question are required."}), 400
+    try:
+        search_filter = parse_search_filter(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        # Embed the user question
-        question_embedding = model.encode([question], convert_to_numpy=True).astype('float32')[0]
-        results = qdrant.search(
-            collection_name=project_id,
-            query_vector=question_embedding.tolist(),
-            limit=20
-        )
+        timings = {}
+        with span(QUERY_STAGE_SECONDS, timings, stage='total', route='query'):
+            filtered_results, retrieval_timings, question_embedding = retrieve(
+                project_id, question, threshold, 'query', search_filter
+            )
+            timings.update(retrieval_timings)
+
+            if not filtered_results:
+                QUERIES.inc(route='query', outcome='no_results')
+                answer = None
+            else:
+                # Build and answer, or reuse the answer of a near-duplicate question
+                answer, answer_timings = answer_question(project_id, question, question_embedding, filtered_results, 'query')
+                timings.update(answer_timings)
+
+        if answer is None:
+            return jsonify({
+                "answer": "No relevant information found above the threshold",
+                "timings": response_timings(timings)
+            })
+        return render_template('query_results.html', answer=answer, results=filtered_results, timings=timings)
 
-        filtered_results = [
-            {"score": r.score, "chunk": r.payload}
-            for r in results if r.score >= threshold
-        ]
+    except Exception as e:
+        QUERIES.inc(route='query', outcome='error')
+        logger.error(f"Error querying project: {e}")
+        return jsonify({"error": f"Error querying project: {str(e)}"}), 500
 
-        if not filtered_results:
-            return jsonify({"answer": "No relevant information found above the threshold"})
 
-        # Build and answer
-        prompt = build_prompt(question, [res['chunk'] for res in filtered_results])
-        answer = construct_an_answer(prompt)
+def observe_query_stages(route: str, timings: dict):
+    """
+    Records stage timings measured in milliseconds, e.g. by the retriever, in the query histogram.
+    """
+    for key, ms in timings.items():
+        QUERY_STAGE_SECONDS.observe(ms / 1000, route=route, stage=key[:-len('_ms')])
+
+
+def parse_search_filter(values) -> SearchFilter:
+    """
+    Reads the optional filters of a question from a form or a JSON object: "documents",
+    the PDF names to search (a repeated form field or a JSON list), and "page_from" and
+    "page_to", the page range. Returns None when no filter is set and raises ValueError
+    on an invalid page.
+    """
+    documents = values.getlist('documents') if hasattr(values, 'getlist') else values.get('documents')
+    if isinstance(documents, str):
+        documents = [documents]
+    documents = tuple(name for name in documents or () if name)
+
+    pages = []
+    for key in ('page_from', 'page_to'):
+        value = values.get(key)
+        if value in (None, ''):
+            pages.append(None)
+            continue
+        try:
+            pages.append(int(value))
+        except (TypeError, ValueError):
+            raise ValueError(f"'{key}' must be a page number.")
+
+    if not documents and pages == [None, None]:
+        return None
+    return SearchFilter(documents or None, *pages)
+
+
+def retrieve(project_id: str, question: str, threshold: float, route: str = 'query', search_filter: SearchFilter = None) -> tuple:
+    """
+    Embeds the question and runs the hybrid retrieval, restricted to `search_filter`.
+    Returns the ranked results, the latency of each stage in milliseconds and the question embedding.
+    """
+    timings = {}
+    with span(QUERY_STAGE_SECONDS, timings, stage='encode', route=route):
+        question_embedding = query_batcher.encode_one(question)
+
+    # Dense and keyword retrieval fused by rank
+    results, retrieval_timings = retriever.retrieve(
+        project_id, question, question_embedding.tolist(), threshold, search_filter
+    )
+    observe_query_stages(route, retrieval_timings)
+    return results, {**timings, **retrieval_timings}, question_embedding
+
+
+@app.route('/query_batch', methods=['POST'])
+def query_batch():
+    """
+    Answers many questions in one JSON request. The body holds a "questions" list whose
+    items are question strings or objects with "question" and optionally "project_id",
+    "threshold" and the filters "documents", "page_from" and "page_to"; the top-level
+    values of these keys are their defaults. Set
+    "answer" to false to only retrieve. All questions are embedded with one encode call,
+    the vector searches of each project run as one batched search, and the LLM answers
+    are generated concurrently, up to QUERY_BATCH_LLM_CONCURRENCY at a time.
+    """
+    body = request.get_json(silent=True) or {}
+    items = body.get('questions')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "A non-empty 'questions' list is required."}), 400
+    if len(items) > config.QUERY_BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {config.QUERY_BATCH_MAX_QUESTIONS} questions are accepted per request."}), 400
+
+    queries = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"question": item}
+        if not isinstance(item, dict):
+            return jsonify({"error": "Every question must be a string or an object."}), 400
+        project_id = item.get('project_id', body.get('project_id'))
+        question = item.get('question')
+        if not project_id or not question:
+            return jsonify({"error": "Every question needs a question text and a project ID."}), 400
+        try:
+            search_filter = parse_search_filter({
+                key: item.get(key, body.get(key)) for key in ('documents', 'page_from', 'page_to')
+            })
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        queries.append((project_id, question, float(item.get('threshold', body.get('threshold', 0.2))), search_filter))
 
-        return render_template('query_results.html', answer=answer, results=filtered_results)
+    try:
+        batch_timings = {}
+        with span(QUERY_STAGE_SECONDS, batch_timings, stage='total', route='batch'):
+            existing = set(project_registry.list())
+            responses = [
+                {"project_id": project_id, "question": question, "timings": {}}
+                for project_id, question, _, _ in queries
+            ]
+            valid = [i for i, (project_id, _, _, _) in enumerate(queries) if project_id in existing]
+            for i in set(range(len(queries))) - set(valid):
+                responses[i]["error"] = f"Project '{queries[i][0]}' does not exist."
+                QUERIES.inc(route='batch', outcome='error')
+
+            # One forward pass for the whole batch
+            with span(QUERY_STAGE_SECONDS, batch_timings, stage='encode', route='batch'):
+                embeddings = encoder.encode([queries[i][1] for i in valid]) if valid else []
+
+            with span(QUERY_STAGE_SECONDS, batch_timings, key='retrieval_ms', stage='retrieval', route='batch'):
+                retrieved = retriever.retrieve_batch([
+                    (queries[i][0], queries[i][1], embedding.tolist(), queries[i][2], queries[i][3])
+                    for i, embedding in zip(valid, embeddings)
+                ])
+
+            pending = {}
+            for i, embedding, (results, timings) in zip(valid, embeddings, retrieved):
+                response = responses[i]
+                response["results"] = results
+                response["timings"] = timings
+                if not results:
+                    response["answer"] = "No relevant information found above the threshold"
+                    QUERIES.inc(route='batch', outcome='no_results')
+                elif body.get('answer', True):
+                    pending[i] = llm_executor.submit(
+                        answer_question, queries[i][0], queries[i][1], embedding, results, 'batch'
+                    )
+
+            with span(QUERY_STAGE_SECONDS, batch_timings, key='llm_ms', stage='llm_wait', route='batch'):
+                for i, future in pending.items():
+                    responses[i]["answer"], answer_timings = future.result()
+                    responses[i]["timings"].update(answer_timings)
+
+        if not config.METRICS_RESPONSE_TIMINGS:
+            for response in responses:
+                response.pop("timings")
+        return jsonify({"results": responses, "timings": response_timings(batch_timings)})
 
     except Exception as e:
-        logger.error(f"Error querying project: {e}")
-        return jsonify({"error": f"Error querying project: {str(e)}"}), 500
+        logger.error(f"Error answering question batch: {e}")
+        return jsonify({"error": f"Error answering question batch: {str(e)}"}), 500
 
 
-def build_prompt(user_question: str, retrieved_chunks: list) -> str:
+def answer_question(project_id: str, question: str, question_embedding, results: list, route: str = 'query') -> tuple:
     """
-    Construct a prompt that includes the user question, retrieved chunks, 
-    and instructions to answer only from these chunks.
+    Answers a retrieved question from the answer cache or the LLM.
+    Returns the answer and the prompt and LLM latencies in milliseconds (none on a cache hit).
     """
-    prompt_context = "Excerpts:\n"
-    for chunk in retrieved_chunks:
-        pdf_name = chunk['pdf_name']
-        page = chunk['page']
-        chunk_id = chunk['chunk_id']
-        reference_str = f"(PDF '{pdf_name}', page {page}, chunk {chunk_id})"
-        prompt_context += f"--- {reference_str} ---\n{chunk['text']}\n\n"
+    signature = chunk_signature(results)
+    if answer_cache is not None:
+        answer = answer_cache.get(project_id, question_embedding, signature)
+        if answer is not None:
+            QUERIES.inc(route=route, outcome='cached')
+            return answer, {}
+
+    timings = {}
+    with span(QUERY_STAGE_SECONDS, timings, stage='prompt', route=route):
+        prompt = build_prompt(question, [res['chunk'] for res in results])
+    with span(QUERY_STAGE_SECONDS, timings, stage='llm', route=route):
+        answer = construct_an_answer(prompt)
+
+    if answer == LLM_ERROR_ANSWER:
+        QUERIES.inc(route=route, outcome='error')
+    else:
+        QUERIES.inc(route=route, outcome='answered')
+        if answer_cache is not None:
+            answer_cache.put(project_id, question_embedding, signature, answer)
+    return answer, timings
 
-    prompt_question = f"User question: {user_question}\n\n"
-    return prompt_context + prompt_question
+
+@app.route('/query_project_stream', methods=['POST'])
+def query_project_stream():
+    """
+    Streaming variant of /query_project. Answers with Server-Sent Events: a `sources` event
+    with the retrieved chunks as soon as retrieval is done, one `token` event per piece of
+    the answer, and a `done` event with the time to first token and the total latency.
+    """
+    project_id = request.form.get('project_id')
+    question = request.form.get('question')
+    threshold = float(request.form.get('threshold', 0.2))
+
+    if not project_id or not question:
+        return jsonify({"error": "Project ID and question are required."}), 400
+    try:
+        search_filter = parse_search_filter(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def finish(started: float, outcome: str, **data) -> str:
+        total = time.perf_counter() - started
+        QUERY_STAGE_SECONDS.observe(total, route='stream', stage='total')
+        QUERIES.inc(route='stream', outcome=outcome)
+        return event('done', {**data, "total_ms": total * 1000})
+
+    def generate():
+        started = time.perf_counter()
+        try:
+            results, timings, question_embedding = retrieve(project_id, question, threshold, 'stream', search_filter)
+            yield event('sources', {"results": results, "timings": response_timings(timings)})
+            if not results:
+                yield event('token', {"text": "No relevant information found above the threshold"})
+                yield finish(started, 'no_results', ttft_ms=None)
+                return
+
+            # Reuse the answer of a near-duplicate question with the same sources
+            signature = chunk_signature(results)
+            if answer_cache is not None:
+                answer = answer_cache.get(project_id, question_embedding, signature)
+                if answer is not None:
+                    yield event('token', {"text": answer})
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    yield finish(started, 'cached', ttft_ms=ttft_ms, cached=True)
+                    return
+
+            with span(QUERY_STAGE_SECONDS, stage='prompt', route='stream'):
+                prompt = build_prompt(question, [res['chunk'] for res in results])
+            llm_started = time.perf_counter()
+            ttft_ms = None
+            pieces = []
+            for text in stream_answer(prompt):
+                if ttft_ms is None:
+                    ttft = time.perf_counter() - started
+                    QUERY_TTFT_SECONDS.observe(ttft)
+                    ttft_ms = ttft * 1000
+                    logger.info(f"Time to first token: {ttft_ms:.0f} ms")
+                pieces.append(text)
+                yield event('token', {"text": text})
+
+            llm_seconds = time.perf_counter() - llm_started
+            QUERY_STAGE_SECONDS.observe(llm_seconds, route='stream', stage='llm')
+            answer = "".join(pieces)
+            if answer_cache is not None and answer and answer != LLM_ERROR_ANSWER:
+                answer_cache.put(project_id, question_embedding, signature, answer)
+
+            yield finish(
+                started,
+                'error' if answer == LLM_ERROR_ANSWER else 'answered',
+                ttft_ms=ttft_ms,
+                llm_ms=llm_seconds * 1000
+            )
+        except Exception as e:
+            QUERIES.inc(route='stream', outcome='error')
+            logger.error(f"Error streaming answer: {e}")
+            yield event('error', {"error": f"Error querying project: {str(e)}"})
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+def build_prompt(user_question: str, retrieved_chunks: list, token_budget: int = None) -> str:
+    """
+    Builds the LLM prompt from the ranked chunks with the configured token budget.
+    """
+    return pack_prompt(
+        user_question,
+        retrieved_chunks,
+        token_budget or config.CONTEXT_TOKEN_BUDGET,
+        overlap_sentences=config.CHUNK_OVERLAP_SENTENCES,
+        model=config.OPEN_AI_MODEL
+    )
+
+
+# Returned in place of an answer when the LLM cannot be reached
+LLM_ERROR_ANSWER = 'Error connecting to LLM'
+
+
+def answer_messages(prompt: str) -> list:
+    """
+    Wraps the prompt with the answering instructions.
+    """
+    return [
+        {
+            "role": "user",
+            "content": """
+                1. You are an AI assistant that strictly answers the user question using only the provided excerpts. 
+                2. You will create a holistic and deeply detailed answer using all the relevant excerpts. 
+                3. If the answer does not exist in the excerpts, say: 'I don't know from the provided text.' 
+                4. In your detailed formulated answer, cite the excerpts used in parentheses with ('<pdf_name>', page X, chunk Y).
+            """ + prompt
+        }
+    ]
 
 
 def construct_an_answer(prompt: str) -> str:
@@ -330,22 +1074,53 @@ def construct_an_answer(prompt: str) -> str:
     try:
         response = open_ai_client.chat.completions.create(
             model=config.OPEN_AI_MODEL,  # Example model; you can adjust as needed
-            messages=[
-                {
-                    "role": "user",
-                    "content": """
-                        1. You are an AI assistant that strictly answers the user question using only the provided excerpts. 
-                        2. You will create a holistic and deeply detailed answer using all the relevant excerpts. 
-                        3. If the answer does not exist in the excerpts, say: 'I don't know from the provided text.' 
-                        4. In your detailed formulated answer, cite the excerpts used in parentheses with ('<pdf_name>', page X, chunk Y).
-                    """ + prompt
-                }
-            ]
+            messages=answer_messages(prompt)
         )
+        if response.usage is not None:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, kind='prompt')
+            LLM_TOKENS.inc(response.usage.completion_tokens, kind='completion')
         return response.choices[0].message.content
     except Exception as e:
         logger.error(f"Error connecting to LLM: {e}")
-        return 'Error connecting to LLM'
+        return LLM_ERROR_ANSWER
+
+
+def stream_answer(prompt: str):
+    """
+    Yields the pieces of the LLM answer as they arrive.
+    """
+    try:
+        stream = open_ai_client.chat.completions.create(
+            model=config.OPEN_AI_MODEL,
+            messages=answer_messages(prompt),
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        logger.error(f"Error connecting to LLM: {e}")
+        yield LLM_ERROR_ANSWER
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Exposes the counters and latency histograms in the Prometheus text format.
+    """
+    return Response(metrics.render(), content_type=metrics.content_type)
+
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Returns the hit and miss counters of the caches and the query batching stats.
+    """
+    return jsonify({
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "query_batcher": query_batcher.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None
+    })
 
 
 # -----------------------------------------------------------------------------
@@ -364,5 +1139,16 @@ def handle_disconnect():
 # -----------------------------------------------------------------------------
 #                                   Main
 # -----------------------------------------------------------------------------
+log_startup('App imported', import_started)
+
+
 if __name__ == '__main__':
+    job_queue.recover_interrupted()
+    expire_failed_uploads()
+    start_embedding_pool()
+    if config.STARTUP_PRELOAD:
+        load_components()
+    if config.STARTUP_WARM_UP:
+        warm_up()
+    log_startup('Server started', import_started)
     socketio.run(app, debug=True, host=config.WEB_SERVER_HOST, port=config.WEB_SERVER_PORT)
@@ -0,0 +1,432 @@
+"""
+async_server.py
+
+Asynchronous query server. It answers questions on the same components as the Flask app
+(model, caches, keyword index, vector store), but every query is a coroutine instead of
+a thread: Qdrant is searched with an AsyncQdrantClient over gRPC and the LLM is called
+with AsyncOpenAI, so the queries waiting on them only cost their memory and one host
+can serve hundreds at once. Uploads and the web pages stay on the Flask app.
+
+Admission, searches and LLM calls are bounded by semaphores, and each stage has a
+timeout (see the ASYNC_* settings in config.py).
+
+Usage:
+    python async_server.py [--host 0.0.0.0] [--port 5002]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import openai
+import qdrant_client
+from aiohttp import web
+
+import config
+import app as components
+from answer_cache import chunk_signature
+from metrics import span
+from startup import log_startup
+
+logger = logging.getLogger(__name__)
+
+NO_RESULTS_ANSWER = "No relevant information found above the threshold"
+
+
+class StageTimeout(Exception):
+    """
+    Raised when a query stage runs longer than its timeout.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(f"The {stage} stage of the query timed out")
+        self.stage = stage
+
+
+class QueryService:
+    """
+    Runs the stages of a question as coroutines: encoding through the shared query
+    batcher, hybrid retrieval, and the answer from the answer cache or the LLM.
+
+    At most `max_in_flight` queries are worked on at once, a query waiting longer than
+    `queue_timeout` for a slot is rejected, and `search_concurrency` / `llm_concurrency`
+    bound the searches and LLM calls in progress. `stage_timeouts` maps 'encode',
+    'search' and 'llm' to seconds.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 500,
+        queue_timeout: float = 2,
+        search_concurrency: int = 64,
+        llm_concurrency: int = 200,
+        stage_timeouts: dict = None
+    ):
+        self.queue_timeout = queue_timeout
+        self.search_concurrency = search_concurrency
+        self.stage_timeouts = stage_timeouts or {}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._search_slots = asyncio.Semaphore(search_concurrency)
+        self._llm_slots = asyncio.Semaphore(llm_concurrency)
+        self.llm_client = None
+
+    async def start(self):
+        """
+        Creates the async clients in the server's event loop.
+        """
+        # Keyword searches, FAISS searches, answer cache lookups (which read the project's
+        # invalidation generation from SQLite) and prompt packing run in these threads
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.search_concurrency, thread_name_prefix='async-query')
+        )
+        if config.VECTOR_STORE == 'qdrant':
+            # One client: its gRPC channel multiplexes the concurrent searches over HTTP/2
+            components.vector_store.get().async_client = qdrant_client.AsyncQdrantClient(
+                url=config.DB_ADDR+":"+str(config.DB_PORT),
+                grpc_port=config.DB_GRPC_PORT,
+                prefer_grpc=config.DB_PREFER_GRPC
+            )
+        self.llm_client = openai.AsyncOpenAI(
+            api_key=components.OPEN_AI_API_KEY,
+            organization=components.OPEN_AI_ORG_ID,
+            base_url=components.OPEN_AI_BASE_URL
+        )
+
+    async def close(self):
+        if config.VECTOR_STORE == 'qdrant' and components.vector_store.loaded:
+            store = components.vector_store.get()
+            if store.async_client is not None:
+                await store.async_client.close()
+                store.async_client = None
+        if self.llm_client is not None:
+            await self.llm_client.close()
+
+    @asynccontextmanager
+    async def admitted(self):
+        """
+        Holds one of the in-flight slots, or raises HTTP 503 when none frees up in time.
+        """
+        try:
+            await asyncio.wait_for(self._in_flight.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            components.QUERIES.inc(route='async', outcome='rejected')
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({"error": "Too many queries in progress, please retry."}),
+                content_type='application/json'
+            )
+        try:
+            yield
+        finally:
+            self._in_flight.release()
+
+    async def _within(self, stage: str, awaitable):
+        try:
+            return await asyncio.wait_for(awaitable, self.stage_timeouts.get(stage))
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage) from None
+
+    async def retrieve(self, project_id: str, question: str, threshold: float, search_filter=None) -> tuple:
+        """
+        Embeds the question and runs the hybrid retrieval. Returns the ranked results, the
+        latency of each stage in milliseconds and the question embedding.
+        """
+        timings = {}
+        with span(components.QUERY_STAGE_SECONDS, timings, stage='encode', route='async'):
+            # The batcher's thread encodes it together with the concurrent questions
+            question_embedding = await self._within(
+                'encode', asyncio.wrap_future(components.query_batcher.submit(question))
+            )
+
+        async with self._search_slots:
+            results, retrieval_timings = await self._within('search', components.retriever.retrieve_async(
+                project_id, question, question_embedding.tolist(), threshold, search_filter
+            ))
+        components.observe_query_stages('async', retrieval_timings)
+        return results, {**timings, **retrieval_timings}, question_embedding
+
+    async def _complete(self, prompt: str) -> str:
+        try:
+            response = await self.llm_client.chat.completions.create(
+                model=config.OPEN_AI_MODEL,
+                messages=components.answer_messages(prompt)
+            )
+        except Exception as e:
+            logger.error(f"Error connecting to LLM: {e}")
+            return components.LLM_ERROR_ANSWER
+        if response.usage is not None:
+            components.LLM_TOKENS.inc(response.usage.prompt_tokens, kind='prompt')
+            components.LLM_TOKENS.inc(response.usage.completion_tokens, kind='completion')
+        return response.choices[0].message.content
+
+    async def answer(self, project_id: str, question: str, question_embedding, results: list) -> tuple:
+        """
+        Answers a retrieved question from the answer cache or the LLM. Returns the answer
+        and the prompt and LLM latencies in milliseconds (none on a cache hit).
+        """
+        signature = chunk_signature(results)
+        if components.answer_cache is not None:
+            answer = await asyncio.to_thread(components.answer_cache.get, project_id, question_embedding, signature)
+            if answer is not None:
+                components.QUERIES.inc(route='async', outcome='cached')
+                return answer, {}
+
+        timings = {}
+        with span(components.QUERY_STAGE_SECONDS, timings, stage='prompt', route='async'):
+            prompt = await asyncio.to_thread(components.build_prompt, question, [res['chunk'] for res in results])
+        async with self._llm_slots:
+            with span(components.QUERY_STAGE_SECONDS, timings, stage='llm', route='async'):
+                answer = await self._within('llm', self._complete(prompt))
+
+        if answer == components.LLM_ERROR_ANSWER:
+            components.QUERIES.inc(route='async', outcome='error')
+        else:
+            components.QUERIES.inc(route='async', outcome='answered')
+            if components.answer_cache is not None:
+                await asyncio.to_thread(components.answer_cache.put, project_id, question_embedding, signature, answer)
+        return answer, timings
+
+    async def stream_answer(self, prompt: str):
+        """
+        Yields the pieces of the LLM answer as they arrive. The whole stream shares the
+        llm stage timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.stage_timeouts['llm'] if self.stage_timeouts.get('llm') else None
+        async with self._llm_slots:
+            try:
+                stream = await self._within('llm', self.llm_client.chat.completions.create(
+                    model=config.OPEN_AI_MODEL,
+                    messages=components.answer_messages(prompt),
+                    stream=True
+                ))
+            except StageTimeout:
+                raise
+            except Exception as e:
+                logger.error(f"Error connecting to LLM: {e}")
+                yield components.LLM_ERROR_ANSWER
+                return
+            chunks = stream.__aiter__()
+            try:
+                while True:
+                    remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError:
+                        raise StageTimeout('llm') from None
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+
+async def request_values(request: web.Request) -> dict:
+    """
+    Reads the question fields from a JSON body or a form.
+    """
+    if request.content_type == 'application/json':
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "Expected a JSON object."}), content_type='application/json')
+        return body
+    form = await request.post()
+    values = {key: form.get(key) for key in form}
+    values['documents'] = form.getall('documents', [])
+    return values
+
+
+def error_response(message: str, status: int) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+async def parse_question(request: web.Request) -> tuple:
+    """
+    Returns the project, question, threshold and search filter of a request, or an error response.
+    """
+    values = await request_values(request)
+    project_id, question = values.get('project_id'), values.get('question')
+    if not project_id or not question:
+        return None, error_response("Project ID and question are required.", 400)
+    try:
+        threshold = float(values.get('threshold', 0.2))
+        search_filter = components.parse_search_filter(values)
+    except ValueError as e:
+        return None, error_response(str(e), 400)
+    return (project_id, question, threshold, search_filter, values.get('answer', True) not in (False, 'false', '0')), None
+
+
+async def query(request: web.Request) -> web.Response:
+    """
+    Answers one question. The JSON or form body holds "project_id", "question" and
+    optionally "threshold", the filters "documents", "page_from" and "page_to", and
+    "answer" (false to only retrieve). Returns the answer, the ranked results and the
+    stage timings.
+    """
+    parsed, error = await parse_question(request)
+    if error is not None:
+        return error
+    project_id, question, threshold, search_filter, wants_answer = parsed
+    service = request.app['service']
+
+    async with service.admitted():
+        timings = {}
+        try:
+            with span(components.QUERY_STAGE_SECONDS, timings, stage='total', route='async'):
+                results, retrieval_timings, question_embedding = await service.retrieve(
+                    project_id, question, threshold, search_filter
+                )
+                timings.update(retrieval_timings)
+                answer = None
+                if not results:
+                    components.QUERIES.inc(route='async', outcome='no_results')
+                    answer = NO_RESULTS_ANSWER
+                elif wants_answer:
+                    answer, answer_timings = await service.answer(project_id, question, question_embedding, results)
+                    timings.update(answer_timings)
+        except StageTimeout as e:
+            components.QUERIES.inc(route='async', outcome='timeout')
+            logger.warning(f"Query in '{project_id}' timed out in the {e.stage} stage")
+            return error_response(str(e), 504)
+        except Exception as e:
+            components.QUERIES.inc(route='async', outcome='error')
+            logger.error(f"Error querying project: {e}")
+            return error_response(f"Error querying project: {str(e)}", 500)
+
+    return web.json_response({
+        "answer": answer,
+        "results": results,
+        "timings": components.response_timings(timings)
+    })
+
+
+async def query_stream(request: web.Request) -> web.StreamResponse:
+    """
+    Streaming variant of /query, with the Server-Sent Events of the Flask app's
+    /query_project_stream: `sources`, `token` pieces and `done`.
+    """
+    parsed, error = await parse_question(request)
+    if error is not None:
+        return error
+    project_id, question, threshold, search_filter, _ = parsed
+    service = request.app['service']
+
+    def event(name: str, data: dict) -> bytes:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+    async with service.admitted():
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+        await response.prepare(request)
+        started = time.perf_counter()
+        outcome = 'error'
+        done = {}
+        try:
+            results, timings, question_embedding = await service.retrieve(project_id, question, threshold, search_filter)
+            await response.write(event('sources', {"results": results, "timings": components.response_timings(timings)}))
+            signature = chunk_signature(results)
+            cached = None
+            if not results:
+                outcome, cached = 'no_results', NO_RESULTS_ANSWER
+            elif components.answer_cache is not None:
+                cached = await asyncio.to_thread(components.answer_cache.get, project_id, question_embedding, signature)
+                if cached is not None:
+                    outcome = 'cached'
+                    done['cached'] = True
+
+            if cached is not None:
+                await response.write(event('token', {"text": cached}))
+                done['ttft_ms'] = (time.perf_counter() - started) * 1000 if outcome == 'cached' else None
+            else:
+                with span(components.QUERY_STAGE_SECONDS, stage='prompt', route='async'):
+                    prompt = await asyncio.to_thread(components.build_prompt, question, [res['chunk'] for res in results])
+                llm_started = time.perf_counter()
+                pieces = []
+                async for text in service.stream_answer(prompt):
+                    if not pieces:
+                        ttft = time.perf_counter() - started
+                        components.QUERY_TTFT_SECONDS.observe(ttft)
+                        done['ttft_ms'] = ttft * 1000
+                    pieces.append(text)
+                    await response.write(event('token', {"text": text}))
+                llm_seconds = time.perf_counter() - llm_started
+                components.QUERY_STAGE_SECONDS.observe(llm_seconds, route='async', stage='llm')
+                done['llm_ms'] = llm_seconds * 1000
+                answer = "".join(pieces)
+                outcome = 'error' if answer == components.LLM_ERROR_ANSWER else 'answered'
+                if components.answer_cache is not None and answer and outcome == 'answered':
+                    await asyncio.to_thread(components.answer_cache.put, project_id, question_embedding, signature, answer)
+
+            total = time.perf_counter() - started
+            components.QUERY_STAGE_SECONDS.observe(total, route='async', stage='total')
+            await response.write(event('done', {**done, "total_ms": total * 1000}))
+        except StageTimeout as e:
+            outcome = 'timeout'
+            logger.warning(f"Streamed query in '{project_id}' timed out in the {e.stage} stage")
+            await response.write(event('error', {"error": str(e)}))
+        except ConnectionResetError:
+            # The client went away, there is nobody to tell
+            pass
+        except Exception as e:
+            outcome = 'error'
+            logger.error(f"Error streaming answer: {e}")
+            await response.write(event('error', {"error": f"Error querying project: {str(e)}"}))
+        finally:
+            components.QUERIES.inc(route='async', outcome=outcome)
+        await response.write_eof()
+    return response
+
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    """
+    Exposes the metrics of this process in the Prometheus text format.
+    """
+    return web.Response(
+        body=components.metrics.render().encode('utf-8'),
+        headers={'Content-Type': components.metrics.content_type}
+    )
+
+
+def make_app() -> web.Application:
+    application = web.Application()
+    application['service'] = QueryService(
+        max_in_flight=config.ASYNC_MAX_IN_FLIGHT,
+        queue_timeout=config.ASYNC_QUEUE_TIMEOUT_SECONDS,
+        search_concurrency=config.ASYNC_SEARCH_CONCURRENCY,
+        llm_concurrency=config.ASYNC_LLM_CONCURRENCY,
+        stage_timeouts=config.ASYNC_STAGE_TIMEOUTS
+    )
+
+    async def start(application: web.Application):
+        await application['service'].start()
+
+    async def close(application: web.Application):
+        await application['service'].close()
+
+    application.on_startup.append(start)
+    application.on_cleanup.append(close)
+    application.router.add_post('/query', query)
+    application.router.add_post('/query_stream', query_stream)
+    application.router.add_get('/metrics', prometheus_metrics)
+    return application
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the query routes with asyncio.")
+    parser.add_argument('--host', default=config.WEB_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.ASYNC_SERVER_PORT)
+    args = parser.parse_args()
+
+    if config.STARTUP_PRELOAD:
+        components.load_components()
+    if config.STARTUP_WARM_UP:
+        components.warm_up()
+    log_startup('Async server started', components.import_started)
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+"""
+benchmark_suite.py
+
+Reproducible benchmark of the ingestion and query hot paths.
+
+Synthetic PDFs of the requested page counts and languages are generated, including right
+to left Hebrew drawn in visual order so that extraction goes through the get_display path.
+They are chunked, embedded and upserted into an in-process Qdrant (":memory:"), each stage
+on its own and then through the streaming ingestion pipeline, and questions are answered
+with the hybrid retrieval and a stubbed LLM. The report is printed as JSON; save it with
+--output and pass it to --compare on a later commit to see the change of every metric.
+
+Generating the PDFs requires reportlab (pip install reportlab) and, for Hebrew, a TTF
+font with Hebrew glyphs such as DejaVu Sans.
+
+Usage:
+    python benchmark_suite.py [--pages 20 100] [--languages en he] [--queries 200] [--llm-ms 0]
+                              [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+from bidi.algorithm import get_display
+from qdrant_client import QdrantClient
+
+import config
+from context_packer import pack_prompt
+from document_registry import file_content_hash, point_id
+from embedding_backends import load_embedding_model, token_budget, token_counter
+from ingestion_pipeline import IngestionPipeline
+from lexical_index import LexicalIndex, load_stopwords
+from pdf_processor import PDFProcessor, NullEmitter, chunking_options, extraction_options
+from qdrant_manager import QdrantManager
+from retrieval import HybridRetriever
+
+VOCABULARY = {
+    'en': (
+        "the pump valve pressure sensor must be checked before every maintenance cycle and the "
+        "operator records the reading in the log warranty period covers replacement parts when "
+        "installed by certified technicians error code E-042 indicates a blocked filter see "
+        "section 4.2.1 for the cleaning procedure voltage current fuse relay cable housing "
+        "temperature limit alarm reset manual automatic mode schedule inspection report"
+    ).split(),
+    'he': (
+        "יש לבדוק את חיישן הלחץ של המשאבה לפני כל מחזור תחזוקה והמפעיל רושם את הקריאה ביומן "
+        "תקופת האחריות מכסה חלקי חילוף כאשר הם מותקנים על ידי טכנאים מוסמכים קוד שגיאה מציין "
+        "מסנן חסום ראה סעיף לנוהל הניקוי מתח זרם נתיך ממסר כבל מארז טמפרטורה גבול התראה איפוס"
+    ).split(),
+}
+RTL_LANGUAGES = {'he'}
+FONT_CANDIDATES = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+)
+
+
+def sentences(language: str, rng: random.Random):
+    """
+    Yields an endless stream of random sentences of the language's vocabulary.
+    """
+    words = VOCABULARY[language]
+    while True:
+        yield ' '.join(rng.choice(words) for _ in range(rng.randint(8, 24))) + '.'
+
+
+def generate_pdf(path: str, pages: int, language: str, font_path: str, seed: int) -> list:
+    """
+    Writes a PDF of `pages` pages of random sentences and returns a sample of them.
+    Right to left lines are drawn in visual order, as most RTL PDFs store them.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont('BenchmarkFont', font_path))
+    rng = random.Random(seed)
+    stream = sentences(language, rng)
+    rtl = language in RTL_LANGUAGES
+    width, height = A4
+    sample = []
+
+    pdf = canvas.Canvas(path, pagesize=A4)
+    words = []
+    for _ in range(pages):
+        pdf.setFont('BenchmarkFont', 10)
+        y = height - 50
+        while y > 50:
+            # Fill a line of about 90 characters
+            while len(' '.join(words)) < 90:
+                sentence = next(stream)
+                if rng.random() < 0.05:
+                    sample.append(sentence)
+                words.extend(sentence.split())
+            line_words = []
+            while words and len(' '.join(line_words + [words[0]])) <= 90:
+                line_words.append(words.pop(0))
+            line = ' '.join(line_words)
+            if rtl:
+                pdf.drawRightString(width - 50, y, get_display(line))
+            else:
+                pdf.drawString(50, y, line)
+            y -= 14
+        pdf.showPage()
+    pdf.save()
+    return sample
+
+
+def percentiles(values: list) -> dict:
+    """
+    Returns the p50, p95, p99 and mean of a list of latencies.
+    """
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(np.mean(values))}
+
+
+def git_commit() -> str:
+    """
+    Returns the commit of the working tree, or None outside a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(metrics: dict, prefix: str = '') -> dict:
+    """
+    Flattens nested metrics into {"a.b.c": value} pairs of numbers.
+    """
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """
+    Returns the relative change of every metric present in both reports. Throughputs
+    are better when higher, latencies and memory when lower.
+    """
+    current, baseline = flatten(current), flatten(baseline)
+    comparison = {}
+    for name in sorted(current.keys() & baseline.keys()):
+        if not baseline[name]:
+            continue
+        change = (current[name] - baseline[name]) / baseline[name]
+        higher_is_better = 'per_second' in name
+        comparison[name] = {
+            "baseline": baseline[name],
+            "current": current[name],
+            "change": change,
+            "regression": change < -0.05 if higher_is_better else change > 0.05
+        }
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and query hot paths.")
+    parser.add_argument('--pages', type=int, nargs='+', default=[20, 100], help="Page count of each generated PDF")
+    parser.add_argument('--languages', nargs='+', default=['en', 'he'], choices=sorted(VOCABULARY))
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--llm-ms', type=float, default=0.0, help="Latency of the stubbed LLM")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--font', default=next((path for path in FONT_CANDIDATES if os.path.exists(path)), None))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="Also write the report to this file")
+    parser.add_argument('--compare', help="Report of an earlier run to compare with")
+    args = parser.parse_args()
+
+    if not args.font:
+        parser.error("No TTF font found, pass one with --font")
+
+    rng = random.Random(args.seed)
+    model = load_embedding_model(
+        config.SENTENCE_TRANSFORMER,
+        config.EMBEDDING_BACKEND,
+        quantization=config.EMBEDDING_ONNX_QUANTIZATION,
+        threads=config.EMBEDDING_THREADS,
+        export_folder=config.EMBEDDING_ONNX_FOLDER
+    )
+    model.encode(["warm up"] * config.INGESTION_BATCH_SIZE, batch_size=config.INGESTION_BATCH_SIZE)
+    options = {**chunking_options(token_budget(model), token_counter(model)), **extraction_options()}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Synthetic documents
+        documents = []
+        questions = []
+        for language in args.languages:
+            for pages in args.pages:
+                path = os.path.join(work_dir, f"benchmark_{language}_{pages}.pdf")
+                questions.extend(generate_pdf(path, pages, language, args.font, rng.randrange(2**32)))
+                documents.append((path, language, pages))
+        rng.shuffle(questions)
+        questions = (questions * (args.queries // max(len(questions), 1) + 1))[:args.queries]
+
+        # Extraction and chunking
+        extraction = {}
+        all_chunks = []
+        for path, language, pages in documents:
+            started = time.perf_counter()
+            chunks = PDFProcessor.chunk_pdf_text(path, os.path.basename(path), NullEmitter(), None, **options)
+            seconds = time.perf_counter() - started
+            entry = extraction.setdefault(language, {"pages": 0, "chunks": 0, "seconds": 0.0})
+            entry["pages"] += pages
+            entry["chunks"] += len(chunks)
+            entry["seconds"] += seconds
+            content_hash = file_content_hash(path)
+            all_chunks.extend((content_hash, chunk) for chunk in chunks)
+        total_pages = sum(entry["pages"] for entry in extraction.values())
+        total_seconds = sum(entry["seconds"] for entry in extraction.values())
+        extraction_metrics = {
+            "pages_per_second": total_pages / total_seconds,
+            "chunks_per_second": len(all_chunks) / total_seconds,
+            "by_language": {
+                language: {
+                    "pages_per_second": entry["pages"] / entry["seconds"],
+                    "chunks_per_second": entry["chunks"] / entry["seconds"]
+                }
+                for language, entry in extraction.items()
+            }
+        }
+
+        # Embedding
+        texts = [chunk['text'] for _, chunk in all_chunks]
+        started = time.perf_counter()
+        vectors = model.encode(texts, batch_size=config.INGESTION_BATCH_SIZE)
+        embed_seconds = time.perf_counter() - started
+
+        # Upserts into an in-process Qdrant
+        client = QdrantClient(":memory:")
+        vector_store = QdrantManager(client, model)
+        vector_store.create_collection('benchmark_upsert')
+        points = [
+            {
+                "id": point_id(content_hash, chunk),
+                "vector": vector.tolist(),
+                "payload": {key: chunk[key] for key in ('pdf_name', 'page', 'chunk_id', 'text')}
+            }
+            for (content_hash, chunk), vector in zip(all_chunks, vectors)
+        ]
+        started = time.perf_counter()
+        vector_store.upsert_points('benchmark_upsert', points)
+        upsert_seconds = time.perf_counter() - started
+        vector_store.delete_collection('benchmark_upsert')
+
+        # Whole ingestion through the streaming pipeline
+        lexical_index = LexicalIndex(
+            os.path.join(work_dir, 'lexical.db'),
+            stopwords=load_stopwords(config.LEXICAL_STOPWORD_LANGUAGES),
+            min_term_length=config.LEXICAL_MIN_TERM_LENGTH
+        )
+        vector_store.create_collection('benchmark')
+        started = time.perf_counter()
+        for path, _, _ in documents:
+            pipeline = IngestionPipeline(
+                model,
+                vector_store,
+                NullEmitter(),
+                None,
+                batch_size=config.INGESTION_BATCH_SIZE,
+                queue_size=config.INGESTION_QUEUE_SIZE,
+                lexical_index=lexical_index
+            )
+            pipeline.run(
+                'benchmark',
+                PDFProcessor.iter_pdf_chunks(path, os.path.basename(path), NullEmitter(), None, **options),
+                file_content_hash(path)
+            )
+        ingestion_seconds = time.perf_counter() - started
+
+        # Queries with a stubbed LLM
+        retriever = HybridRetriever(
+            vector_store,
+            lexical_index,
+            dense_candidates=config.DENSE_CANDIDATES,
+            lexical_candidates=config.LEXICAL_CANDIDATES,
+            result_limit=config.RETRIEVAL_RESULTS,
+            rrf_k=config.RRF_K,
+            lexical_min_score=config.LEXICAL_MIN_SCORE
+        )
+        latencies = {"encode_ms": [], "retrieval_ms": [], "prompt_ms": [], "llm_ms": [], "total_ms": []}
+        for question in questions:
+            started = time.perf_counter()
+            question_embedding = model.encode(question)
+            encoded = time.perf_counter()
+            results, _ = retriever.retrieve('benchmark', question, question_embedding.tolist(), args.threshold)
+            retrieved = time.perf_counter()
+            pack_prompt(
+                question,
+                [res['chunk'] for res in results],
+                config.CONTEXT_TOKEN_BUDGET,
+                overlap_sentences=config.CHUNK_OVERLAP_SENTENCES,
+                model=config.OPEN_AI_MODEL
+            )
+            prompted = time.perf_counter()
+            time.sleep(args.llm_ms / 1000)
+            answered = time.perf_counter()
+            latencies["encode_ms"].append((encoded - started) * 1000)
+            latencies["retrieval_ms"].append((retrieved - encoded) * 1000)
+            latencies["prompt_ms"].append((prompted - retrieved) * 1000)
+            latencies["llm_ms"].append((answered - prompted) * 1000)
+            latencies["total_ms"].append((answered - started) * 1000)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_unit = 1 if platform.system() == 'Darwin' else 1024
+
+    metrics = {
+        "extraction": extraction_metrics,
+        "embedding": {"chunks_per_second": len(texts) / embed_seconds},
+        "upsert": {"points_per_second": len(points) / upsert_seconds},
+        "ingestion": {
+            "pages_per_second": total_pages / ingestion_seconds,
+            "chunks_per_second": len(all_chunks) / ingestion_seconds
+        },
+        "query": {stage: percentiles(values) for stage, values in latencies.items()},
+        "memory": {
+            "peak_rss_mb": usage * rss_unit / 2**20,
+            "peak_children_rss_mb": children_usage * rss_unit / 2**20
+        }
+    }
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {
+            "model": config.SENTENCE_TRANSFORMER,
+            "embedding_backend": config.EMBEDDING_BACKEND,
+            "pdf_text_engine": config.PDF_TEXT_ENGINE,
+            "chunk_size_unit": config.CHUNK_SIZE_UNIT,
+            "pages": args.pages,
+            "languages": args.languages,
+            "documents": len(documents),
+            "chunks": len(all_chunks),
+            "queries": len(questions),
+            "llm_ms": args.llm_ms,
+            "seed": args.seed
+        },
+        "metrics": metrics
+    }
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["comparison"] = compare(metrics, json.load(baseline)["metrics"])
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+build_lexical_index.py
+
+Rebuilds the BM25 keyword index of projects from the points already stored in the vector store.
+Projects ingested before the keyword index existed need this once.
+
+Usage:
+    python build_lexical_index.py <project_id> [<project_id> ...]
+    python build_lexical_index.py --all
+"""
+
+import argparse
+import logging
+
+import qdrant_client
+
+import config
+from qdrant_manager import QdrantManager, SharedQdrantManager
+from faiss_manager import FaissManager
+from lexical_index import LexicalIndex
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the keyword index from the vector store.")
+    parser.add_argument('projects', nargs='*', help="Projects to index")
+    parser.add_argument('--all', action='store_true', help="Index every project")
+    args = parser.parse_args()
+
+    # The embedding model is not needed to read points
+    if config.VECTOR_STORE == 'faiss':
+        vector_store = FaissManager(config.FAISS_INDEX_FOLDER, None)
+    elif config.QDRANT_LAYOUT == 'shared':
+        vector_store = SharedQdrantManager(
+            qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT)), None,
+            collection_name=config.SHARED_COLLECTION
+        )
+    else:
+        vector_store = QdrantManager(qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT)), None)
+    lexical_index = LexicalIndex(config.LEXICAL_INDEX_DB)
+
+    projects = [c.name for c in vector_store.get_collections()] if args.all else args.projects
+    if not projects:
+        parser.error("Name at least one project or pass --all")
+
+    for project_id in projects:
+        lexical_index.delete_project(project_id)
+        batch = []
+        count = 0
+        for point in vector_store.iter_points(project_id):
+            batch.append(point)
+            if len(batch) == 1000:
+                lexical_index.add_points(project_id, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            lexical_index.add_points(project_id, batch)
+            count += len(batch)
+        logger.info(f"Indexed {count} chunks of '{project_id}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+completion_stub.py
+
+Local stand-in for the OpenAI chat completions API, for testing and load testing without network access.
+It answers every request with a canned text, optionally streamed word by word.
+
+Usage:
+    python completion_stub.py [--port 8001] [--ttft-ms 300] [--token-ms 20] [--tokens 200]
+
+Then start the app with OPEN_AI_BASE_URL=http://localhost:8001/v1
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+from flask import Flask, Response, request, jsonify
+
+app = Flask(__name__)
+settings = {"ttft_ms": 300, "token_ms": 20, "tokens": 200}
+
+
+def answer_tokens() -> list:
+    """
+    Returns the words of the canned answer, each cited like a real answer.
+    """
+    words = [f"word{i}" for i in range(settings["tokens"])]
+    return [word + " " for word in words[:-1]] + [words[-1] + " ('StubDocument', page 1, chunk 0)."]
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    body = request.get_json(force=True)
+    model = body.get('model', 'stub')
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    tokens = answer_tokens()
+
+    if not body.get('stream'):
+        time.sleep((settings["ttft_ms"] + settings["token_ms"] * len(tokens)) / 1000)
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+        })
+
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }) + "\n\n"
+
+    def generate():
+        time.sleep(settings["ttft_ms"] / 1000)
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk({"content": token})
+            time.sleep(settings["token_ms"] / 1000)
+        yield chunk({}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return Response(generate(), mimetype='text/event-stream')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a stub of the chat completions API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--ttft-ms', type=float, default=300, help="Delay before the first token")
+    parser.add_argument('--token-ms', type=float, default=20, help="Delay between two tokens")
+    parser.add_argument('--tokens', type=int, default=200, help="Tokens in every answer")
+    args = parser.parse_args()
+    settings.update(ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=args.tokens)
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -4,8 +4,96 @@
 # SENTENCE_TRANSFORMER = 'intfloat/multilingual-e5-large'  # Multilengual heavy
 # SENTENCE_TRANSFORMER = 'distiluse-base-multilingual-cased-v2' # Multilengual medium
 SENTENCE_TRANSFORMER = 'all-MiniLM-L6-v2'  # English only 
+# Inference backend of the sentence transformer
+EMBEDDING_BACKEND = 'torch'  # 'torch' runs the model with PyTorch, 'onnx' exports it to ONNX and runs it with ONNX Runtime
+EMBEDDING_ONNX_QUANTIZATION = None  # With the onnx backend, int8-quantize the model for 'avx512_vnni', 'avx512', 'avx2' or 'arm64' CPUs. Check the accuracy with embedding_benchmark.py first
+EMBEDDING_ONNX_FOLDER = 'data/onnx'  # Where the ONNX exports of the models are kept
+EMBEDDING_THREADS = 0  # Intra-op threads used by the embedding model, 0 uses every core
+# Embedding processes of the ingestion jobs
+EMBEDDING_POOL_WORKERS = 0  # Processes shared by the ingestion jobs to encode chunks, 0 encodes in each upload's thread with the app's model. With gunicorn this is the total: each of the SERVER_WORKERS starts an equal share, at most its share of the cores
+EMBEDDING_POOL_THREADS = 1  # Inference threads of each embedding process, pinned to their own cores. Workers x threads should not exceed the cores
+EMBEDDING_POOL_SLICE_SIZE = 16  # Fewest chunks sent to an embedding process at a time. Raise INGESTION_BATCH_SIZE to keep every process busy
 OPEN_AI_MODEL = 'gpt-4o-mini' #go to https://platform.openai.com/docs/models for the full supported model list and the cost
 DB_ADDR = "http://qdrant"
 DB_PORT = 6333
+DB_GRPC_PORT = 6334  # Qdrant's gRPC port, used by async_server.py
+DB_PREFER_GRPC = True  # async_server.py searches Qdrant over gRPC, one multiplexed connection shared by every query. False uses REST
 WEB_SERVER_HOST = '0.0.0.0'
 WEB_SERVER_PORT = 5001
+SERVER_WORKERS = 2  # Worker processes when serving with gunicorn (gunicorn.conf.py), they share the preloaded model's memory. Must be 1 with VECTOR_STORE = 'faiss'
+SERVER_THREADS = 16  # Request threads of each gunicorn worker
+STARTUP_PRELOAD = True  # Load the model and create the clients at startup, False defers each one to the first request that needs it
+STARTUP_WARM_UP = True  # Run a short text through the tokenizers and the model at startup so the first request is not slower
+NLTK_DATA_DIR = None  # Extra folder searched first for the NLTK tokenizer data and used for its downloads
+NLTK_DOWNLOAD = True  # Download missing NLTK tokenizer data at startup. Set False on offline hosts to fail fast instead
+PDF_EXTRACTION_WORKERS = 1  # Number of processes, kept for every upload of the server, used to extract PDF pages. 1 keeps the extraction in the upload's background thread
+PDF_EXTRACTION_PAGES_PER_TASK = 20  # Pages handed to an extraction process at a time
+PDF_TEXT_ENGINE = 'pdfplumber'  # 'pdfium' reads the text layer with pypdfium2, much faster, and falls back to pdfplumber for empty, garbled or right to left pages
+PAGE_STORE_ENABLED = True  # Keep the extracted pages of every PDF, keyed by the file's hash, so re-uploads and rebuild_project.py skip PDF parsing
+PAGE_STORE_DB = 'data/pages.db'  # SQLite file holding the zlib-compressed page texts and sentence boundaries
+PAGE_STORE_COMPRESSION_LEVEL = 6  # zlib level of the stored pages, 1 is fastest, 9 is smallest
+INGESTION_BATCH_SIZE = 64  # Chunks embedded and upserted together while streaming a PDF into Qdrant
+INGESTION_QUEUE_SIZE = 4  # Batches allowed to wait between two ingestion stages. Bounds the memory used per upload
+UPSERT_MAX_POINTS = 256  # Most points sent to Qdrant in one upsert request
+UPSERT_MAX_BYTES = 4 * 1024 * 1024  # Most bytes in one upsert request, estimated as 4 per vector dimension plus the chunk text. Documents with long chunks get smaller requests
+UPSERT_IN_FLIGHT = 4  # Upsert requests sent to Qdrant at the same time, shared by all uploads
+UPSERT_RETRIES = 3  # Retries of a failed upsert request before the upload fails and can be resumed
+UPSERT_RETRY_BACKOFF_SECONDS = 0.5  # Wait before the first retry, doubled on every further retry
+DOCUMENT_REGISTRY_DB = 'data/documents.db'  # SQLite file recording the documents and chunk points stored in each project
+PROJECT_REGISTRY_DB = 'data/projects.db'  # SQLite file listing the projects, filled from the vector store on first use
+PROJECT_REGISTRY_TTL_SECONDS = 30  # How long the project list is served from memory before it is re-read, so other workers' changes show up
+EMBEDDING_CACHE_ENABLED = True  # Reuse the embeddings of texts and questions that were already encoded
+EMBEDDING_CACHE_DB = 'data/embeddings.db'  # SQLite file holding the cached float32 vectors
+EMBEDDING_CACHE_MAX_MB = 512  # Size bound of the cached vectors, least recently used entries are evicted first
+QUERY_BATCH_WAIT_MS = 5  # How long the first question of a batch waits for concurrent questions before being encoded
+QUERY_BATCH_MAX_SIZE = 32  # Largest number of questions encoded in one forward pass
+INGESTION_WORKERS = 2  # Number of PDFs processed at the same time
+INGESTION_MAX_QUEUED = 20  # Uploads allowed to wait for a worker, further uploads are rejected with HTTP 429
+JOBS_DB = 'data/jobs.db'  # SQLite file holding the state and timings of ingestion jobs
+FAILED_JOB_RETENTION_HOURS = 24  # How long the PDF of a failed upload is kept so its job can be resumed, it is deleted afterwards
+VECTOR_STORE = 'qdrant'  # 'qdrant' uses the Qdrant server at DB_ADDR, 'faiss' keeps local FAISS indexes for single-node deployments
+QDRANT_LAYOUT = 'collections'  # 'collections' gives each project its own Qdrant collection, 'shared' keeps every project in SHARED_COLLECTION, for thousands of small projects. Switch with migrate_layout.py
+SHARED_COLLECTION = 'projects'  # Qdrant collection holding every project with the 'shared' layout. It uses DEFAULT_STORAGE_PROFILE
+FAISS_INDEX_FOLDER = 'data/faiss'  # One folder per project with its FAISS index and payload store
+FAISS_LARGE_INDEX_TYPE = 'ivf'  # 'ivf' or 'hnsw', used once a project outgrows FAISS_LARGE_INDEX_THRESHOLD
+FAISS_LARGE_INDEX_THRESHOLD = 100000  # Vectors kept in an exact flat index before it is rebuilt as FAISS_LARGE_INDEX_TYPE
+FAISS_HNSW_EF_SEARCH = 64  # HNSW search depth, higher is more accurate and slower
+FAISS_IVF_NPROBE = 16  # IVF lists visited per search, higher is more accurate and slower
+FAISS_MMAP = True  # Memory-map the FAISS indexes for searches instead of reading them into RAM
+# Storage profiles selectable when a project is created. They apply to the Qdrant backend, see QdrantManager for the available keys
+STORAGE_PROFILES = {
+    'default': {},  # Full precision float32 vectors and payloads in RAM
+    'int8': {'quantization': 'scalar', 'vectors_on_disk': True},  # int8 vectors in RAM (4x smaller), originals on disk for rescoring
+    'binary': {'quantization': 'binary', 'vectors_on_disk': True},  # 1 bit per dimension in RAM (32x smaller), originals on disk for rescoring
+    'on_disk': {'vectors_on_disk': True, 'payload_on_disk': True, 'hnsw_on_disk': True},  # Everything on disk, slowest searches
+}
+DEFAULT_STORAGE_PROFILE = 'default'
+SEARCH_RESCORE = True  # Rescore the candidates found on quantized vectors with the original vectors
+SEARCH_OVERSAMPLING = 2.0  # Candidates fetched from quantized vectors per requested result before rescoring
+LEXICAL_INDEX_DB = 'data/lexical.db'  # SQLite FTS5 index used for BM25 keyword retrieval
+DENSE_CANDIDATES = 20  # Candidates fetched from the vector search per question
+LEXICAL_CANDIDATES = 20  # Candidates fetched from the BM25 keyword search per question, 0 disables it
+LEXICAL_MIN_SCORE = 2.0  # Keyword hits with a lower BM25 score are dropped, like dense hits below the question's threshold. A term found in about 1 chunk in 8 scores 2
+LEXICAL_STOPWORD_LANGUAGES = ('english',)  # NLTK stopword lists whose words are left out of keyword queries, e.g. add 'arabic' or 'hebrew'
+LEXICAL_MIN_TERM_LENGTH = 3  # Shorter question terms are left out of keyword queries, unless they hold a digit
+RETRIEVAL_RESULTS = 20  # Results kept after reciprocal-rank fusion of both searches
+RRF_K = 60  # Reciprocal-rank fusion constant, higher values flatten the rank weights
+CHUNK_MAX_WORDS = 300  # Largest number of words in a chunk
+CHUNK_SIZE_UNIT = 'words'  # 'words' cuts chunks at CHUNK_MAX_WORDS words, 'tokens' fills them up to the embedding model's sequence length
+CHUNK_MAX_TOKENS = 0  # With 'tokens', a smaller token limit per chunk, 0 uses the model's whole sequence length
+CHUNK_OVERLAP_SENTENCES = 1  # Sentences repeated from the end of the previous chunk at the start of the next one
+CONTEXT_TOKEN_BUDGET = 3000  # Tokens of excerpts sent to the LLM per question, counted with tiktoken when it is installed
+ANSWER_CACHE_ENABLED = True  # Reuse answers of repeated and near-duplicate questions
+ANSWER_CACHE_MAX_DISTANCE = 0.05  # Largest cosine distance between two questions sharing a cached answer
+ANSWER_CACHE_MAX_ENTRIES = 1000  # Cached answers kept in memory, least recently used ones are evicted first
+ANSWER_CACHE_TTL_SECONDS = 86400  # Age after which a cached answer is discarded
+ANSWER_CACHE_DB = 'data/answers.db'  # SQLite file counting the invalidations of each project, so a re-ingestion or deletion in one worker or tool drops the cached answers of every worker
+QUERY_BATCH_MAX_QUESTIONS = 1000  # Largest number of questions accepted by one /query_batch request
+QUERY_BATCH_LLM_CONCURRENCY = 8  # LLM completions run at the same time for /query_batch requests
+ASYNC_SERVER_PORT = 5002  # Port of async_server.py, which answers queries without holding a thread while they wait on Qdrant or the LLM
+ASYNC_MAX_IN_FLIGHT = 500  # Queries async_server.py works on at once. Further queries wait up to ASYNC_QUEUE_TIMEOUT_SECONDS, then get HTTP 503
+ASYNC_QUEUE_TIMEOUT_SECONDS = 2  # How long a query waits for one of the ASYNC_MAX_IN_FLIGHT slots
+ASYNC_SEARCH_CONCURRENCY = 64  # Vector and keyword searches run at the same time by async_server.py
+ASYNC_LLM_CONCURRENCY = 200  # LLM completions awaited at the same time by async_server.py
+ASYNC_STAGE_TIMEOUTS = {'encode': 5, 'search': 10, 'llm': 120}  # Seconds allowed for each query stage of async_server.py before it answers HTTP 504
+METRICS_RESPONSE_TIMINGS = True  # Add the per-stage timings breakdown to the JSON responses of queries and jobs
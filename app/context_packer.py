@@ -0,0 +1,132 @@
+"""
+context_packer.py
+
+Packs retrieved chunks into the LLM prompt under a token budget.
+"""
+
+import functools
+import logging
+import math
+
+from nltk.tokenize import sent_tokenize
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    """
+    Returns the tiktoken encoding of an OpenAI model, or None when tiktoken is not
+    installed or its encoding files cannot be loaded.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, prompt tokens are estimated from the text length")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Models newer than the installed tiktoken
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        logger.warning(f"Cannot load the tiktoken encoding of '{model}', prompt tokens are estimated: {e}")
+        return None
+
+
+def estimate_tokens(text: str, model: str = None) -> int:
+    """
+    Returns the number of LLM tokens of a text, counted with the model's tiktoken
+    encoding when a model is given and tiktoken is available. Otherwise it is estimated
+    on the high side: 4 ASCII characters per token and a token for every other character,
+    since Hebrew, Arabic or CJK text takes far more tokens per character than English.
+    """
+    encoding = _encoding(model) if model else None
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return math.ceil(ascii_chars / 4) + len(text) - ascii_chars
+
+
+def reference(chunk: dict) -> str:
+    """
+    Returns the citation header the prompt uses for a chunk.
+    """
+    return f"(PDF '{chunk['pdf_name']}', page {chunk['page']}, chunk {chunk['chunk_id']})"
+
+
+def strip_overlap(previous_text: str, text: str, overlap_sentences: int) -> str:
+    """
+    Removes the leading sentences that chunk_text copied from the end of the previous chunk.
+    """
+    if overlap_sentences <= 0:
+        return text
+    tail = ' '.join(sent_tokenize(previous_text)[-overlap_sentences:])
+    if tail and text.startswith(tail):
+        return text[len(tail):].lstrip()
+    return text
+
+
+def pack_context(ranked_chunks: list, token_budget: int, overlap_sentences: int = 1, model: str = None) -> list:
+    """
+    Selects and orders the chunks to send to the LLM.
+
+    Chunks that follow each other on the same PDF page are merged into one block in reading
+    order, and the overlap sentences they share are only kept once. Blocks are ordered by the
+    rank of their best chunk and their chunks are added while they fit in `token_budget`,
+    counted with the tokenizer of `model`, see estimate_tokens. A chunk that does not fit
+    is skipped, so the smaller chunks ranked after it can still use the budget.
+    Each returned chunk keeps its pdf_name, page and chunk_id so citations still match.
+    """
+    rank = {}
+    by_key = {}
+    for position, chunk in enumerate(ranked_chunks):
+        key = (chunk['pdf_name'], chunk['page'], chunk['chunk_id'])
+        if key not in by_key:
+            by_key[key] = chunk
+            rank[key] = position
+
+    # Group runs of consecutive chunk_ids on the same page
+    blocks = []
+    for key in sorted(by_key, key=lambda k: (k[0], k[1], k[2])):
+        previous = blocks[-1][-1] if blocks else None
+        if previous and previous[:2] == key[:2] and previous[2] + 1 == key[2]:
+            blocks[-1].append(key)
+        else:
+            blocks.append([key])
+    blocks.sort(key=lambda block: min(rank[key] for key in block))
+
+    packed = []
+    used_tokens = 0
+    for block in blocks:
+        previous_text = None
+        for key in block:
+            chunk = by_key[key]
+            text = chunk['text'] if previous_text is None else strip_overlap(previous_text, chunk['text'], overlap_sentences)
+            previous_text = chunk['text']
+            if not text:
+                continue
+
+            tokens = estimate_tokens(f"--- {reference(chunk)} ---\n{text}\n\n", model)
+            if used_tokens + tokens > token_budget:
+                continue
+            used_tokens += tokens
+            packed.append({**chunk, 'text': text})
+    return packed
+
+
+def pack_prompt(user_question: str, ranked_chunks: list, token_budget: int, overlap_sentences: int = 1, model: str = None) -> str:
+    """
+    Construct a prompt that includes the user question, retrieved chunks,
+    and instructions to answer only from these chunks.
+    The chunks are expected by rank and are packed under the token budget, see pack_context.
+    """
+    packed_chunks = pack_context(ranked_chunks, token_budget, overlap_sentences=overlap_sentences, model=model)
+
+    prompt_context = "Excerpts:\n"
+    for chunk in packed_chunks:
+        prompt_context += f"--- {reference(chunk)} ---\n{chunk['text']}\n\n"
+
+    prompt_question = f"User question: {user_question}\n\n"
+    return prompt_context + prompt_question
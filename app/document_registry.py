@@ -0,0 +1,158 @@
+"""
+document_registry.py
+
+Keeps track of the documents ingested into each project and derives content-addressed point IDs.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+def file_content_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_key(chunk: dict) -> str:
+    """
+    Identifies a chunk by its page, position on the page and text, independently of the
+    document revision it came from.
+    """
+    raw = f"{chunk['page']}\x1f{chunk['chunk_id']}\x1f{chunk['text']}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def point_id(content_hash: str, chunk: dict) -> str:
+    """
+    Derives a deterministic Qdrant point ID from the document name, content hash, page,
+    chunk_id and chunk text. The name keeps the points of a file uploaded to a project
+    under two names apart, so deleting one of them leaves the other intact.
+    """
+    raw = f"{chunk['pdf_name']}\x1f{content_hash}\x1f{chunk['page']}\x1f{chunk['chunk_id']}\x1f{chunk['text']}"
+    return str(uuid.UUID(hex=hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]))
+
+
+class DocumentRegistry:
+    """
+    SQLite-backed registry of the documents and chunk points stored in every project.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    project_id TEXT NOT NULL,
+                    pdf_name TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (project_id, pdf_name)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    project_id TEXT NOT NULL,
+                    pdf_name TEXT NOT NULL,
+                    chunk_key TEXT NOT NULL,
+                    point_id TEXT NOT NULL,
+                    PRIMARY KEY (project_id, pdf_name, chunk_key)
+                )
+            """)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def get_content_hash(self, project_id: str, pdf_name: str):
+        """
+        Returns the content hash of the registered document, or None if it is unknown.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_hash FROM documents WHERE project_id = ? AND pdf_name = ?",
+                (project_id, pdf_name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_chunk_points(self, project_id: str, pdf_name: str) -> dict:
+        """
+        Returns a {chunk_key: point_id} mapping of the document's stored chunks.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_key, point_id FROM chunks WHERE project_id = ? AND pdf_name = ?",
+                (project_id, pdf_name)
+            ).fetchall()
+        return dict(rows)
+
+    def save_document(self, project_id: str, pdf_name: str, content_hash: str, chunk_points: dict):
+        """
+        Replaces the registered revision of a document with the given chunk points.
+        """
+        with self._connect() as conn, conn:
+            conn.execute(
+                "DELETE FROM chunks WHERE project_id = ? AND pdf_name = ?",
+                (project_id, pdf_name)
+            )
+            conn.executemany(
+                "INSERT INTO chunks (project_id, pdf_name, chunk_key, point_id) VALUES (?, ?, ?, ?)",
+                [(project_id, pdf_name, key, pid) for key, pid in chunk_points.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(project_id, pdf_name, content_hash, chunk_count, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (project_id, pdf_name, content_hash, len(chunk_points), time.time())
+            )
+
+    def list_documents(self, project_id: str) -> list:
+        """
+        Returns the documents registered for the project, by name.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT pdf_name, content_hash, chunk_count, updated_at FROM documents "
+                "WHERE project_id = ? ORDER BY pdf_name",
+                (project_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def content_hashes(self) -> set:
+        """
+        Returns the content hashes of the documents registered in any project.
+        """
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT content_hash FROM documents")}
+
+    def delete_document(self, project_id: str, pdf_name: str):
+        """
+        Forgets a document and its chunk points.
+        """
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM chunks WHERE project_id = ? AND pdf_name = ?", (project_id, pdf_name))
+            conn.execute("DELETE FROM documents WHERE project_id = ? AND pdf_name = ?", (project_id, pdf_name))
+
+    def delete_project(self, project_id: str):
+        """
+        Forgets every document registered for the project.
+        """
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM chunks WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM documents WHERE project_id = ?", (project_id,))
@@ -0,0 +1,138 @@
+"""
+embedding_backends.py
+
+Loads the sentence transformer on the configured inference backend.
+"""
+
+import copy
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx')
+# Instruction sets supported by sentence_transformers.export_dynamic_quantized_onnx_model
+QUANTIZATION_TARGETS = ('arm64', 'avx2', 'avx512', 'avx512_vnni')
+
+
+def backend_id(backend: str = 'torch', quantization: str = None) -> str:
+    """
+    Names a backend and quantization combination, e.g. "torch" or "onnx-qint8-avx2".
+    Embeddings of different combinations differ slightly, so caches are keyed by it.
+    """
+    if backend == 'onnx' and quantization:
+        return f"onnx-qint8-{quantization}"
+    return backend
+
+
+def cache_model_name(model_name: str, backend: str = 'torch', quantization: str = None) -> str:
+    """
+    Returns the name embeddings of the model are cached under. PyTorch embeddings keep the
+    plain model name so caches written before the backends existed stay valid.
+    """
+    name = backend_id(backend, quantization)
+    return model_name if name == 'torch' else f"{model_name}@{name}"
+
+
+def onnx_file_name(quantization: str = None) -> str:
+    """
+    Returns the path of the ONNX graph inside an exported model folder.
+    """
+    return f"onnx/model_qint8_{quantization}.onnx" if quantization else "onnx/model.onnx"
+
+
+def export_onnx_model(model_name: str, export_folder: str, quantization: str = None) -> str:
+    """
+    Exports the model to ONNX under `export_folder`, adding a dynamically int8-quantized
+    graph for the given instruction set when `quantization` is set. Exports already on
+    disk are reused. Returns the folder of the exported model.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    if quantization and quantization not in QUANTIZATION_TARGETS:
+        raise ValueError(f"Unknown quantization target '{quantization}', use one of {QUANTIZATION_TARGETS}")
+
+    model_folder = os.path.join(export_folder, model_name.replace('/', '__'))
+    if not os.path.exists(os.path.join(model_folder, onnx_file_name())):
+        logger.info(f"Exporting '{model_name}' to ONNX in {model_folder}")
+        SentenceTransformer(model_name, backend='onnx').save_pretrained(model_folder)
+
+    if quantization and not os.path.exists(os.path.join(model_folder, onnx_file_name(quantization))):
+        logger.info(f"Quantizing the ONNX export of '{model_name}' to int8 for {quantization}")
+        model = SentenceTransformer(model_folder, backend='onnx')
+        export_dynamic_quantized_onnx_model(model, quantization, model_folder)
+    return model_folder
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = 'torch',
+    quantization: str = None,
+    threads: int = 0,
+    export_folder: str = 'data/onnx'
+):
+    """
+    Returns a SentenceTransformer running on PyTorch or on ONNX Runtime. Both expose the same
+    encode() API, so callers do not depend on the backend. `threads` sets the intra-op
+    threads of the inference session (0 lets the runtime use every core).
+    sentence_transformers is imported here, so importing this module stays cheap.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', use one of {BACKENDS}")
+
+    if backend == 'torch':
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name)
+    else:
+        import onnxruntime
+
+        model_folder = export_onnx_model(model_name, export_folder, quantization)
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        # Encodes of one process run one graph at a time
+        session_options.inter_op_num_threads = 1
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model = SentenceTransformer(
+            model_folder,
+            backend='onnx',
+            model_kwargs={
+                'file_name': onnx_file_name(quantization),
+                'provider': 'CPUExecutionProvider',
+                'session_options': session_options
+            }
+        )
+
+    logger.info(f"Loaded '{model_name}' on the {backend_id(backend, quantization)} backend")
+    return model
+
+
+def token_budget(model) -> int:
+    """
+    Returns how many text tokens the model embeds per input: its max_seq_length minus
+    the special tokens the tokenizer adds.
+    """
+    return model.max_seq_length - model.tokenizer.num_special_tokens_to_add(pair=False)
+
+
+def token_counter(model):
+    """
+    Returns a callable giving the number of tokenizer tokens of each sentence of a list,
+    special tokens excluded. It counts with its own copy of the tokenizer, since fast
+    tokenizers fail when one instance is used by several threads at once.
+    """
+    tokenizer = copy.deepcopy(model.tokenizer)
+    lock = threading.Lock()
+
+    def count(sentences: list) -> list:
+        if not sentences:
+            return []
+        with lock:
+            encoded = tokenizer(list(sentences), add_special_tokens=False)['input_ids']
+        return [len(ids) for ids in encoded]
+
+    return count
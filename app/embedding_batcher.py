@@ -0,0 +1,103 @@
+"""
+embedding_batcher.py
+
+Collects concurrent query encodes into shared batches.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Runs a single encoder thread that gathers the texts submitted by concurrent requests.
+    A batch is encoded as soon as `max_batch_size` texts are waiting or `max_wait_ms`
+    has passed since its first text arrived, and every caller receives its own vector.
+
+    The thread starts with the first submitted text of each process, so a batcher created
+    before the server forks its workers runs one thread in every worker.
+    """
+
+    def __init__(self, encoder, max_wait_ms: float = 5, max_batch_size: int = 32):
+        self.encoder = encoder
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+
+        self._queue = queue.Queue()
+        self._thread_pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        if self._thread_pid != os.getpid():
+            with self._start_lock:
+                if self._thread_pid != os.getpid():
+                    threading.Thread(target=self._run, name='embedding-batcher', daemon=True).start()
+                    self._thread_pid = os.getpid()
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues a text for the next batch and returns a future resolving to its float32 vector.
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode_one(self, text: str, timeout: float = None) -> np.ndarray:
+        """
+        Returns the float32 vector of a single text, blocking until its batch is encoded.
+        """
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self) -> list:
+        """
+        Blocks for the first text, then gathers more until the batch is full or the window closes.
+        """
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.encoder.encode(texts, convert_to_numpy=True).astype('float32')
+            except Exception as e:
+                logger.error(f"Error encoding a batch of {len(texts)} queries: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of encoded batches and their average size.
+        """
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,118 @@
+"""
+embedding_benchmark.py
+
+Compares the embedding backends with the PyTorch model on the chunks of a PDF.
+
+Every backend encodes the same chunks. Its vectors are compared with the PyTorch vectors
+(cosine similarity and top-k neighbour agreement), and its throughput is measured.
+
+Usage:
+    python embedding_benchmark.py <pdf_path> [--backends torch onnx onnx-qint8-avx2] [--chunks 1000] [--threads 0] [--k 10]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import config
+from embedding_backends import backend_id, load_embedding_model, QUANTIZATION_TARGETS
+from pdf_processor import PDFProcessor
+
+
+def pdf_chunks(pdf_path: str, count: int) -> list:
+    """
+    Returns up to `count` chunks of the PDF, cut as during ingestion.
+    """
+    chunks = []
+    for _, cleaned_text, _ in PDFProcessor.extract_pages(pdf_path, 0, None, config.PDF_TEXT_ENGINE):
+        if cleaned_text:
+            chunks.extend(PDFProcessor.chunk_text(cleaned_text, config.CHUNK_MAX_WORDS, config.CHUNK_OVERLAP_SENTENCES))
+        if len(chunks) >= count:
+            break
+    return chunks[:count]
+
+
+def parse_backend(name: str) -> tuple:
+    """
+    Splits a backend name such as "onnx-qint8-avx2" into ('onnx', 'avx2').
+    """
+    if name.startswith('onnx-qint8-'):
+        quantization = name[len('onnx-qint8-'):]
+        if quantization not in QUANTIZATION_TARGETS:
+            raise argparse.ArgumentTypeError(f"Unknown quantization target '{quantization}'")
+        return 'onnx', quantization
+    if name not in ('torch', 'onnx'):
+        raise argparse.ArgumentTypeError(f"Unknown backend '{name}'")
+    return name, None
+
+
+def encode(model, texts: list, batch_size: int) -> tuple:
+    """
+    Encodes the texts after a warm-up batch. Returns the normalized vectors and the texts per second.
+    """
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32), len(texts) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the accuracy and throughput of the embedding backends.")
+    parser.add_argument('pdf_path')
+    parser.add_argument('--backends', nargs='+', type=parse_backend, default=[('onnx', None), ('onnx', 'avx2')])
+    parser.add_argument('--chunks', type=int, default=1000, help="Chunks of the PDF encoded by every backend")
+    parser.add_argument('--threads', type=int, default=config.EMBEDDING_THREADS, help="Inference threads, 0 uses every core")
+    parser.add_argument('--batch-size', type=int, default=config.INGESTION_BATCH_SIZE)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    texts = pdf_chunks(args.pdf_path, args.chunks)
+    if len(texts) <= args.k:
+        parser.error(f"'{args.pdf_path}' holds only {len(texts)} chunks")
+
+    # Reference vectors and neighbours from the PyTorch model
+    reference_vectors, reference_rate = encode(
+        load_embedding_model(config.SENTENCE_TRANSFORMER, 'torch', threads=args.threads),
+        texts,
+        args.batch_size
+    )
+    reference_neighbours = np.argsort(-reference_vectors @ reference_vectors.T, axis=1)[:, 1:args.k + 1]
+
+    report = {
+        "model": config.SENTENCE_TRANSFORMER,
+        "chunks": len(texts),
+        "k": args.k,
+        "backends": {"torch": {"texts_per_second": reference_rate}}
+    }
+    for backend, quantization in args.backends:
+        if backend == 'torch':
+            continue
+        model = load_embedding_model(
+            config.SENTENCE_TRANSFORMER,
+            backend,
+            quantization=quantization,
+            threads=args.threads,
+            export_folder=config.EMBEDDING_ONNX_FOLDER
+        )
+        vectors, rate = encode(model, texts, args.batch_size)
+        cosine = np.sum(vectors * reference_vectors, axis=1)
+        neighbours = np.argsort(-vectors @ vectors.T, axis=1)[:, 1:args.k + 1]
+        agreement = np.mean([
+            len(set(found) & set(expected)) / args.k
+            for found, expected in zip(neighbours.tolist(), reference_neighbours.tolist())
+        ])
+        report["backends"][backend_id(backend, quantization)] = {
+            "texts_per_second": rate,
+            "speedup": rate / reference_rate,
+            "mean_cosine_to_torch": float(np.mean(cosine)),
+            "min_cosine_to_torch": float(np.min(cosine)),
+            f"top{args.k}_agreement": float(agreement)
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+embedding_cache.py
+
+Persistent SQLite cache of sentence embeddings placed in front of the sentence transformer.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Stores float32 embeddings keyed by the model name and a hash of the text.
+    The cache is bounded by `max_bytes` of vector data; the least recently used
+    entries are evicted first.
+
+    The size of the vector data is a running total in the database, updated in the
+    transactions that insert and delete entries, so every process sharing the file sees
+    it without scanning the table. Lookups do not write: the keys they find are marked
+    as used in memory and their recency is written with the next put_many(), or once
+    `max_pending_touches` keys are waiting.
+    """
+
+    def __init__(self, db_path: str, model_name: str, max_bytes: int, max_pending_touches: int = 4096):
+        self.db_path = db_path
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.max_pending_touches = max_pending_touches
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        # key -> time of its last lookup, not written to the database yet
+        self._touched = {}
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(sqlite3.connect(db_path, timeout=30)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_size (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    bytes INTEGER NOT NULL
+                )
+            """)
+            # Caches created before the running total existed are measured once
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_size (id, bytes) "
+                "SELECT 1, COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of this process, opened on its first use. Called with the
+        lock held. A cache created before the server forks its workers opens one
+        connection in every worker, since a SQLite connection must not cross a fork.
+        """
+        if self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn_pid = os.getpid()
+            self._touched = {}
+        return self._conn
+
+    @staticmethod
+    def _stored_bytes(conn: sqlite3.Connection) -> int:
+        """
+        Returns the running total of the vector data stored by every process.
+        """
+        return conn.execute("SELECT bytes FROM cache_size WHERE id = 1").fetchone()[0]
+
+    def _write_touches(self, conn: sqlite3.Connection):
+        """
+        Writes the recency of the keys found since the last write, in the open transaction.
+        """
+        if self._touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched = {}
+
+    def key(self, text: str) -> str:
+        """
+        Returns the cache key of a text for the cache's model.
+        """
+        return hashlib.sha256(f"{self.model_name}\x1f{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Returns a {key: vector} mapping of the cached keys and marks them as recently used.
+        """
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= self.max_pending_touches:
+                self._write_touches(conn)
+                conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Stores {key: vector} entries and evicts the least recently used ones above the size bound.
+        """
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            conn = self._connection()
+            self._write_touches(conn)
+            added = 0
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", row
+                )
+                if cursor.rowcount:
+                    added += len(row[1])
+            conn.execute("UPDATE cache_size SET bytes = bytes + ? WHERE id = 1", (added,))
+            stored_bytes = self._stored_bytes(conn)
+            if stored_bytes > self.max_bytes:
+                self._evict(conn, stored_bytes)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, stored_bytes: int):
+        """
+        Deletes the least recently used entries until the cache is 10% below its bound.
+        """
+        target = self.max_bytes * 0.9
+        while stored_bytes > target:
+            rows = conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            removed = sum(size for _, size in rows)
+            conn.execute("UPDATE cache_size SET bytes = bytes - ? WHERE id = 1", (removed,))
+            stored_bytes -= removed
+        logger.info(f"Evicted embedding cache entries, {stored_bytes} bytes remain")
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters and the current size of the cache.
+        """
+        with self._lock:
+            stored_bytes = self._stored_bytes(self._connection())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": stored_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class CachedEncoder:
+    """
+    Wraps a sentence transformer so that encode() only computes the vectors of texts that
+    are not in the embedding cache. Every other attribute is read from the wrapped model.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def encode(self, sentences: list, **kwargs) -> np.ndarray:
+        """
+        Returns a float32 array with one embedding per sentence.
+        """
+        keys = [self.cache.key(text) for text in sentences]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, sentences):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            kwargs['convert_to_numpy'] = True
+            computed = self.model.encode(list(missing.values()), **kwargs).astype('float32')
+            new_vectors = dict(zip(missing.keys(), computed))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        if not keys:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys])
@@ -0,0 +1,123 @@
+"""
+embedding_pool.py
+
+Pool of embedding processes shared by the ingestion jobs.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+from embedding_backends import export_onnx_model, load_embedding_model
+
+logger = logging.getLogger(__name__)
+
+# Model of the current worker process
+_worker_model = None
+
+
+def _init_worker(counter, model_name: str, backend: str, quantization: str, threads: int, export_folder: str, pin_threads: bool):
+    """
+    Loads the model in a new worker and pins the worker to its own cores.
+    """
+    global _worker_model
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    if pin_threads and hasattr(os, 'sched_setaffinity'):
+        cores = sorted(os.sched_getaffinity(0))
+        if len(cores) >= (index + 1) * threads:
+            os.sched_setaffinity(0, cores[index * threads:(index + 1) * threads])
+
+    _worker_model = load_embedding_model(
+        model_name,
+        backend,
+        quantization=quantization,
+        threads=threads,
+        export_folder=export_folder
+    )
+    logger.info(f"Embedding worker {index} ready (pid {os.getpid()}, {threads} threads)")
+
+
+def _encode_slice(sentences: list, kwargs: dict) -> np.ndarray:
+    return np.asarray(_worker_model.encode(sentences, **kwargs), dtype=np.float32)
+
+
+def _dimension() -> int:
+    return _worker_model.get_sentence_embedding_dimension()
+
+
+class EmbeddingPool:
+    """
+    Encodes texts across `workers` processes, each running its own copy of the model with
+    `threads_per_worker` inference threads pinned to distinct cores when the host has enough
+    of them. Every encode() call is cut into slices of at least `min_slice_size` texts that
+    are spread over the workers and returned in order, so concurrent ingestion jobs share
+    the workers instead of competing for the threads of one model.
+
+    The workers are forked when the pool is created, so it must be created at startup before
+    the process runs its own model or starts threads.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        backend: str = 'torch',
+        quantization: str = None,
+        workers: int = 2,
+        threads_per_worker: int = 1,
+        min_slice_size: int = 16,
+        pin_threads: bool = True,
+        export_folder: str = 'data/onnx'
+    ):
+        self.workers = workers
+        self.min_slice_size = min_slice_size
+        context = multiprocessing.get_context('fork')
+        if backend == 'onnx':
+            # Export once up front instead of racing in every worker
+            exporter = context.Process(target=export_onnx_model, args=(model_name, export_folder, quantization))
+            exporter.start()
+            exporter.join()
+        self._pool = context.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(
+                context.Value('i', 0),
+                model_name,
+                backend,
+                quantization,
+                threads_per_worker,
+                export_folder,
+                pin_threads
+            )
+        )
+        self._dimension = self._pool.apply(_dimension)
+        logger.info(f"Started {workers} embedding workers with {threads_per_worker} threads each")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(self, sentences: list, **kwargs) -> np.ndarray:
+        """
+        Returns a float32 array with one embedding per sentence, in the order of `sentences`.
+        """
+        sentences = list(sentences)
+        if not sentences:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+
+        kwargs['convert_to_numpy'] = True
+        kwargs.pop('show_progress_bar', None)
+        slice_size = max(self.min_slice_size, math.ceil(len(sentences) / self.workers))
+        slices = [sentences[i:i + slice_size] for i in range(0, len(sentences), slice_size)]
+        return np.concatenate(self._pool.starmap(_encode_slice, [(part, kwargs) for part in slices]))
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self._pool.terminate()
+        self._pool.join()
@@ -0,0 +1,132 @@
+"""
+extraction_benchmark.py
+
+Compares the PDF text engines on a folder of fixture PDFs.
+
+Every PDF is read with pdfplumber, with pdfium alone and with pdfium falling back to
+pdfplumber per page. The report gives the pages per second of each engine and how well
+their cleaned page texts agree with pdfplumber's (word-level F1 score).
+
+Usage:
+    python extraction_benchmark.py <pdf_or_folder> [<pdf_or_folder> ...] [--max-pages 500]
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+
+from pdf_processor import PDFProcessor, PdfiumExtractor, open_extractor
+
+
+def pdf_paths(paths: list) -> list:
+    """
+    Expands folders into the PDFs they contain.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, '**', '*.pdf'), recursive=True)))
+        else:
+            found.append(path)
+    return found
+
+
+def word_f1(text: str, reference: str) -> float:
+    """
+    Returns the F1 score of the words of `text` against the words of `reference`.
+    """
+    words, reference_words = Counter(text.split()), Counter(reference.split())
+    if not words and not reference_words:
+        return 1.0
+    common = sum((words & reference_words).values())
+    if not common:
+        return 0.0
+    precision = common / sum(words.values())
+    recall = common / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def read_pages(pdf_path: str, engine: str, max_pages: int) -> tuple:
+    """
+    Returns the cleaned text of the first max_pages pages, the seconds spent and the
+    number of pages read with the pdfplumber fallback.
+    """
+    started = time.perf_counter()
+    extractor = open_extractor(pdf_path, engine)
+    try:
+        texts = [
+            PDFProcessor.clean_text(extractor.page_text(page_index) or '')
+            for page_index in range(min(extractor.page_count, max_pages))
+        ]
+    finally:
+        extractor.close()
+    return texts, time.perf_counter() - started, getattr(extractor, 'fallback_pages', 0)
+
+
+def read_pages_pdfium_only(pdf_path: str, max_pages: int) -> tuple:
+    """
+    Same as read_pages with pdfium and no fallback. Also returns the pages the fallback would take.
+    """
+    started = time.perf_counter()
+    extractor = PdfiumExtractor(pdf_path)
+    try:
+        texts = [extractor.raw_page_text(page_index) for page_index in range(min(extractor.page_count, max_pages))]
+    finally:
+        extractor.close()
+    elapsed = time.perf_counter() - started
+    fallback_pages = sum(1 for text in texts if PdfiumExtractor.needs_fallback(text))
+    return [PDFProcessor.clean_text(text) for text in texts], elapsed, fallback_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the speed and agreement of the PDF text engines.")
+    parser.add_argument('paths', nargs='+', help="PDF files or folders of PDFs")
+    parser.add_argument('--max-pages', type=int, default=500, help="Pages read per PDF")
+    args = parser.parse_args()
+
+    paths = pdf_paths(args.paths)
+    if not paths:
+        parser.error("No PDF found")
+
+    totals = {name: {"pages": 0, "seconds": 0.0, "f1_sum": 0.0, "fallback_pages": 0}
+              for name in ('pdfplumber', 'pdfium_only', 'pdfium')}
+    documents = {}
+    for path in paths:
+        reference, seconds, _ = read_pages(path, 'pdfplumber', args.max_pages)
+        results = {
+            'pdfplumber': (reference, seconds, 0),
+            'pdfium_only': read_pages_pdfium_only(path, args.max_pages),
+            'pdfium': read_pages(path, 'pdfium', args.max_pages)
+        }
+
+        documents[path] = {}
+        for name, (texts, seconds, fallback_pages) in results.items():
+            f1 = [word_f1(text, expected) for text, expected in zip(texts, reference)]
+            totals[name]["pages"] += len(texts)
+            totals[name]["seconds"] += seconds
+            totals[name]["f1_sum"] += sum(f1)
+            totals[name]["fallback_pages"] += fallback_pages
+            documents[path][name] = {
+                "pages_per_second": len(texts) / seconds if seconds else None,
+                "mean_f1_to_pdfplumber": sum(f1) / len(f1) if f1 else None,
+                "min_f1_to_pdfplumber": min(f1) if f1 else None,
+                "fallback_pages": fallback_pages
+            }
+
+    report = {"documents": documents, "engines": {}}
+    for name, total in totals.items():
+        report["engines"][name] = {
+            "pages": total["pages"],
+            "pages_per_second": total["pages"] / total["seconds"] if total["seconds"] else None,
+            "mean_f1_to_pdfplumber": total["f1_sum"] / total["pages"] if total["pages"] else None,
+            # For pdfium_only, the pages the fallback would have re-read
+            "fallback_pages": total["fallback_pages"]
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,469 @@
+"""
+faiss_manager.py
+
+Contains FaissManager, a local vector store keeping one FAISS index per project on disk.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import zlib
+from contextlib import closing
+
+import faiss
+import numpy as np
+
+from vector_store import VectorStore, Collection, SearchHit, SearchFilter
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.faiss'
+PAYLOAD_FILE = 'payloads.db'
+
+
+class FaissManager(VectorStore):
+    """
+    Stores every project in its own folder holding a FAISS index and a SQLite side store.
+
+    Vectors are L2-normalized and searched by inner product, which ranks them by cosine
+    similarity like the Qdrant collections. New projects use an exact flat index; once a
+    project holds more than `large_index_threshold` vectors it is rebuilt as an IVF or HNSW
+    index. The side store maps point IDs to the index's integer IDs and keeps the payloads
+    as compressed JSON. A point that is replaced or deleted is removed from the side store,
+    so indexes that cannot remove vectors (HNSW) simply skip it at search time.
+
+    The side store also keeps the pdf_name and page of every point in indexed columns.
+    Filtered searches select the matching integer IDs there and hand them to FAISS as
+    an ID selector, so the index only scores the matching vectors.
+
+    Loaded indexes are kept in memory and written back whole by flush(), so a project
+    must only be served by one process: gunicorn refuses this backend with more than
+    one worker.
+    """
+
+    # Added vectors are only persisted by flush()
+    writes_through = False
+
+    def __init__(
+        self,
+        index_folder: str,
+        embedding_model,
+        large_index_type: str = 'ivf',
+        large_index_threshold: int = 100000,
+        hnsw_ef_search: int = 64,
+        ivf_nprobe: int = 16,
+        use_mmap: bool = True
+    ):
+        self.index_folder = index_folder
+        self.model = embedding_model
+        self.large_index_type = large_index_type
+        self.large_index_threshold = large_index_threshold
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nprobe = ivf_nprobe
+        self.use_mmap = use_mmap
+
+        # project_id -> (index, writable)
+        self._indexes = {}
+        self._dirty = set()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._upgraded = set()
+        os.makedirs(index_folder, exist_ok=True)
+
+    # -------------------------------------------------------------------------
+    #                               Helpers
+    # -------------------------------------------------------------------------
+    def _project_dir(self, project_id: str) -> str:
+        if not project_id or project_id.startswith('.') or os.sep in project_id or '/' in project_id:
+            raise ValueError(f"Invalid project name '{project_id}'")
+        return os.path.join(self.index_folder, project_id)
+
+    def _lock(self, project_id: str) -> threading.RLock:
+        with self._locks_guard:
+            return self._locks.setdefault(project_id, threading.RLock())
+
+    def _connect(self, project_id: str):
+        return closing(sqlite3.connect(os.path.join(self._project_dir(project_id), PAYLOAD_FILE), timeout=30))
+
+    def _exists(self, project_id: str) -> bool:
+        return os.path.exists(os.path.join(self._project_dir(project_id), PAYLOAD_FILE))
+
+    def _upgrade(self, project_id: str):
+        """
+        Adds the pdf_name and page columns to side stores created before they existed.
+        """
+        if project_id in self._upgraded:
+            return
+        with self._connect(project_id) as conn, conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(points)")}
+            if 'pdf_name' not in columns:
+                logger.info(f"Adding the document columns to the side store of '{project_id}'")
+                conn.execute("ALTER TABLE points ADD COLUMN pdf_name TEXT")
+                conn.execute("ALTER TABLE points ADD COLUMN page INTEGER")
+                rows = conn.execute("SELECT point_id, payload FROM points").fetchall()
+                updates = []
+                for point_id, payload in rows:
+                    payload = json.loads(zlib.decompress(payload))
+                    updates.append((payload.get('pdf_name'), payload.get('page'), point_id))
+                conn.executemany("UPDATE points SET pdf_name = ?, page = ? WHERE point_id = ?", updates)
+                conn.execute("CREATE INDEX IF NOT EXISTS points_document ON points (pdf_name, page)")
+        self._upgraded.add(project_id)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _new_flat_index(self) -> faiss.Index:
+        dimension = self.model.get_sentence_embedding_dimension()
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    def _load_index(self, project_id: str, writable: bool) -> faiss.Index:
+        """
+        Returns the project's index, memory-mapping it for searches when possible and
+        reading it fully into memory before it is modified.
+        """
+        cached = self._indexes.get(project_id)
+        if cached is not None and (cached[1] or not writable):
+            return cached[0]
+
+        path = os.path.join(self._project_dir(project_id), INDEX_FILE)
+        if not os.path.exists(path):
+            index = self._new_flat_index()
+        elif self.use_mmap and not writable:
+            try:
+                index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                index = faiss.read_index(path)
+                writable = True
+        else:
+            index = faiss.read_index(path)
+        self._configure(index)
+        self._indexes[project_id] = (index, writable)
+        return index
+
+    def _configure(self, index: faiss.Index):
+        """
+        Applies the search-time parameters of IVF and HNSW indexes.
+        """
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = self.hnsw_ef_search
+        elif isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = self.ivf_nprobe
+
+    def _search_parameters(self, index: faiss.Index, selector, selected: int):
+        """
+        Returns search parameters restricting a search to the IDs of `selector`, of the
+        type the wrapped index expects. HNSW searches get a larger candidate list when few
+        vectors are selected, since most of the graph neighbours they visit are filtered out.
+        """
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+        if isinstance(inner, faiss.IndexHNSW):
+            ef_search = min(index.ntotal, self.hnsw_ef_search * index.ntotal // max(1, selected))
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=max(self.hnsw_ef_search, ef_search))
+        if isinstance(inner, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.ivf_nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def _maybe_rebuild(self, project_id: str, index: faiss.Index) -> faiss.Index:
+        """
+        Rebuilds a flat index as the configured large index type once it outgrows the threshold.
+        """
+        if not isinstance(index, faiss.IndexIDMap2) or index.ntotal <= self.large_index_threshold:
+            return index
+        if not isinstance(faiss.downcast_index(index.index), faiss.IndexFlat):
+            return index
+
+        with self._connect(project_id) as conn:
+            live_ids = np.array([row[0] for row in conn.execute("SELECT int_id FROM points")], dtype=np.int64)
+        vectors = np.vstack([index.reconstruct(int(i)) for i in live_ids])
+        dimension = vectors.shape[1]
+
+        if self.large_index_type == 'hnsw':
+            rebuilt = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dimension, 32, faiss.METRIC_INNER_PRODUCT))
+        else:
+            # IVF indexes store the IDs themselves and support removals without an ID map
+            nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39))
+            quantizer = faiss.IndexFlatIP(dimension)
+            rebuilt = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            rebuilt.train(vectors)
+        rebuilt.add_with_ids(vectors, live_ids)
+        self._configure(rebuilt)
+        logger.info(f"Rebuilt index of '{project_id}' as {self.large_index_type} with {len(live_ids)} vectors")
+        return rebuilt
+
+    # -------------------------------------------------------------------------
+    #                             Collections
+    # -------------------------------------------------------------------------
+    def ensure_collection_exists(self, project_id: str, storage_profile: str = None):
+        """
+        Creates the project's index folder if it doesn't exist.
+        """
+        with self._lock(project_id):
+            if not self._exists(project_id):
+                logger.info(f"Creating new FAISS index for project '{project_id}'")
+                self.create_collection(project_id)
+
+    def create_collection(self, project_id: str, storage_profile: str = None):
+        """
+        Creates the index folder and side store of a new project.
+        Storage profiles only apply to Qdrant and are ignored.
+        """
+        with self._lock(project_id):
+            if self._exists(project_id):
+                raise ValueError(f"Collection '{project_id}' already exists")
+            os.makedirs(self._project_dir(project_id), exist_ok=True)
+            with self._connect(project_id) as conn, conn:
+                conn.execute("""
+                    CREATE TABLE points (
+                        point_id TEXT PRIMARY KEY,
+                        int_id INTEGER NOT NULL UNIQUE,
+                        payload BLOB NOT NULL,
+                        pdf_name TEXT,
+                        page INTEGER
+                    )
+                """)
+                conn.execute("CREATE INDEX points_document ON points (pdf_name, page)")
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                conn.execute("INSERT INTO meta (key, value) VALUES ('next_id', 0)")
+
+    def delete_collection(self, project_id: str):
+        """
+        Deletes the project's index folder.
+        """
+        with self._lock(project_id):
+            self._indexes.pop(project_id, None)
+            self._dirty.discard(project_id)
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+
+    def replace_collection(self, project_id: str, staging_id: str, storage_profile: str = None):
+        """
+        Persists the staging project and renames its folder to the project's, after
+        moving the project's old folder aside, so the project is only missing between
+        two renames.
+        """
+        self.flush(staging_id)
+        with self._lock(project_id), self._lock(staging_id):
+            for name in (project_id, staging_id):
+                self._indexes.pop(name, None)
+                self._dirty.discard(name)
+                self._upgraded.discard(name)
+            project_dir = self._project_dir(project_id)
+            replaced_dir = os.path.join(self.index_folder, f".{project_id}.replaced")
+            shutil.rmtree(replaced_dir, ignore_errors=True)
+            if os.path.exists(project_dir):
+                os.rename(project_dir, replaced_dir)
+            os.rename(self._project_dir(staging_id), project_dir)
+            shutil.rmtree(replaced_dir, ignore_errors=True)
+
+    def get_collections(self) -> list:
+        """
+        Returns a list of all existing projects.
+        """
+        return [
+            Collection(name=name)
+            for name in sorted(os.listdir(self.index_folder))
+            if os.path.exists(os.path.join(self.index_folder, name, PAYLOAD_FILE))
+        ]
+
+    # -------------------------------------------------------------------------
+    #                               Points
+    # -------------------------------------------------------------------------
+    def upsert_points(self, project_id: str, points: list, batch_size: int = None, on_batch=None):
+        """
+        Adds the given points to the project's index. Call flush() to persist them.
+        """
+        if not points:
+            return
+        with self._lock(project_id):
+            self._upgrade(project_id)
+            index = self._load_index(project_id, writable=True)
+            with self._connect(project_id) as conn, conn:
+                next_id = conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()[0]
+                int_ids = np.arange(next_id, next_id + len(points), dtype=np.int64)
+
+                # Replaced points get a new integer ID; their old vector is dropped
+                replaced = self._int_ids(conn, [point['id'] for point in points])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO points (point_id, int_id, payload, pdf_name, page) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            str(point['id']),
+                            int(int_id),
+                            zlib.compress(json.dumps(point['payload']).encode('utf-8')),
+                            point['payload'].get('pdf_name'),
+                            point['payload'].get('page')
+                        )
+                        for point, int_id in zip(points, int_ids)
+                    ]
+                )
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'next_id'", (next_id + len(points),))
+
+            self._remove_vectors(index, replaced)
+            index.add_with_ids(self._normalize([point['vector'] for point in points]), int_ids)
+            index = self._maybe_rebuild(project_id, index)
+            self._indexes[project_id] = (index, True)
+            self._dirty.add(project_id)
+        if on_batch is not None:
+            on_batch(points)
+
+    def delete_points(self, project_id: str, point_ids: list):
+        """
+        Deletes the points with the given IDs and persists the index.
+        """
+        with self._lock(project_id):
+            index = self._load_index(project_id, writable=True)
+            with self._connect(project_id) as conn, conn:
+                int_ids = self._int_ids(conn, point_ids)
+                conn.executemany("DELETE FROM points WHERE point_id = ?", [(str(pid),) for pid in point_ids])
+            self._remove_vectors(index, int_ids)
+            self._dirty.add(project_id)
+            self.flush(project_id)
+
+    def delete_document(self, project_id: str, pdf_name: str):
+        """
+        Deletes every point of the given document and persists the index.
+        """
+        with self._lock(project_id):
+            self._upgrade(project_id)
+            with self._connect(project_id) as conn:
+                point_ids = [row[0] for row in conn.execute("SELECT point_id FROM points WHERE pdf_name = ?", (pdf_name,))]
+            if point_ids:
+                self.delete_points(project_id, point_ids)
+
+    @staticmethod
+    def _selected_ids(conn, search_filter: SearchFilter) -> np.ndarray:
+        """
+        Returns the integer IDs of the points matching the filter.
+        """
+        conditions, params = [], []
+        if search_filter.pdf_names:
+            conditions.append(f"pdf_name IN ({','.join('?' * len(search_filter.pdf_names))})")
+            params.extend(search_filter.pdf_names)
+        if search_filter.min_page is not None:
+            conditions.append("page >= ?")
+            params.append(search_filter.min_page)
+        if search_filter.max_page is not None:
+            conditions.append("page <= ?")
+            params.append(search_filter.max_page)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return np.array([row[0] for row in conn.execute(f"SELECT int_id FROM points{where}", params)], dtype=np.int64)
+
+    @staticmethod
+    def _int_ids(conn, point_ids: list) -> list:
+        int_ids = []
+        for i in range(0, len(point_ids), 500):
+            batch = [str(pid) for pid in point_ids[i:i + 500]]
+            placeholders = ",".join("?" * len(batch))
+            int_ids.extend(
+                row[0] for row in conn.execute(
+                    f"SELECT int_id FROM points WHERE point_id IN ({placeholders})", batch
+                )
+            )
+        return int_ids
+
+    @staticmethod
+    def _remove_vectors(index: faiss.Index, int_ids: list):
+        if not int_ids:
+            return
+        try:
+            index.remove_ids(np.array(int_ids, dtype=np.int64))
+        except RuntimeError:
+            # HNSW cannot remove vectors, they are skipped at search time instead
+            pass
+
+    def flush(self, project_id: str):
+        """
+        Writes the project's index to disk if it has unsaved changes.
+        """
+        with self._lock(project_id):
+            if project_id not in self._dirty:
+                return
+            index, _ = self._indexes[project_id]
+            path = os.path.join(self._project_dir(project_id), INDEX_FILE)
+            faiss.write_index(index, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            self._dirty.discard(project_id)
+
+    def iter_points(self, project_id: str, batch_size: int = 1000):
+        """
+        Yields every live point of the project from the side store.
+        """
+        last_id = -1
+        while True:
+            with self._connect(project_id) as conn:
+                rows = conn.execute(
+                    "SELECT int_id, point_id, payload FROM points WHERE int_id > ? ORDER BY int_id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            for _, point_id, payload in rows:
+                yield {"id": point_id, "payload": json.loads(zlib.decompress(payload))}
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def search(self, project_id: str, query_vector: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Returns the `limit` closest live points by cosine similarity.
+        """
+        return self.search_batch(project_id, [query_vector], limit=limit, search_filter=search_filter)[0]
+
+    def search_batch(self, project_id: str, query_vectors: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Searches all the query vectors with one matrix search and returns one hit list per
+        vector. With a `search_filter`, only the vectors of the matching points are scored.
+        """
+        with self._lock(project_id):
+            if not self._exists(project_id):
+                raise ValueError(f"Collection '{project_id}' does not exist")
+            index = self._load_index(project_id, writable=False)
+            if search_filter is not None:
+                self._upgrade(project_id)
+            with self._connect(project_id) as conn:
+                if search_filter is not None:
+                    selected = self._selected_ids(conn, search_filter)
+                    if not len(selected) or not index.ntotal or not len(query_vectors):
+                        return [[] for _ in query_vectors]
+                    # Only live points are selected, no need to over-fetch
+                    k = min(index.ntotal, limit, len(selected))
+                    params = self._search_parameters(index, faiss.IDSelectorBatch(selected), len(selected))
+                    scores, ids = index.search(self._normalize(query_vectors), k, params=params)
+                else:
+                    live_count = conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+                    if not live_count or not index.ntotal or not len(query_vectors):
+                        return [[] for _ in query_vectors]
+
+                    # Over-fetch by the number of vectors that no longer have a point
+                    k = min(index.ntotal, limit + max(0, index.ntotal - live_count))
+                    scores, ids = index.search(self._normalize(query_vectors), k)
+                found = [
+                    [(int(i), float(score)) for i, score in zip(row_ids, row_scores) if i >= 0]
+                    for row_ids, row_scores in zip(ids, scores)
+                ]
+                int_ids = list({i for row in found for i, _ in row})
+                rows = []
+                for start in range(0, len(int_ids), 500):
+                    batch = int_ids[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows += conn.execute(
+                        f"SELECT int_id, point_id, payload FROM points WHERE int_id IN ({placeholders})",
+                        batch
+                    ).fetchall()
+
+        points = {int_id: (point_id, json.loads(zlib.decompress(payload))) for int_id, point_id, payload in rows}
+        results = []
+        for row in found:
+            hits = []
+            for int_id, score in row:
+                if int_id in points:
+                    point_id, payload = points[int_id]
+                    hits.append(SearchHit(id=point_id, score=score, payload=payload))
+                if len(hits) == limit:
+                    break
+            results.append(hits)
+        return results
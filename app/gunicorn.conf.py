@@ -0,0 +1,76 @@
+"""
+gunicorn.conf.py
+
+Serves the app with several worker processes, from the app folder:
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported and its components are loaded once in the master process before the
+workers are forked, so the workers share the model weights through copy-on-write instead
+of each loading its own copy. Threads do not survive a fork, so every worker starts its
+own embedding pool, with its share of EMBEDDING_POOL_WORKERS, and background threads
+and warms up after the fork. The startup time
+and memory of the master and of every worker are logged, PSS showing the shared pages
+split between the processes.
+
+Socket.IO progress events need sticky sessions with more than one worker; the job status
+at /jobs/<job_id> can be polled from any worker. Every worker keeps its own metrics and
+cached answers; answer cache invalidations reach all of them through ANSWER_CACHE_DB.
+
+The FAISS backend keeps its indexes in each process's memory and writes them back to
+the same files, so it is refused with more than one worker.
+"""
+
+import os
+import sys
+import time
+
+# gunicorn reads this file before it adds the app folder to the import path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from startup import log_startup
+
+if config.VECTOR_STORE == 'faiss' and config.SERVER_WORKERS > 1:
+    raise RuntimeError(
+        "The FAISS backend cannot be shared by several worker processes, "
+        "set SERVER_WORKERS = 1 or use VECTOR_STORE = 'qdrant'"
+    )
+
+bind = f"{config.WEB_SERVER_HOST}:{config.WEB_SERVER_PORT}"
+workers = config.SERVER_WORKERS
+worker_class = 'gthread'
+threads = config.SERVER_THREADS
+preload_app = True
+# Uploads are answered once queued, but LLM answers can take a while
+timeout = 120
+
+
+def when_ready(server):
+    """
+    Runs in the master once the app is imported, before the workers are forked.
+    """
+    import app
+
+    started = time.perf_counter()
+    app.job_queue.recover_interrupted()
+    app.expire_failed_uploads()
+    if config.STARTUP_PRELOAD:
+        # ONNX Runtime sessions start their thread pools when created, and those threads
+        # would be missing in the forked workers, so each worker loads its own ONNX model
+        app.load_components(include_model=config.EMBEDDING_BACKEND == 'torch')
+    log_startup('Master loaded the app', started)
+
+
+def post_fork(server, worker):
+    """
+    Runs in every worker right after the fork.
+    """
+    import app
+
+    started = time.perf_counter()
+    app.start_embedding_pool(server_workers=config.SERVER_WORKERS)
+    if config.STARTUP_PRELOAD:
+        app.load_components()
+    if config.STARTUP_WARM_UP:
+        app.warm_up()
+    log_startup(f'Worker {worker.age} started', started)
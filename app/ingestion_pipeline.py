@@ -0,0 +1,261 @@
+"""
+ingestion_pipeline.py
+
+Streams PDF chunks through embedding and vector-store upserts.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from document_registry import chunk_key, point_id
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class IngestionPipeline:
+    """
+    Runs the extract -> chunk -> embed -> upsert stages of one PDF concurrently.
+
+    Chunks are grouped into fixed-size batches and handed from stage to stage through
+    bounded queues, so at most `queue_size` batches wait between two stages. Peak memory
+    is bounded by the batch size instead of the document size, and the page progress
+    emitted while chunking follows the slowest stage because of the backpressure.
+
+    Point IDs are content-addressed. Chunks listed in `existing_points` are already stored
+    in Qdrant and skip the embed and upsert stages. When a lexical index is given, the
+    upsert stage also adds the new chunks to it.
+
+    The upsert stage sends every batch waiting in its queue in one upsert_points() call,
+    so a slow vector store gets several concurrent requests. When `checkpoint` is given,
+    it is called with {chunk key: point ID} for every batch once it is stored, and those
+    chunks can be passed back in `existing_points` to resume an interrupted ingestion.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        vector_store,
+        socketio_instance,
+        socket_id: str,
+        batch_size: int = 64,
+        queue_size: int = 4,
+        lexical_index=None,
+        checkpoint=None
+    ):
+        self.model = embedding_model
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.checkpoint = checkpoint
+        self.socketio = socketio_instance
+        self.socket_id = socket_id
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        self._failed = threading.Event()
+        self._error = None
+        self._started_at = None
+        self.chunk_points = {}
+        self.stats = {
+            "chunks": 0,
+            "unchanged": 0,
+            "embedded": 0,
+            "upserted": 0,
+            "chunk_seconds": 0.0,
+            "embed_seconds": 0.0,
+            "upsert_seconds": 0.0,
+        }
+
+    def run(self, project_id: str, chunks, content_hash: str, existing_points: dict = None) -> dict:
+        """
+        Consumes the `chunks` iterable in the calling thread while embedding and upserting
+        run in two worker threads. Returns the per-stage stats, or raises the first error
+        raised by any stage. Afterwards `chunk_points` maps the chunk key of every chunk of
+        the document to its point ID.
+        """
+        self._started_at = time.perf_counter()
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+
+        workers = [
+            threading.Thread(target=self._embed_stage, args=(embed_queue, upsert_queue), daemon=True),
+            threading.Thread(target=self._upsert_stage, args=(project_id, upsert_queue), daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._chunk_stage(chunks, embed_queue, content_hash, existing_points or {})
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(embed_queue, _END)
+            for worker in workers:
+                worker.join()
+
+        if self._error is not None:
+            raise self._error
+
+        self.stats["total_seconds"] = time.perf_counter() - self._started_at
+        return self.stats
+
+    def _chunk_stage(self, chunks, embed_queue: queue.Queue, content_hash: str, existing_points: dict):
+        """
+        Assigns point IDs and groups the new chunks into batches of `batch_size`. The time
+        spent waiting for room in the embed queue is not counted as chunking time.
+        """
+        batch = []
+        busy_since = time.perf_counter()
+        for chunk in chunks:
+            if self._failed.is_set():
+                return
+            key = chunk_key(chunk)
+            if key in existing_points:
+                self.chunk_points[key] = existing_points[key]
+                self.stats["unchanged"] += 1
+                continue
+
+            chunk['id'] = point_id(content_hash, chunk)
+            self.chunk_points[key] = chunk['id']
+            batch.append(chunk)
+            if len(batch) == self.batch_size:
+                self.stats["chunks"] += len(batch)
+                self.stats["chunk_seconds"] += time.perf_counter() - busy_since
+                self._put(embed_queue, batch)
+                busy_since = time.perf_counter()
+                batch = []
+        if batch:
+            self.stats["chunks"] += len(batch)
+        self.stats["chunk_seconds"] += time.perf_counter() - busy_since
+        if batch:
+            self._put(embed_queue, batch)
+
+    def _embed_stage(self, embed_queue: queue.Queue, upsert_queue: queue.Queue):
+        """
+        Encodes each chunk batch and turns it into vector-store points.
+        """
+        try:
+            while True:
+                batch = embed_queue.get()
+                if batch is _END or self._failed.is_set():
+                    break
+
+                started = time.perf_counter()
+                embeddings = self.model.encode([chunk['text'] for chunk in batch]).astype('float32')
+                points = []
+                for chunk, embedding in zip(batch, embeddings):
+                    points.append({
+                        "id": chunk['id'],
+                        "vector": embedding.tolist(),
+                        "payload": {
+                            "pdf_name": chunk['pdf_name'],
+                            "page": chunk['page'],
+                            "chunk_id": chunk['chunk_id'],
+                            "text": chunk['text']
+                        }
+                    })
+                self.stats["embed_seconds"] += time.perf_counter() - started
+                self.stats["embedded"] += len(points)
+                self._put(upsert_queue, points)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(upsert_queue, _END)
+            self._drain(embed_queue)
+
+    def _upsert_stage(self, project_id: str, upsert_queue: queue.Queue):
+        """
+        Upserts the batches of points and reports the throughput of every stage.
+        """
+        try:
+            ended = False
+            while not ended:
+                points = upsert_queue.get()
+                if points is _END or self._failed.is_set():
+                    break
+
+                # Send the batches that queued up meanwhile along with this one
+                while True:
+                    try:
+                        waiting = upsert_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if waiting is _END:
+                        ended = True
+                        break
+                    points = points + waiting
+
+                started = time.perf_counter()
+                self.vector_store.upsert_points(
+                    project_id, points, on_batch=lambda batch: self._committed(project_id, batch)
+                )
+                self.stats["upsert_seconds"] += time.perf_counter() - started
+
+            if not self._failed.is_set():
+                self.vector_store.flush(project_id)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._drain(upsert_queue)
+
+    def _committed(self, project_id: str, points: list):
+        """
+        Indexes a stored batch of points for keyword search and checkpoints it.
+        """
+        if self.lexical_index is not None:
+            self.lexical_index.add_points(project_id, points)
+        if self.checkpoint is not None:
+            self.checkpoint({chunk_key(point['payload']): point['id'] for point in points})
+        self.stats["upserted"] += len(points)
+        self._report()
+
+    def _report(self):
+        """
+        Emits the number of chunks handled by each stage and their rates.
+        """
+        def rate(count, seconds):
+            return count / seconds if seconds > 0 else 0.0
+
+        message = (
+            f"Chunked {self.stats['chunks']} "
+            f"({rate(self.stats['chunks'], self.stats['chunk_seconds']):.1f}/s), "
+            f"embedded {self.stats['embedded']} "
+            f"({rate(self.stats['embedded'], self.stats['embed_seconds']):.1f}/s), "
+            f"uploaded {self.stats['upserted']} "
+            f"({rate(self.stats['upserted'], self.stats['upsert_seconds']):.1f}/s)"
+        )
+        self.socketio.emit('status', {'message': message}, room=self.socket_id)
+
+    def _put(self, target: queue.Queue, item):
+        """
+        Blocks on a full queue, but gives up once another stage has failed so that no
+        thread waits forever on a consumer that is gone.
+        """
+        while True:
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self._failed.is_set():
+                    return
+
+    @staticmethod
+    def _drain(source: queue.Queue):
+        """
+        Empties a queue so a blocked producer can reach its end marker.
+        """
+        while True:
+            try:
+                source.get_nowait()
+            except queue.Empty:
+                return
+
+    def _fail(self, error: Exception):
+        if self._error is None:
+            self._error = error
+        self._failed.set()
+        logger.error(f"Ingestion pipeline stage failed: {error}")
@@ -0,0 +1,339 @@
+"""
+job_queue.py
+
+Bounded ingestion job queue with a persistent job table.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_EXPIRED = 'expired'
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while `max_queued` jobs are already waiting.
+    """
+
+
+class JobReporter:
+    """
+    Records the progress events of a running job in the job table and forwards them to
+    the job's SocketIO room. It exposes the same emit() call as SocketIO, so it can be
+    handed to code that reports progress through a SocketIO instance.
+    """
+
+    def __init__(self, job_queue, job_id: str, socketio_instance, socket_id: str = None):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.socketio = socketio_instance
+        self.socket_id = socket_id
+
+    def emit(self, event: str, data: dict, room: str = None):
+        if event == 'processing_progress':
+            self.job_queue.update(self.job_id, progress=data['progress'])
+        elif event == 'status':
+            self.job_queue.update(self.job_id, message=data['message'])
+        elif event == 'processing_complete':
+            self.job_queue.update(self.job_id, status=JOB_DONE, progress=100, message=data['message'])
+            self.job_queue.clear_checkpoint(self.job_id)
+        elif event == 'processing_error':
+            self.job_queue.update(self.job_id, status=JOB_FAILED, error=data['message'])
+
+        if self.socket_id:
+            self.socketio.emit(event, {**data, 'job_id': self.job_id}, room=self.socket_id)
+
+    def record_stages(self, stages: dict):
+        """
+        Stores the time spent in each stage of the job, in milliseconds.
+        """
+        self.job_queue.update(self.job_id, stages=json.dumps(stages))
+
+    def checkpoint(self, chunk_points: dict):
+        """
+        Records chunks whose points are stored, as {chunk key: point ID}.
+        """
+        self.job_queue.save_checkpoint(self.job_id, chunk_points)
+
+    def load_checkpoint(self) -> dict:
+        """
+        Returns the chunks stored by earlier runs of the job, as {chunk key: point ID}.
+        """
+        return self.job_queue.get_checkpoint(self.job_id)
+
+
+class JobQueue:
+    """
+    Runs ingestion jobs on a fixed pool of worker threads.
+
+    Queued jobs wait in one FIFO per project and the workers take jobs from the projects
+    in turn, so a large batch of uploads to one project does not starve the others.
+    The worker threads start with the first job of each process, so a queue created
+    before the server forks its workers runs its own threads in every worker.
+    Job state and timings are kept in SQLite and can be read back with get(). Jobs can
+    checkpoint their progress there too, so a failed or interrupted job that is resumed
+    with resume() picks up where it stopped, until expire_failed() gives it up.
+
+    The `max_queued` bound counts the queued jobs of the job table, so it holds across
+    the processes that share it.
+    """
+
+    def __init__(self, db_path: str, handler, socketio_instance, workers: int = 2, max_queued: int = 20):
+        self.db_path = db_path
+        self.handler = handler
+        self.socketio = socketio_instance
+        self.max_queued = max_queued
+        self.workers = workers
+
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._workers_pid = None
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    error TEXT,
+                    args TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    stages TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    job_id TEXT NOT NULL,
+                    chunk_key TEXT NOT NULL,
+                    point_id TEXT NOT NULL,
+                    PRIMARY KEY (job_id, chunk_key)
+                )
+            """)
+            # Job tables created before stage timings were recorded
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'stages' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN stages TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def recover_interrupted(self) -> int:
+        """
+        Marks the jobs left queued or running by a previous server run as failed, so they
+        can be resumed, and returns their number. Only the server calls it, once at
+        startup: tools that share the job table must not fail the jobs of a running server.
+        """
+        with self._connect() as conn, conn:
+            recovered = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)",
+                (JOB_FAILED, 'Interrupted by a server restart', time.time(), JOB_QUEUED, JOB_RUNNING)
+            ).rowcount
+        if recovered:
+            logger.warning(f"Marked {recovered} jobs interrupted by a server restart as failed")
+        return recovered
+
+    def expire_failed(self, max_age_seconds: float) -> list:
+        """
+        Gives up the jobs that failed more than `max_age_seconds` ago, so they can no
+        longer be resumed, and returns the keyword arguments they were submitted with,
+        for the caller to delete the files they refer to.
+        """
+        with self._connect() as conn, conn:
+            rows = conn.execute(
+                "SELECT id, args FROM jobs WHERE status = ? AND finished_at < ?",
+                (JOB_FAILED, time.time() - max_age_seconds)
+            ).fetchall()
+            expired = []
+            for job_id, args in rows:
+                # A job resumed meanwhile, by this or another process, is not given up
+                if conn.execute(
+                    "UPDATE jobs SET status = ? WHERE id = ? AND status = ?", (JOB_EXPIRED, job_id, JOB_FAILED)
+                ).rowcount:
+                    conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+                    expired.append(json.loads(args)['kwargs'])
+        if expired:
+            logger.info(f"Expired {len(expired)} failed jobs")
+        return expired
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def _check_capacity(self, conn: sqlite3.Connection):
+        """
+        Raises QueueFullError when `max_queued` jobs are waiting. Called in a transaction
+        begun with BEGIN IMMEDIATE, so concurrent submits are counted one after the other.
+        """
+        if self._count_queued(conn) >= self.max_queued:
+            raise QueueFullError(f"The ingestion queue is full ({self.max_queued} jobs waiting)")
+
+    @staticmethod
+    def _count_queued(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (JOB_QUEUED,)).fetchone()[0]
+
+    def submit(self, project_id: str, file_name: str, socket_id: str = None, **kwargs) -> str:
+        """
+        Queues a job that calls handler(reporter, project_id, file_name, **kwargs) and returns its ID.
+        Raises QueueFullError when the queue is full.
+        """
+        job_id = str(uuid.uuid4())
+        with self._condition:
+            with self._connect() as conn, conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._check_capacity(conn)
+                conn.execute(
+                    "INSERT INTO jobs (id, project_id, file_name, status, args, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, project_id, file_name, JOB_QUEUED,
+                     json.dumps({'socket_id': socket_id, 'kwargs': kwargs}), time.time())
+                )
+            self._pending.setdefault(project_id, deque()).append(job_id)
+            self._start_workers()
+            self._condition.notify()
+        return job_id
+
+    def resume(self, job_id: str):
+        """
+        Queues a failed job again with its original arguments. Raises ValueError when the
+        job is unknown or has not failed, and QueueFullError when the queue is full.
+        """
+        with self._condition:
+            # Only one of concurrent resumes, from this or another process, finds the job failed
+            with self._connect() as conn, conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._check_capacity(conn)
+                resumed = conn.execute(
+                    "UPDATE jobs SET status = ?, progress = 0, message = NULL, error = NULL, "
+                    "started_at = NULL, finished_at = NULL WHERE id = ? AND status = ?",
+                    (JOB_QUEUED, job_id, JOB_FAILED)
+                ).rowcount
+                row = conn.execute("SELECT project_id FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not resumed:
+                raise ValueError(f"Job '{job_id}' is not a failed job")
+            self._pending.setdefault(row[0], deque()).append(job_id)
+            self._start_workers()
+            self._condition.notify()
+
+    def _start_workers(self):
+        """
+        Starts the worker threads of this process. Called with the condition held.
+        """
+        if self._workers_pid != os.getpid():
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f'ingestion-worker-{i}', daemon=True).start()
+            self._workers_pid = os.getpid()
+
+    def _next_job(self) -> str:
+        """
+        Waits for a queued job and takes it from the project whose turn it is.
+        """
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            project_id, jobs = next(iter(self._pending.items()))
+            job_id = jobs.popleft()
+            # Move the project to the back of the rotation
+            del self._pending[project_id]
+            if jobs:
+                self._pending[project_id] = jobs
+            return job_id
+
+    def _work(self):
+        while True:
+            job_id = self._next_job()
+            with self._connect() as conn:
+                args = json.loads(conn.execute("SELECT args FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+
+            self.update(job_id, status=JOB_RUNNING, started_at=time.time())
+            reporter = JobReporter(self, job_id, self.socketio, args['socket_id'])
+            try:
+                job = self.get(job_id)
+                self.handler(reporter, job['project_id'], job['file_name'], **args['kwargs'])
+                if self.get(job_id)['status'] == JOB_RUNNING:
+                    self.update(job_id, status=JOB_DONE, finished_at=time.time())
+                else:
+                    self.update(job_id, finished_at=time.time())
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {e}")
+                # Written with the status, so expire_failed() never sees a failed job without it
+                self.update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+
+    def update(self, job_id: str, **fields):
+        """
+        Updates columns of a job row.
+        """
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn, conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str):
+        """
+        Returns the state and timings of a job as a dict, or None if the job is unknown.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT id, project_id, file_name, status, progress, message, error, "
+                "created_at, started_at, finished_at, stages FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['stages'] = json.loads(job['stages']) if job['stages'] else None
+        job['queued_seconds'] = (job['started_at'] or time.time()) - job['created_at']
+        if job['started_at']:
+            job['run_seconds'] = (job['finished_at'] or time.time()) - job['started_at']
+        return job
+
+    def save_checkpoint(self, job_id: str, chunk_points: dict):
+        """
+        Adds {chunk key: point ID} entries to the checkpoint of a job.
+        """
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints (job_id, chunk_key, point_id) VALUES (?, ?, ?)",
+                [(job_id, key, str(pid)) for key, pid in chunk_points.items()]
+            )
+
+    def get_checkpoint(self, job_id: str) -> dict:
+        """
+        Returns the checkpoint of a job as {chunk key: point ID}.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chunk_key, point_id FROM checkpoints WHERE job_id = ?", (job_id,))
+            return dict(rows.fetchall())
+
+    def clear_checkpoint(self, job_id: str):
+        """
+        Drops the checkpoint of a finished job.
+        """
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def queued_count(self) -> int:
+        """
+        Returns the number of jobs waiting for a worker, in every process sharing the job table.
+        """
+        with self._connect() as conn:
+            return self._count_queued(conn)
@@ -0,0 +1,262 @@
+"""
+lexical_index.py
+
+SQLite FTS5 index of the chunk texts used for BM25 keyword retrieval.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from contextlib import closing
+
+from vector_store import SearchHit, SearchFilter
+
+logger = logging.getLogger(__name__)
+
+# Words, identifiers and numbers such as "AB-123", "4.2.1" or "E_042"
+_TERM_PATTERN = re.compile(r"\w(?:[\w\-./]*\w)?")
+
+
+def load_stopwords(languages: tuple) -> frozenset:
+    """
+    Returns the NLTK stopwords of the given languages. When the NLTK stopwords corpus is
+    not installed, a warning is logged and the set is empty.
+    """
+    from nltk.corpus import stopwords
+
+    words = set()
+    try:
+        for language in languages:
+            words.update(stopwords.words(language))
+    except LookupError:
+        logger.warning("The NLTK stopwords corpus is not installed, keyword queries keep their stopwords")
+        return frozenset()
+    return frozenset(words)
+
+
+class LexicalIndex:
+    """
+    Keeps the text and payload of every stored point so that exact identifiers (part
+    numbers, clause numbers, error codes) can be found by BM25 even when the dense search
+    misses them.
+
+    The texts and payloads are rows of the `points` table, found by their project and
+    point ID through its primary key. Each project has its own external-content FTS5
+    table over those rows, so a search only reads the project's index and the BM25 term
+    statistics are the project's own.
+
+    Questions are turned into queries without their stopwords and their terms shorter
+    than `min_term_length`, unless those hold a digit.
+    """
+
+    def __init__(self, db_path: str, stopwords: frozenset = frozenset(), min_term_length: int = 3):
+        self.db_path = db_path
+        self.stopwords = stopwords
+        self.min_term_length = min_term_length
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    id INTEGER PRIMARY KEY,
+                    project_id TEXT NOT NULL UNIQUE
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS points (
+                    rowid INTEGER PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    point_id TEXT NOT NULL,
+                    pdf_name TEXT NOT NULL,
+                    page INTEGER,
+                    chunk_id INTEGER,
+                    text TEXT NOT NULL,
+                    UNIQUE (project_id, point_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS points_document ON points (project_id, pdf_name)")
+            self._migrate_shared_table(conn)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def _migrate_shared_table(self, conn):
+        """
+        Moves the points of the single FTS5 table used by earlier versions into the
+        per-project tables.
+        """
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks'").fetchone()
+        if not exists:
+            return
+        rows = conn.execute("SELECT project_id, point_id, pdf_name, page, chunk_id, text FROM chunks").fetchall()
+        by_project = {}
+        for project_id, point_id, pdf_name, page, chunk_id, text in rows:
+            by_project.setdefault(project_id, []).append({
+                'id': point_id,
+                'payload': {'pdf_name': pdf_name, 'page': page, 'chunk_id': chunk_id, 'text': text}
+            })
+        for project_id, points in by_project.items():
+            self._add(conn, project_id, points)
+        conn.execute("DROP TABLE chunks")
+        logger.info(f"Moved the keyword index of {len(by_project)} projects to per-project tables")
+
+    @staticmethod
+    def _fts_table(conn, project_id: str, create: bool = False):
+        """
+        Returns the name of the project's FTS5 table, creating it when `create` is set,
+        or None when the project has none.
+        """
+        if create:
+            conn.execute("INSERT OR IGNORE INTO projects (project_id) VALUES (?)", (project_id,))
+        row = conn.execute("SELECT id FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+        if row is None:
+            return None
+        table = f"chunks_{row[0]}"
+        if create:
+            conn.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(text, content='points', content_rowid='rowid')"
+            )
+        return table
+
+    def add_points(self, project_id: str, points: list):
+        """
+        Indexes the payload text of the given points, replacing earlier versions of them.
+        """
+        with self._connect() as conn, conn:
+            self._add(conn, project_id, points)
+
+    def _add(self, conn, project_id: str, points: list):
+        table = self._fts_table(conn, project_id, create=True)
+        self._delete(conn, table, "point_id = ?", [(project_id, str(point['id'])) for point in points])
+        for point in points:
+            payload = point['payload']
+            rowid = conn.execute(
+                "INSERT INTO points (project_id, point_id, pdf_name, page, chunk_id, text) VALUES (?, ?, ?, ?, ?, ?)",
+                (project_id, str(point['id']), payload['pdf_name'], payload['page'], payload['chunk_id'], payload['text'])
+            ).lastrowid
+            conn.execute(f"INSERT INTO {table} (rowid, text) VALUES (?, ?)", (rowid, payload['text']))
+
+    @staticmethod
+    def _delete(conn, table: str, condition: str, params: list):
+        """
+        Removes the project's points matching `condition` from its FTS5 table and from
+        the points table, once per parameter tuple, which starts with the project ID.
+        """
+        for values in params:
+            rows = conn.execute(
+                f"SELECT rowid, text FROM points WHERE project_id = ? AND {condition}", values
+            ).fetchall()
+            if not rows:
+                continue
+            # External-content tables are told the old text of the rows they drop
+            conn.executemany(f"INSERT INTO {table} ({table}, rowid, text) VALUES ('delete', ?, ?)", rows)
+            conn.executemany("DELETE FROM points WHERE rowid = ?", [(rowid,) for rowid, _ in rows])
+
+    def delete_points(self, project_id: str, point_ids: list):
+        """
+        Removes the given points from the index.
+        """
+        with self._connect() as conn, conn:
+            table = self._fts_table(conn, project_id)
+            if table:
+                self._delete(conn, table, "point_id = ?", [(project_id, str(pid)) for pid in point_ids])
+
+    def delete_document(self, project_id: str, pdf_name: str):
+        """
+        Removes every point of the given document from the index.
+        """
+        with self._connect() as conn, conn:
+            table = self._fts_table(conn, project_id)
+            if table:
+                self._delete(conn, table, "pdf_name = ?", [(project_id, pdf_name)])
+
+    def delete_project(self, project_id: str):
+        """
+        Removes every point of the project from the index.
+        """
+        with self._connect() as conn, conn:
+            table = self._fts_table(conn, project_id)
+            if table:
+                conn.execute(f"DROP TABLE {table}")
+                conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM points WHERE project_id = ?", (project_id,))
+
+    def replace_project(self, project_id: str, staging_id: str):
+        """
+        Replaces the project's points with those of the staging project, which is renamed
+        to it, in one transaction.
+        """
+        with self._connect() as conn, conn:
+            table = self._fts_table(conn, project_id)
+            if table:
+                conn.execute(f"DROP TABLE {table}")
+                conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM points WHERE project_id = ?", (project_id,))
+            conn.execute("UPDATE projects SET project_id = ? WHERE project_id = ?", (project_id, staging_id))
+            conn.execute("UPDATE points SET project_id = ? WHERE project_id = ?", (project_id, staging_id))
+
+    def build_query(self, question: str) -> str:
+        """
+        Turns a free-text question into an FTS5 query matching any of its terms, leaving
+        out stopwords and short terms. Each term is quoted so punctuation inside
+        identifiers is matched literally.
+        """
+        terms = dict.fromkeys(
+            term for term in (term.lower() for term in _TERM_PATTERN.findall(question))
+            if term not in self.stopwords
+            and (len(term) >= self.min_term_length or any(char.isdigit() for char in term))
+        )
+        return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    @staticmethod
+    def _filter_clause(search_filter: SearchFilter = None) -> tuple:
+        """
+        Returns the SQL conditions and parameters restricting a search to the filter.
+        """
+        if search_filter is None:
+            return "", []
+        conditions, params = [], []
+        if search_filter.pdf_names:
+            conditions.append(f"points.pdf_name IN ({','.join('?' * len(search_filter.pdf_names))})")
+            params.extend(search_filter.pdf_names)
+        if search_filter.min_page is not None:
+            conditions.append("points.page >= ?")
+            params.append(search_filter.min_page)
+        if search_filter.max_page is not None:
+            conditions.append("points.page <= ?")
+            params.append(search_filter.max_page)
+        return "".join(f" AND {condition}" for condition in conditions), params
+
+    def search(self, project_id: str, question: str, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Returns up to `limit` hits ranked by BM25, with the same attributes as vector-store hits,
+        among the chunks matching `search_filter`.
+        """
+        query = self.build_query(question)
+        if not query or limit <= 0:
+            return []
+
+        conditions, params = self._filter_clause(search_filter)
+        with self._connect() as conn:
+            table = self._fts_table(conn, project_id)
+            if table is None:
+                return []
+            rows = conn.execute(
+                f"SELECT points.point_id, points.pdf_name, points.page, points.chunk_id, points.text, "
+                f"bm25({table}) AS rank FROM {table} JOIN points ON points.rowid = {table}.rowid "
+                f"WHERE {table} MATCH ?{conditions} ORDER BY rank LIMIT ?",
+                (query, *params, limit)
+            ).fetchall()
+
+        return [
+            SearchHit(
+                id=point_id,
+                # bm25() is lower for better matches
+                score=-rank,
+                payload={"pdf_name": pdf_name, "page": page, "chunk_id": chunk_id, "text": text}
+            )
+            for point_id, pdf_name, page, chunk_id, text, rank in rows
+        ]
@@ -0,0 +1,125 @@
+"""
+load_test.py
+
+Sends many concurrent questions to a query endpoint and reports the throughput, the
+latency percentiles and the errors.
+
+Run it against async_server.py (or the Flask app, with --flask) while the app's LLM is
+completion_stub.py, so the test measures the server and not the LLM provider:
+
+    python completion_stub.py --ttft-ms 300 --token-ms 5
+    OPEN_AI_BASE_URL=http://localhost:8001/v1 python async_server.py
+
+Usage:
+    python load_test.py <project_id> [--url http://localhost:5002/query] [--concurrency 200]
+                        [--requests 2000] [--questions questions.txt] [--stream] [--flask]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+import numpy as np
+
+DEFAULT_QUESTIONS = [
+    "What is this document about?",
+    "Which requirements are listed?",
+    "What are the main conclusions?",
+    "Who is responsible for the maintenance?",
+    "What does the document say about safety?",
+]
+
+
+def percentiles(values: list) -> dict:
+    """
+    Returns the p50, p95, p99, max and mean of a list of latencies.
+    """
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(max(values)), "mean": float(np.mean(values))}
+
+
+async def ask(session: aiohttp.ClientSession, args, question: str) -> tuple:
+    """
+    Sends one question. Returns the HTTP status (or the exception name), the latency in
+    milliseconds and, for streamed answers, the time to the first answer token.
+    """
+    fields = {"project_id": args.project_id, "question": question, "threshold": args.threshold}
+    request = {"data": fields} if args.flask else {"json": fields}
+    started = time.perf_counter()
+    ttft_ms = None
+    try:
+        async with session.post(args.url, **request) as response:
+            if args.stream:
+                async for line in response.content:
+                    if ttft_ms is None and line.startswith(b'event: token'):
+                        ttft_ms = (time.perf_counter() - started) * 1000
+            else:
+                await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        status = type(e).__name__
+    return status, (time.perf_counter() - started) * 1000, ttft_ms
+
+
+async def run(args, questions: list) -> dict:
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    counter = iter(range(args.requests))
+    results = []
+
+    async def client(session: aiohttp.ClientSession):
+        for index in counter:
+            results.append(await ask(session, args, questions[index % len(questions)]))
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(str(status) for status, _, _ in results)
+    succeeded = [latency for status, latency, _ in results if status == 200]
+    return {
+        "url": args.url,
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "seconds": elapsed,
+        "requests_per_second": len(results) / elapsed if elapsed else None,
+        "statuses": dict(statuses),
+        "latency_ms": percentiles(succeeded),
+        "ttft_ms": percentiles([ttft for status, _, ttft in results if status == 200 and ttft is not None]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a query endpoint with concurrent questions.")
+    parser.add_argument('project_id', help="Project the questions are asked in")
+    parser.add_argument('--url', default=None, help="Query endpoint, by default async_server.py's /query (or /query_stream with --stream)")
+    parser.add_argument('--concurrency', type=int, default=200, help="Questions in flight at the same time")
+    parser.add_argument('--requests', type=int, default=2000, help="Questions sent in total")
+    parser.add_argument('--questions', help="Text file with one question per line, asked in turn")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Similarity threshold of the questions")
+    parser.add_argument('--stream', action='store_true', help="Read Server-Sent Event answers and report the time to first token")
+    parser.add_argument('--flask', action='store_true', help="Send form posts to the Flask app's routes instead of JSON")
+    parser.add_argument('--timeout', type=float, default=300, help="Client timeout of a question in seconds")
+    args = parser.parse_args()
+
+    if args.url is None:
+        if args.flask:
+            args.url = 'http://localhost:5001/query_project_stream' if args.stream else 'http://localhost:5001/query_project'
+        else:
+            args.url = 'http://localhost:5002/query_stream' if args.stream else 'http://localhost:5002/query'
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding='utf-8') as source:
+            questions = [line.strip() for line in source if line.strip()]
+
+    print(json.dumps(asyncio.run(run(args, questions)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+metrics.py
+
+Counters, latency histograms and timing spans exposed in the Prometheus text format.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 1 ms to 5 minutes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """
+    Base of the metric types: a name, a help text and one series per label values.
+    """
+
+    type_name = 'untyped'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects the labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in sorted(series):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key: tuple, value) -> list:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    """
+    A value that only goes up, e.g. the number of pages ingested.
+    """
+
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """
+    Counts observations, e.g. latencies in seconds, into cumulative buckets.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    def _render_series(self, key: tuple, value) -> list:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, (('le', _number(bound)),))} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    A counter or gauge whose values are read from a function at scrape time, e.g. the
+    hit counters that a cache already keeps. The function returns {label values: value}.
+    """
+
+    def __init__(self, name: str, help_text: str, function, label_names: tuple = (), type_name: str = 'gauge'):
+        super().__init__(name, help_text, label_names)
+        self.function = function
+        self.type_name = type_name
+
+    def render(self) -> list:
+        with self._lock:
+            self._series = {tuple(map(str, key)): value for key, value in self.function().items()}
+        return super().render()
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the app and renders them for a Prometheus scrape.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()) -> Counter:
+        return self._add(Counter(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, label_names, buckets))
+
+    def callback(self, name: str, help_text: str, function, label_names: tuple = (), type_name: str = 'gauge') -> CallbackMetric:
+        return self._add(CallbackMetric(name, help_text, function, label_names, type_name))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def span(histogram: Histogram, timings: dict = None, key: str = None, **labels):
+    """
+    Times the enclosed block into the histogram. When a `timings` dict is given, the
+    duration is also stored there in milliseconds under `key` (default: the stage label).
+    The duration is recorded even when the block raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if timings is not None:
+            timings[key or f"{labels.get('stage')}_ms"] = elapsed * 1000
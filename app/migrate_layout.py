@@ -0,0 +1,115 @@
+"""
+migrate_layout.py
+
+Moves projects between the two Qdrant layouts: one collection per project
+('collections') and every project in the shared collection ('shared').
+
+The points are copied with their vectors, so nothing is re-embedded, and the copy is
+checked by counting the points on both sides. Copying again is safe, points are
+upserted under the same IDs. Set QDRANT_LAYOUT in config.py once every project is moved.
+
+Usage:
+    python migrate_layout.py to-shared <project_id> [<project_id> ...] [--delete-source]
+    python migrate_layout.py to-shared --all [--delete-source]
+    python migrate_layout.py to-collections --all [--profile int8] [--delete-source]
+"""
+
+import argparse
+import logging
+
+import qdrant_client
+
+import config
+from qdrant_manager import QdrantManager, SharedQdrantManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _Dimension:
+    """
+    Stands in for the embedding model, which the managers only ask for the vector size.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.size
+
+
+def copy_project(project_id: str, source, target, batch_size: int) -> int:
+    """
+    Copies every point of the project from one manager to the other and returns their number.
+    """
+    batch = []
+    copied = 0
+    for point in source.iter_points(project_id, batch_size=batch_size, with_vectors=True):
+        batch.append(point)
+        if len(batch) == batch_size:
+            target.upsert_points(project_id, batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target.upsert_points(project_id, batch)
+        copied += len(batch)
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move projects between the per-project and the shared Qdrant layouts.")
+    parser.add_argument('direction', choices=['to-shared', 'to-collections'], help="Layout the projects are moved to")
+    parser.add_argument('projects', nargs='*', help="Projects to move")
+    parser.add_argument('--all', action='store_true', help="Move every project of the source layout")
+    parser.add_argument('--profile', choices=list(config.STORAGE_PROFILES), default=config.DEFAULT_STORAGE_PROFILE,
+                        help="Storage profile of the collections created by to-collections")
+    parser.add_argument('--batch-size', type=int, default=256, help="Points read and upserted at a time")
+    parser.add_argument('--delete-source', action='store_true', help="Delete each project from the source layout once copied")
+    args = parser.parse_args()
+
+    client = qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT))
+    settings = dict(storage_profiles=config.STORAGE_PROFILES, default_profile=config.DEFAULT_STORAGE_PROFILE)
+    collections = QdrantManager(client, None, **settings)
+    shared = SharedQdrantManager(client, None, collection_name=config.SHARED_COLLECTION, **settings)
+    source, target = (collections, shared) if args.direction == 'to-shared' else (shared, collections)
+
+    if args.all:
+        projects = [c.name for c in source.get_collections()]
+        if source is collections:
+            projects = [name for name in projects if name != config.SHARED_COLLECTION]
+    else:
+        projects = args.projects
+    if not projects:
+        parser.error("Name at least one project or pass --all")
+
+    # The collections to create get the vector size of the collection the points come from
+    source_collection = config.SHARED_COLLECTION if source is shared else projects[0]
+    dimension = _Dimension(client.get_collection(source_collection).config.params.vectors.size)
+    collections.model = shared.model = dimension
+
+    failed = []
+    for project_id in projects:
+        expected = source.count_points(project_id)
+        if target is collections:
+            target.ensure_collection_exists(project_id, args.profile)
+        else:
+            target.ensure_collection_exists(project_id)
+        copied = copy_project(project_id, source, target, args.batch_size)
+        stored = target.count_points(project_id)
+        if stored != expected:
+            logger.error(f"'{project_id}': {expected} points in the source layout, {stored} after copying {copied}")
+            failed.append(project_id)
+            continue
+        logger.info(f"Copied {copied} points of '{project_id}'")
+        if args.delete_source:
+            source.delete_collection(project_id)
+            logger.info(f"Deleted '{project_id}' from the source layout")
+
+    if failed:
+        raise SystemExit(f"Point counts differ for {failed}, their source data was kept")
+    layout = 'shared' if args.direction == 'to-shared' else 'collections'
+    logger.info(f"Done. Set QDRANT_LAYOUT = '{layout}' in config.py to serve the moved projects")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+migrate_storage.py
+
+Migrates existing Qdrant collections to one of the storage profiles in config.py.
+
+Usage:
+    python migrate_storage.py <profile> <project_id> [<project_id> ...]
+    python migrate_storage.py <profile> --all
+"""
+
+import argparse
+import logging
+
+import qdrant_client
+
+import config
+from qdrant_manager import QdrantManager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a storage profile to existing Qdrant collections.")
+    parser.add_argument('profile', choices=list(config.STORAGE_PROFILES), help="Storage profile to apply")
+    parser.add_argument('projects', nargs='*', help="Projects to migrate")
+    parser.add_argument('--all', action='store_true', help="Migrate every project")
+    args = parser.parse_args()
+    if config.QDRANT_LAYOUT == 'shared':
+        parser.error("Storage profiles apply to per-project collections, the shared layout keeps DEFAULT_STORAGE_PROFILE")
+
+    client = qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT))
+    # The embedding model is only needed to create collections
+    manager = QdrantManager(client, None, storage_profiles=config.STORAGE_PROFILES)
+
+    projects = [c.name for c in manager.get_collections()] if args.all else args.projects
+    if not projects:
+        parser.error("Name at least one project or pass --all")
+
+    for project_id in projects:
+        logger.info(f"Applying storage profile '{args.profile}' to '{project_id}'")
+        manager.apply_storage_profile(project_id, args.profile)
+    logger.info("Qdrant is rebuilding the migrated collections in the background")
+
+
+if __name__ == '__main__':
+    main()
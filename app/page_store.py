@@ -0,0 +1,232 @@
+"""
+page_store.py
+
+Keeps the extracted pages of every ingested PDF, so documents can be chunked and embedded again without parsing the PDF.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_page(page: tuple) -> list:
+    """
+    Packs an extracted (text, cleaned_text, sentences) page. The sentences are stored as
+    [start, end, start, end, ...] offsets in the cleaned text, or as strings when one of
+    them is not found there in order.
+    """
+    text, cleaned_text, sentences = page
+    if cleaned_text is None:
+        return [text, None, None]
+    bounds = []
+    cursor = 0
+    for sentence in sentences:
+        start = cleaned_text.find(sentence, cursor)
+        if start < 0:
+            return [text, cleaned_text, list(sentences)]
+        cursor = start + len(sentence)
+        bounds.extend((start, cursor))
+    return [text, cleaned_text, bounds]
+
+
+def _decode_page(record: list) -> tuple:
+    text, cleaned_text, bounds = record
+    if cleaned_text is None:
+        return text, None, None
+    if bounds and isinstance(bounds[0], str):
+        return text, cleaned_text, bounds
+    return text, cleaned_text, [cleaned_text[bounds[i]:bounds[i + 1]] for i in range(0, len(bounds), 2)]
+
+
+class PageWriter:
+    """
+    Appends the pages of one document to a PageStore as they are extracted, so they do
+    not pile up in memory until the document is ingested. Pages are written
+    `pages_per_commit` at a time; the document can only be loaded once finish() is
+    called, and a new writer for the same file and engine replaces what an unfinished
+    one wrote. append() makes a writer usable as the page_sink of PDFProcessor.iter_pdf_chunks.
+    """
+
+    def __init__(self, store, content_hash: str, engine: str, pages_per_commit: int = 32):
+        self.store = store
+        self.content_hash = content_hash
+        self.engine = engine
+        self.pages_per_commit = pages_per_commit
+        self.page_count = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self._rows = []
+        self._started = False
+
+    def append(self, page: tuple):
+        """
+        Adds the next (text, cleaned_text, sentences) page of the document.
+        """
+        raw = json.dumps(_encode_page(page), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        data = zlib.compress(raw, self.store.compression_level)
+        self._rows.append((self.content_hash, self.engine, self.page_count, data))
+        self.page_count += 1
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(data)
+        if len(self._rows) >= self.pages_per_commit:
+            self._write(complete=False)
+
+    def finish(self):
+        """
+        Writes the remaining pages and makes the document available to load().
+        """
+        self._write(complete=True)
+        logger.info(
+            f"Stored {self.page_count} pages of {self.content_hash[:12]} in {self.stored_bytes / 1024:.0f} KB"
+        )
+
+    def _write(self, complete: bool):
+        with self.store._connect() as conn, conn:
+            if not self._started:
+                # Pages left by an earlier, unfinished or outdated, record of the file
+                conn.execute(
+                    "DELETE FROM page_records WHERE content_hash = ? AND engine = ?", (self.content_hash, self.engine)
+                )
+                self._started = True
+            conn.executemany(
+                # Concurrent uploads of the same file write the same pages
+                "INSERT OR REPLACE INTO page_records (content_hash, engine, page_number, data) VALUES (?, ?, ?, ?)",
+                self._rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(content_hash, engine, page_count, raw_bytes, stored_bytes, complete, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.content_hash, self.engine, self.page_count, self.raw_bytes, self.stored_bytes,
+                 int(complete), time.time())
+            )
+        self._rows = []
+
+
+class PageStore:
+    """
+    SQLite store of the extracted pages of every PDF, keyed by the SHA-256 of the file and
+    the text engine that read it. Every page is one zlib-compressed JSON record holding
+    the extracted text (bidi-processed), the cleaned text and the sentence boundaries,
+    i.e. everything PDFProcessor.iter_page_chunks needs. Pages are written as they are
+    extracted, see PageWriter.
+
+    Records are shared by every project the same file was uploaded to.
+    """
+
+    def __init__(self, db_path: str, compression_level: int = 6):
+        self.db_path = db_path
+        self.compression_level = compression_level
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    content_hash TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    raw_bytes INTEGER NOT NULL,
+                    stored_bytes INTEGER NOT NULL,
+                    complete INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (content_hash, engine)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_records (
+                    content_hash TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (content_hash, engine, page_number)
+                )
+            """)
+        self._migrate_document_records()
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def _migrate_document_records(self):
+        """
+        Splits the one-record-per-document table of earlier versions into page records.
+        """
+        with self._connect() as conn:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pages'").fetchone()
+            keys = conn.execute("SELECT content_hash, engine FROM pages").fetchall() if exists else []
+        for content_hash, engine in keys:
+            with self._connect() as conn:
+                data = conn.execute(
+                    "SELECT data FROM pages WHERE content_hash = ? AND engine = ?", (content_hash, engine)
+                ).fetchone()[0]
+            writer = self.writer(content_hash, engine)
+            for record in json.loads(zlib.decompress(data).decode('utf-8')):
+                writer.append(_decode_page(record))
+            writer.finish()
+        if exists:
+            with self._connect() as conn, conn:
+                conn.execute("DROP TABLE pages")
+            logger.info(f"Moved {len(keys)} documents of the page store to page records")
+
+    def writer(self, content_hash: str, engine: str) -> PageWriter:
+        """
+        Returns a PageWriter storing the pages of a document as they are appended.
+        """
+        return PageWriter(self, content_hash, engine)
+
+    def save(self, content_hash: str, engine: str, pages: list):
+        """
+        Stores the extracted pages of a document, as (text, cleaned_text, sentences) tuples.
+        """
+        writer = self.writer(content_hash, engine)
+        for page in pages:
+            writer.append(page)
+        writer.finish()
+
+    def load(self, content_hash: str, engine: str) -> list:
+        """
+        Returns the stored pages of a document, or None when it was not stored completely.
+        """
+        if not self.has(content_hash, engine):
+            return None
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT data FROM page_records WHERE content_hash = ? AND engine = ? ORDER BY page_number",
+                (content_hash, engine)
+            ).fetchall()
+        return [_decode_page(json.loads(zlib.decompress(data).decode('utf-8'))) for data, in rows]
+
+    def has(self, content_hash: str, engine: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM documents WHERE content_hash = ? AND engine = ? AND complete = 1", (content_hash, engine)
+            ).fetchone() is not None
+
+    def prune(self, keep_hashes: set) -> int:
+        """
+        Deletes the documents whose content hash is not in `keep_hashes` and returns how many.
+        """
+        with self._connect() as conn, conn:
+            stored = {row[0] for row in conn.execute("SELECT DISTINCT content_hash FROM documents")}
+            removed = [(content_hash,) for content_hash in stored - set(keep_hashes)]
+            conn.executemany("DELETE FROM documents WHERE content_hash = ?", removed)
+            conn.executemany("DELETE FROM page_records WHERE content_hash = ?", removed)
+        return len(removed)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of documents and pages stored and their raw and compressed sizes.
+        """
+        with self._connect() as conn:
+            documents, pages, raw_bytes, stored_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(page_count), 0), COALESCE(SUM(raw_bytes), 0), "
+                "COALESCE(SUM(stored_bytes), 0) FROM documents WHERE complete = 1"
+            ).fetchone()
+        return {"documents": documents, "pages": pages, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
@@ -4,7 +4,14 @@ pdf_processor.py
 Handles PDF reading, text cleaning, and chunking.
 """
 
+import multiprocessing
+import os
 import re
+import threading
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from bidi.algorithm import get_display
 import pdfplumber
 import nltk
@@ -12,8 +19,209 @@ from nltk.tokenize import sent_tokenize
 from flask_socketio import SocketIO  # only if you need to reference SocketIO
 import logging
 
+import config
+
 logger = logging.getLogger(__name__)
 
+TEXT_ENGINES = ('pdfplumber', 'pdfium')
+
+# pdfium is not thread-safe, concurrent ingestion jobs take turns
+_PDFIUM_LOCK = threading.Lock()
+
+# Hebrew, Arabic, Syriac, Thaana and their presentation forms
+_RTL_PATTERN = re.compile(r"[\u0590-\u08ff\ufb1d-\ufdff\ufe70-\ufeff]")
+
+# Page extraction pool shared by the uploads of this process, see extraction_pool()
+_extraction_pool = None
+_extraction_pool_key = None
+_EXTRACTION_POOL_LOCK = threading.Lock()
+
+
+def _init_extraction_worker(nltk_paths: list):
+    """
+    Gives a new extraction process the NLTK data directories of the app.
+    """
+    for path in reversed(nltk_paths):
+        if path not in nltk.data.path:
+            nltk.data.path.insert(0, path)
+
+
+def extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool that extracts pages for every upload of this process,
+    started on first use with `workers` processes and kept for the next documents.
+    The processes are started with forkserver (spawn where it is not available) since
+    the app forks from threads that hold locks and a loaded model. A gunicorn worker
+    gets a pool of its own.
+    """
+    global _extraction_pool, _extraction_pool_key
+    key = (os.getpid(), workers)
+    with _EXTRACTION_POOL_LOCK:
+        if _extraction_pool is None or _extraction_pool_key != key:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_extraction_worker,
+                initargs=(list(nltk.data.path),)
+            )
+            _extraction_pool_key = key
+            logger.info(f"Started {workers} page extraction processes ({method})")
+        return _extraction_pool
+
+
+def _discard_extraction_pool(pool: ProcessPoolExecutor):
+    """
+    Forgets a pool whose processes died, so the next document starts a new one.
+    """
+    global _extraction_pool
+    with _EXTRACTION_POOL_LOCK:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def is_garbled(text: str, max_bad_ratio: float = 0.1) -> bool:
+    """
+    Tells whether extracted text looks unusable: empty, or with more than max_bad_ratio of
+    replacement, control or private-use characters (typical of fonts without a usable
+    character map).
+    """
+    characters = [c for c in text if not c.isspace()] if text else []
+    if not characters:
+        return True
+    bad = sum(1 for c in characters if c == '\ufffd' or unicodedata.category(c) in ('Cc', 'Co', 'Cs'))
+    return bad / len(characters) > max_bad_ratio
+
+
+class PdfplumberExtractor:
+    """
+    Extracts page texts with pdfplumber, which rebuilds the layout from every character
+    object. Accurate and handles right to left lines, but slow.
+    """
+
+    def __init__(self, pdf_file_path: str):
+        self._pdf = pdfplumber.open(pdf_file_path)
+        self.page_count = len(self._pdf.pages)
+
+    def page_text(self, page_index: int) -> str:
+        return PDFProcessor.extract_page_text(self._pdf.pages[page_index])
+
+    def close(self):
+        self._pdf.close()
+
+
+class PdfiumExtractor:
+    """
+    Extracts page texts with pdfium's text layer (pypdfium2), many times faster than
+    pdfplumber. Pages whose text is empty, garbled or right to left are read again with
+    pdfplumber, whose line handling the right to left conversion relies on.
+    """
+
+    def __init__(self, pdf_file_path: str):
+        import pypdfium2
+
+        self.pdf_file_path = pdf_file_path
+        self.fallback_pages = 0
+        self._fallback = None
+        with _PDFIUM_LOCK:
+            self._pdf = pypdfium2.PdfDocument(pdf_file_path)
+            self.page_count = len(self._pdf)
+
+    @staticmethod
+    def needs_fallback(text: str) -> bool:
+        """
+        Tells whether a page read by pdfium must be read again with pdfplumber.
+        """
+        return is_garbled(text) or bool(_RTL_PATTERN.search(text))
+
+    def raw_page_text(self, page_index: int) -> str:
+        """
+        Returns the text pdfium extracts from the page, without fallback.
+        """
+        with _PDFIUM_LOCK:
+            page = self._pdf[page_index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    def page_text(self, page_index: int) -> str:
+        text = self.raw_page_text(page_index)
+        if self.needs_fallback(text):
+            if self._fallback is None:
+                self._fallback = PdfplumberExtractor(self.pdf_file_path)
+            self.fallback_pages += 1
+            return self._fallback.page_text(page_index)
+        return text
+
+    def close(self):
+        with _PDFIUM_LOCK:
+            self._pdf.close()
+        if self._fallback is not None:
+            self._fallback.close()
+        if self.fallback_pages:
+            logger.info(f"{self.fallback_pages} of {self.page_count} pages of {self.pdf_file_path} were read with pdfplumber")
+
+
+def open_extractor(pdf_file_path: str, engine: str = 'pdfplumber'):
+    """
+    Opens the PDF with the text extractor of the given engine, one of TEXT_ENGINES.
+    """
+    if engine == 'pdfplumber':
+        return PdfplumberExtractor(pdf_file_path)
+    if engine == 'pdfium':
+        return PdfiumExtractor(pdf_file_path)
+    raise ValueError(f"Unknown PDF text engine '{engine}', use one of {TEXT_ENGINES}")
+
+
+def chunking_options(token_limit: int, token_counter) -> dict:
+    """
+    Returns the chunk size arguments of iter_pdf_chunks and iter_page_chunks set in
+    config.py, for an embedding model reading `token_limit` tokens whose tokens are
+    counted by `token_counter`. Uploads, rebuilds and benchmarks all chunk with them.
+    Chunks sized by words are not tokenized, so the tokens the model truncates are only
+    counted with CHUNK_SIZE_UNIT = 'tokens'.
+    """
+    if config.CHUNK_SIZE_UNIT == 'tokens':
+        max_tokens = min(config.CHUNK_MAX_TOKENS, token_limit) if config.CHUNK_MAX_TOKENS else token_limit
+    else:
+        max_tokens = None
+    return {
+        'max_words': config.CHUNK_MAX_WORDS,
+        'overlap_sentences': config.CHUNK_OVERLAP_SENTENCES,
+        'max_tokens': max_tokens,
+        'token_counter': token_counter,
+        'token_limit': token_limit
+    }
+
+
+def extraction_options() -> dict:
+    """
+    Returns the page extraction arguments of iter_pdf_chunks set in config.py.
+    """
+    return {
+        'workers': config.PDF_EXTRACTION_WORKERS,
+        'pages_per_task': config.PDF_EXTRACTION_PAGES_PER_TASK,
+        'engine': config.PDF_TEXT_ENGINE
+    }
+
+
+class NullEmitter:
+    """
+    Swallows the progress events the ingestion code emits to SocketIO, for the
+    command-line tools.
+    """
+
+    def emit(self, *args, **kwargs):
+        pass
+
+
 class PDFProcessor:
     """
     A helper class to manage PDF reading, text cleaning, and chunking.
@@ -32,36 +240,43 @@ class PDFProcessor:
         return cleaned.strip()
 
     @staticmethod
-    def chunk_text(text: str, max_words: int = 300, overlap_sentences: int = 1) -> list:
+    def chunk_spans(lengths: list, max_length: int, overlap_sentences: int = 1) -> list:
         """
-        Splits the input text into chunks of sentences without exceeding max_words per chunk.
-        Overlaps between chunks are handled by repeating the last `overlap_sentences` sentences
-        of the previous chunk.
-        """
-        sentences = sent_tokenize(text)
-        chunks = []
-        current_chunk = []
-        current_word_count = 0
-        overlap = []
-
-        for sentence in sentences:
-            sentence_word_count = len(sentence.split())
-            # If adding the sentence exceeds max_words limit, start a new chunk
-            if current_word_count + sentence_word_count > max_words:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                    overlap = current_chunk[-overlap_sentences:] if overlap_sentences > 0 else []
-                    current_chunk = overlap.copy()
-                    current_word_count = sum(len(s.split()) for s in current_chunk)
-
-            current_chunk.append(sentence)
-            current_word_count += sentence_word_count
+        Groups consecutive sentences, given by their lengths, into chunks of at most
+        max_length. Returns (start, end) sentence index ranges. A chunk starts with the
+        last `overlap_sentences` sentences of the previous one; a sentence longer than
+        max_length gets a chunk of its own.
+        """
+        spans = []
+        start = 0
+        current_length = 0
+
+        for i, length in enumerate(lengths):
+            # If adding the sentence exceeds the limit, start a new chunk
+            if current_length + length > max_length and i > start:
+                spans.append((start, i))
+                next_start = max(start, i - overlap_sentences) if overlap_sentences > 0 else i
+                current_length -= sum(lengths[start:next_start])
+                start = next_start
+            current_length += length
 
         # Add the final chunk if not empty
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+        if start < len(lengths):
+            spans.append((start, len(lengths)))
+        return spans
 
-        return chunks
+    @classmethod
+    def chunk_text(cls, text: str, max_words: int = 300, overlap_sentences: int = 1, sentences: list = None) -> list:
+        """
+        Splits the input text into chunks of sentences without exceeding max_words per chunk.
+        Overlaps between chunks are handled by repeating the last `overlap_sentences` sentences
+        of the previous chunk. Pass the already tokenized `sentences` of the text to skip
+        sentence tokenization.
+        """
+        if sentences is None:
+            sentences = sent_tokenize(text)
+        spans = cls.chunk_spans([len(sentence.split()) for sentence in sentences], max_words, overlap_sentences)
+        return [' '.join(sentences[start:end]) for start, end in spans]
 
     @staticmethod
     def is_sentence_complete(text: str) -> bool:
@@ -95,8 +310,156 @@ class PDFProcessor:
         words = re.split(r'[_\- ]+', base.strip())
         return ''.join(word.capitalize() for word in words)
 
+    @staticmethod
+    def extract_page_text(page) -> str:
+        """
+        Extracts the text of a single pdfplumber page and converts right to left lines to display order.
+        """
+        text = page.extract_text()
+        if text:
+            # Convert left to right languages texts
+            lines = text.split("\n")
+            lines = [get_display(line) for line in lines]
+            text = "\n".join(lines)
+        return text
+
+    @classmethod
+    def extract_pages(cls, pdf_file_path: str, start: int, end: int, engine: str = 'pdfplumber') -> list:
+        """
+        Extracts, cleans and sentence-tokenizes the pages in [start, end).
+        Runs inside the extraction process pool, so it only returns plain tuples of
+        (text, cleaned_text, sentences) per page.
+        """
+        pages = []
+        extractor = open_extractor(pdf_file_path, engine)
+        try:
+            for page_index in range(start, min(end, extractor.page_count) if end is not None else extractor.page_count):
+                pages.append(cls.split_page(extractor.page_text(page_index)))
+        finally:
+            extractor.close()
+        return pages
+
+    @classmethod
+    def split_page(cls, text: str) -> tuple:
+        """
+        Returns the (text, cleaned_text, sentences) of an extracted page. Pages without
+        text have no cleaned text or sentences.
+        """
+        if not text:
+            return text, None, None
+        cleaned_text = cls.clean_text(text)
+        return text, cleaned_text, sent_tokenize(cleaned_text)
+
+    @classmethod
+    def _iter_pages_parallel(cls, pdf_file_path: str, total_pages: int, workers: int, pages_per_task: int, engine: str):
+        """
+        Spreads page ranges across the shared extraction pool and yields the extracted pages
+        in page order. Two ranges per process are in flight at a time, so the processes stay
+        busy while the pages waiting for the chunker stay bounded on large documents.
+        """
+        pool = extraction_pool(workers)
+        starts = iter(range(0, total_pages, pages_per_task))
+        in_flight = deque()
+
+        def submit_next():
+            start = next(starts, None)
+            if start is not None:
+                in_flight.append(pool.submit(
+                    cls.extract_pages, pdf_file_path, start, min(start + pages_per_task, total_pages), engine
+                ))
+
+        try:
+            for _ in range(2 * workers):
+                submit_next()
+            while in_flight:
+                pages = in_flight.popleft().result()
+                submit_next()
+                yield from pages
+        except BrokenProcessPool:
+            _discard_extraction_pool(pool)
+            raise
+        finally:
+            for future in in_flight:
+                future.cancel()
+
     @classmethod
-    def chunk_pdf_text(
+    def _stitch_page(
+        cls,
+        text: str,
+        cleaned_text: str,
+        sentences: list,
+        residual_fragment: str,
+        min_sentences_per_page: int,
+        uppercase_threshold: float
+    ) -> tuple:
+        """
+        Applies the cross-page residual fragment carry-over to one extracted page.
+        Returns the text to chunk, its sentences and the new residual fragment.
+        """
+        # Append any leftover from the previous page
+        if residual_fragment:
+            text = residual_fragment + " " + text
+            residual_fragment = ""
+            cleaned_text = None
+
+        if cleaned_text is None:
+            cleaned_text = cls.clean_text(text)
+            sentences = sent_tokenize(cleaned_text)
+        else:
+            sentences = list(sentences)
+        sentence_count = len(sentences)
+
+        # Check if page is predominantly uppercase
+        upper_check = cls.is_uppercase(cleaned_text, threshold=uppercase_threshold)
+
+        # Decide if it's a 'regular' page or a header/title page
+        is_regular_page = (sentence_count >= min_sentences_per_page) and (not upper_check)
+
+        if is_regular_page:
+            # If the last sentence is incomplete, keep it for the next round
+            if not cls.is_sentence_complete(cleaned_text) and sentences:
+                residual_fragment = sentences.pop(-1)
+                cleaned_text = ' '.join(sentences)
+
+        return cleaned_text, sentences, residual_fragment
+
+    @classmethod
+    def _chunk_sentences(
+        cls,
+        sentences: list,
+        max_words: int,
+        overlap_sentences: int,
+        max_tokens: int = None,
+        token_counter=None,
+        token_limit: int = None,
+        stats: dict = None
+    ) -> list:
+        """
+        Chunks the sentences of a page by words, or by tokens when max_tokens is set.
+        Every sentence is measured once, and only chunking by tokens runs the tokenizer.
+        Then, when token_limit is given, the chunks longer than token_limit tokens are
+        counted in `stats`.
+        """
+        token_lengths = token_counter(sentences) if max_tokens and sentences else None
+        if max_tokens:
+            spans = cls.chunk_spans(token_lengths, max_tokens, overlap_sentences)
+        else:
+            spans = cls.chunk_spans([len(sentence.split()) for sentence in sentences], max_words, overlap_sentences)
+
+        if stats is not None:
+            stats['chunks'] = stats.get('chunks', 0) + len(spans)
+            if token_lengths is not None and token_limit:
+                for start, end in spans:
+                    tokens = sum(token_lengths[start:end])
+                    stats['tokens'] = stats.get('tokens', 0) + tokens
+                    stats['max_chunk_tokens'] = max(stats.get('max_chunk_tokens', 0), tokens)
+                    if tokens > token_limit:
+                        stats['truncated_chunks'] = stats.get('truncated_chunks', 0) + 1
+                        stats['truncated_tokens'] = stats.get('truncated_tokens', 0) + tokens - token_limit
+        return [' '.join(sentences[start:end]) for start, end in spans]
+
+    @classmethod
+    def iter_pdf_chunks(
         cls,
         pdf_file_path: str,
         original_file_name: str,
@@ -105,77 +468,147 @@ class PDFProcessor:
         max_words: int = 300,
         overlap_sentences: int = 1,
         min_sentences_per_page: int = 3,
-        uppercase_threshold: float = 0.8
-    ) -> list:
+        uppercase_threshold: float = 0.8,
+        workers: int = 1,
+        pages_per_task: int = 20,
+        max_tokens: int = None,
+        token_counter=None,
+        token_limit: int = None,
+        stats: dict = None,
+        engine: str = 'pdfplumber',
+        pages: list = None,
+        page_sink=None
+    ):
         """
-        Reads a PDF, processes text page-by-page, and returns a list of chunk dictionaries.
+        Reads a PDF, processes text page-by-page, and yields chunk dictionaries as soon as
+        each page is chunked.
+        With workers > 1 the page extraction is spread across a process pool; the pages are
+        stitched back in page order so the chunks match the sequential path.
+        Chunks hold up to max_words words, or up to max_tokens tokens as counted by
+        `token_counter` (a callable returning the token count of each given sentence).
+        When a `stats` dict is given it receives the number of pages and chunks and, when
+        chunking by tokens with the model's token_limit, how many chunks and tokens the
+        model will truncate.
+        `engine` selects the text extractor, see open_extractor.
+        When the PDF's `pages` were already extracted, e.g. by a previous upload (see
+        PageStore), they are chunked without opening the PDF. Otherwise every extracted
+        page is handed to the append() method of `page_sink` when one is given, e.g. a
+        PageWriter, as soon as it is extracted.
         """
-        pdf_chunks = []
+        pdf_name = cls.pretty_print_filename(original_file_name)
+        chunk_options = {
+            'max_words': max_words,
+            'overlap_sentences': overlap_sentences,
+            'min_sentences_per_page': min_sentences_per_page,
+            'uppercase_threshold': uppercase_threshold,
+            'max_tokens': max_tokens,
+            'token_counter': token_counter,
+            'token_limit': token_limit,
+            'stats': stats
+        }
+        if pages is not None:
+            yield from cls.iter_page_chunks(pages, len(pages), pdf_name, socketio_instance, socket_id, **chunk_options)
+            return
+
+        extractor = open_extractor(pdf_file_path, engine)
+        try:
+            total_pages = extractor.page_count
+            if workers > 1 and total_pages > pages_per_task:
+                pages = cls._iter_pages_parallel(pdf_file_path, total_pages, workers, pages_per_task, engine)
+            else:
+                pages = (cls.split_page(extractor.page_text(page_index)) for page_index in range(total_pages))
+            if page_sink is not None:
+                pages = cls._recorded(pages, page_sink)
+            yield from cls.iter_page_chunks(pages, total_pages, pdf_name, socketio_instance, socket_id, **chunk_options)
+        finally:
+            extractor.close()
+
+    @staticmethod
+    def _recorded(pages, page_sink):
+        for page in pages:
+            page_sink.append(page)
+            yield page
+
+    @classmethod
+    def iter_page_chunks(
+        cls,
+        pages,
+        total_pages: int,
+        pdf_name: str,
+        socketio_instance: SocketIO,
+        socket_id: str,
+        max_words: int = 300,
+        overlap_sentences: int = 1,
+        min_sentences_per_page: int = 3,
+        uppercase_threshold: float = 0.8,
+        max_tokens: int = None,
+        token_counter=None,
+        token_limit: int = None,
+        stats: dict = None
+    ):
+        """
+        Chunks extracted pages, given as (text, cleaned_text, sentences) tuples in page
+        order, and yields the chunk dictionaries of the document `pdf_name`. The chunking
+        options are those of iter_pdf_chunks.
+        """
+        chunk_options = {
+            'max_words': max_words,
+            'overlap_sentences': overlap_sentences,
+            'max_tokens': max_tokens,
+            'token_counter': token_counter,
+            'token_limit': token_limit,
+            'stats': stats
+        }
         residual_fragment = ""
+        if stats is not None:
+            stats['pages'] = stats.get('pages', 0) + total_pages
+
+        for page_number, (text, cleaned_text, sentences) in enumerate(pages):
+            # Emit progress every 10 pages or the last page
+            if (page_number + 1) % 10 == 0 or (page_number + 1) == total_pages:
+                progress = (page_number + 1) / total_pages * 90
+                socketio_instance.emit('processing_progress', {'progress': progress}, room=socket_id)
+                socketio_instance.emit(
+                    'status',
+                    {'message': f'Chunking page {page_number + 1} of {total_pages}...'},
+                    room=socket_id
+                )
 
-        with pdfplumber.open(pdf_file_path) as pdf:
-            total_pages = len(pdf.pages)
-            for page_number, page in enumerate(pdf.pages):
-                # Emit progress every 10 pages or the last page
-                if (page_number + 1) % 10 == 0 or (page_number + 1) == total_pages:
-                    progress = (page_number + 1) / total_pages * 90
-                    socketio_instance.emit('processing_progress', {'progress': progress}, room=socket_id)
-                    socketio_instance.emit(
-                        'status',
-                        {'message': f'Chunking page {page_number + 1} of {total_pages}...'},
-                        room=socket_id
-                    )
-
-                text = page.extract_text()
-                if text:
-                    # Convert left to right languages texts
-                    lines = text.split("\n")
-                    lines = [get_display(line) for line in lines]
-                    text = "\n".join(lines)
-
-                    # Append any leftover from the previous page
-                    if residual_fragment:
-                        text = residual_fragment + " " + text
-                        residual_fragment = ""
-
-                    cleaned_text = cls.clean_text(text)
-                    sentences = sent_tokenize(cleaned_text)
-                    sentence_count = len(sentences)
-
-                    # Check if page is predominantly uppercase
-                    upper_check = cls.is_uppercase(cleaned_text, threshold=uppercase_threshold)
-
-                    # Decide if it's a 'regular' page or a header/title page
-                    is_regular_page = (sentence_count >= min_sentences_per_page) and (not upper_check)
-
-                    if is_regular_page:
-                        # If the last sentence is incomplete, keep it for the next round
-                        if not cls.is_sentence_complete(cleaned_text) and sentences:
-                            residual_fragment = sentences.pop(-1)
-                            cleaned_text = ' '.join(sentences)
-                    else:
-                        # Possibly a header or title page; clear any leftovers
-                        residual_fragment = ""
-
-                    # Chunk the text
-                    chunks = cls.chunk_text(cleaned_text, max_words, overlap_sentences)
-                    for chunk_id, chunk in enumerate(chunks):
-                        pdf_chunks.append({
-                            "pdf_name": cls.pretty_print_filename(original_file_name),
-                            "page": page_number + 1,
-                            "chunk_id": chunk_id,
-                            "text": chunk
-                        })
-
-            # Handle any leftover sentence after processing all pages
-            if residual_fragment:
-                chunks = cls.chunk_text(residual_fragment, max_words, overlap_sentences)
+            if text:
+                cleaned_text, sentences, residual_fragment = cls._stitch_page(
+                    text,
+                    cleaned_text,
+                    sentences,
+                    residual_fragment,
+                    min_sentences_per_page,
+                    uppercase_threshold
+                )
+
+                # Chunk the text
+                chunks = cls._chunk_sentences(sentences, **chunk_options)
                 for chunk_id, chunk in enumerate(chunks):
-                    pdf_chunks.append({
-                        "pdf_name": cls.pretty_print_filename(original_file_name),
-                        "page": total_pages,
+                    yield {
+                        "pdf_name": pdf_name,
+                        "page": page_number + 1,
                         "chunk_id": chunk_id,
                         "text": chunk
-                    })
+                    }
+
+        # Handle any leftover sentence after processing all pages
+        if residual_fragment:
+            chunks = cls._chunk_sentences(sent_tokenize(residual_fragment), **chunk_options)
+            for chunk_id, chunk in enumerate(chunks):
+                yield {
+                    "pdf_name": pdf_name,
+                    "page": total_pages,
+                    "chunk_id": chunk_id,
+                    "text": chunk
+                }
 
-        return pdf_chunks
+    @classmethod
+    def chunk_pdf_text(cls, *args, **kwargs) -> list:
+        """
+        Reads a PDF and returns the full list of chunk dictionaries.
+        Accepts the same arguments as iter_pdf_chunks.
+        """
+        return list(cls.iter_pdf_chunks(*args, **kwargs))
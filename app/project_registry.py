@@ -0,0 +1,115 @@
+"""
+project_registry.py
+
+Keeps the list of projects, so listing them and checking that one exists does not go to the vector store.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectRegistry:
+    """
+    SQLite-backed list of the projects, served from memory. The list is re-read after
+    `ttl_seconds` so projects created or deleted by other processes (gunicorn workers,
+    the command-line tools) show up.
+
+    The first time the registry is read, it is filled with the names returned by `seed`,
+    typically the collections already in the vector store.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 30, seed=None):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.seed = seed
+        self._projects = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    project_id TEXT PRIMARY KEY,
+                    storage_profile TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS registry_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=30))
+
+    def _load(self) -> set:
+        with self._connect() as conn, conn:
+            seeded = conn.execute("SELECT 1 FROM registry_state WHERE key = 'seeded'").fetchone()
+            if not seeded and self.seed is not None:
+                names = list(self.seed())
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO projects (project_id, storage_profile, created_at) VALUES (?, NULL, ?)",
+                    [(name, now) for name in names]
+                )
+                conn.execute("INSERT OR REPLACE INTO registry_state (key, value) VALUES ('seeded', ?)", (str(now),))
+                logger.info(f"Registered {len(names)} existing projects")
+            return {row[0] for row in conn.execute("SELECT project_id FROM projects")}
+
+    def _current(self) -> set:
+        with self._lock:
+            if self._projects is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+                self._projects = self._load()
+                self._loaded_at = time.monotonic()
+            return self._projects
+
+    def list(self) -> list:
+        """
+        Returns the names of every project, sorted.
+        """
+        return sorted(self._current())
+
+    def exists(self, project_id: str) -> bool:
+        return project_id in self._current()
+
+    def storage_profile(self, project_id: str) -> str:
+        """
+        Returns the storage profile the project was created with, or None when it is not known.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT storage_profile FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, project_id: str, storage_profile: str = None) -> bool:
+        """
+        Registers a project. Returns False when it was already registered.
+        """
+        if self.exists(project_id):
+            return False
+        with self._connect() as conn, conn:
+            added = conn.execute(
+                "INSERT OR IGNORE INTO projects (project_id, storage_profile, created_at) VALUES (?, ?, ?)",
+                (project_id, storage_profile, time.time())
+            ).rowcount
+        with self._lock:
+            if self._projects is not None:
+                self._projects = self._projects | {project_id}
+        return bool(added)
+
+    def remove(self, project_id: str):
+        with self._connect() as conn, conn:
+            conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+        with self._lock:
+            if self._projects is not None:
+                self._projects = self._projects - {project_id}
@@ -1,51 +1,236 @@
 """
 qdrant_manager.py
 
-Contains QdrantManager for managing Qdrant collections and vector upserts.
+Contains QdrantManager for managing Qdrant collections and vector upserts, and
+SharedQdrantManager, which keeps every project in one shared collection.
 """
 
 import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams, Distance
+from qdrant_client.http.models import (
+    VectorParams, VectorParamsDiff, Distance, PointStruct, PointIdsList,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, Disabled,
+    HnswConfigDiff, CollectionParamsDiff,
+    SearchParams, QuantizationSearchParams, SearchRequest,
+    PayloadSchemaType, Filter, FieldCondition, MatchAny, MatchValue, Range, FilterSelector,
+    KeywordIndexParams, KeywordIndexType
+)
+
+from vector_store import VectorStore, SearchFilter, SearchHit, Collection
 
 logger = logging.getLogger(__name__)
 
-class QdrantManager:
+# Payload fields indexed in every collection, so searches and deletions can filter on them
+PAYLOAD_INDEXES = {
+    'pdf_name': PayloadSchemaType.KEYWORD,
+    'page': PayloadSchemaType.INTEGER,
+    'chunk_id': PayloadSchemaType.INTEGER,
+}
+
+# Bytes of an upsert request per point besides its vector and text: its ID, the payload
+# keys and the short payload fields
+POINT_OVERHEAD_BYTES = 256
+
+# Payload fields added to the points of the shared collection: the project owning the
+# point and the point ID the app knows it by
+TENANT_FIELD = 'project_id'
+POINT_ID_FIELD = 'point_id'
+# Namespace of the shared collection's point IDs, see SharedQdrantManager.stored_point_id
+TENANT_POINT_NAMESPACE = uuid.UUID('6f0d7f52-3c1e-4d8a-9a57-1b2f3e4c5d60')
+
+class QdrantManager(VectorStore):
     """
-    Manages Qdrant collection creation, deletion, and point upserts.
+    Manages Qdrant collection creation, deletion, point upserts and deletions, and searches.
+
+    Collections are created with a storage profile, a dict that may set:
+      - quantization: None, 'scalar' (int8) or 'binary'
+      - quantization_always_ram: keep the quantized vectors in RAM (default True)
+      - vectors_on_disk / payload_on_disk: store the original vectors / payloads on disk
+      - hnsw_m, hnsw_ef_construct, hnsw_on_disk: HNSW graph parameters
+
+    The pdf_name, page and chunk_id payload fields are indexed (see PAYLOAD_INDEXES), so
+    searches restricted to some documents or pages and per-document deletions use the
+    indexes instead of scanning the payloads.
+
+    Upserts are cut into requests of at most `upsert_max_points` points and
+    `upsert_max_bytes` serialized bytes, so documents with long chunks get smaller
+    requests. Up to `upsert_in_flight` requests are sent at once, shared by every caller,
+    and a failed request is retried `upsert_retries` times with exponential backoff.
+
+    search_async() goes through `async_client`, an AsyncQdrantClient, when one is set.
     """
 
-    def __init__(self, client: QdrantClient, embedding_model):
+    def __init__(
+        self,
+        client: QdrantClient,
+        embedding_model,
+        storage_profiles: dict = None,
+        default_profile: str = 'default',
+        rescore: bool = True,
+        oversampling: float = 2.0,
+        upsert_max_points: int = 256,
+        upsert_max_bytes: int = 4 * 1024 * 1024,
+        upsert_in_flight: int = 4,
+        upsert_retries: int = 3,
+        upsert_backoff: float = 0.5,
+        async_client=None
+    ):
         self.client = client
+        # AsyncQdrantClient used by search_async(), set by the async query server
+        self.async_client = async_client
         self.model = embedding_model
+        self.storage_profiles = storage_profiles or {'default': {}}
+        self.default_profile = default_profile
+        # Quantized collections are searched on the compressed vectors first, then the
+        # oversampled candidates are rescored with the original vectors
+        self.search_params = SearchParams(
+            quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+        )
+        self.upsert_max_points = upsert_max_points
+        self.upsert_max_bytes = upsert_max_bytes
+        self.upsert_retries = upsert_retries
+        self.upsert_backoff = upsert_backoff
+        self._upsert_executor = ThreadPoolExecutor(max_workers=upsert_in_flight, thread_name_prefix='qdrant-upsert')
+
+    def _profile(self, storage_profile: str = None) -> dict:
+        name = storage_profile or self.default_profile
+        if name not in self.storage_profiles:
+            raise ValueError(f"Unknown storage profile '{name}'")
+        return self.storage_profiles[name]
+
+    @staticmethod
+    def _quantization_config(profile: dict):
+        always_ram = profile.get('quantization_always_ram', True)
+        if profile.get('quantization') == 'scalar':
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=always_ram)
+            )
+        if profile.get('quantization') == 'binary':
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=always_ram))
+        return None
+
+    @staticmethod
+    def _hnsw_config(profile: dict):
+        params = {
+            'm': profile.get('hnsw_m'),
+            'ef_construct': profile.get('hnsw_ef_construct'),
+            'on_disk': profile.get('hnsw_on_disk'),
+        }
+        params = {key: value for key, value in params.items() if value is not None}
+        return HnswConfigDiff(**params) if params else None
+
+    @staticmethod
+    def _conditions(search_filter: SearchFilter = None) -> list:
+        """
+        Translates a SearchFilter into Qdrant field conditions.
+        """
+        if search_filter is None:
+            return []
+        conditions = []
+        if search_filter.pdf_names:
+            conditions.append(FieldCondition(key='pdf_name', match=MatchAny(any=list(search_filter.pdf_names))))
+        if search_filter.min_page is not None or search_filter.max_page is not None:
+            conditions.append(FieldCondition(
+                key='page', range=Range(gte=search_filter.min_page, lte=search_filter.max_page)
+            ))
+        return conditions
+
+    def _query_filter(self, project_id: str, search_filter: SearchFilter = None):
+        """
+        Returns the Qdrant filter selecting the project's points that match `search_filter`.
+        """
+        conditions = self._conditions(search_filter)
+        return Filter(must=conditions) if conditions else None
+
+    def _collection_name(self, project_id: str) -> str:
+        """
+        Returns the Qdrant collection holding the project's points.
+        """
+        return project_id
+
+    def _app_point(self, stored_id, payload: dict) -> tuple:
+        """
+        Returns the ID and payload the app knows a stored point by.
+        """
+        return stored_id, payload
+
+    def _hits(self, points: list) -> list:
+        """
+        Returns the search results as the app sees them.
+        """
+        return points
 
-    def ensure_collection_exists(self, project_id: str):
+    def ensure_collection_exists(self, project_id: str, storage_profile: str = None):
         """
         Checks if a Qdrant collection with the given project_id exists.
-        If it doesn't, it creates one.
+        If it doesn't, it creates one. Collections created before the payload
+        indexes existed get them.
         """
+        self._ensure_collection(project_id, storage_profile)
+
+    def _ensure_collection(self, collection_name: str, storage_profile: str = None):
         try:
-            self.client.get_collection(project_id)
+            info = self.client.get_collection(collection_name)
         except Exception:
-            logger.info(f"Creating new collection for project '{project_id}'")
-            self.client.create_collection(
-                collection_name=project_id,
-                vectors_config=VectorParams(
-                    size=self.model.get_sentence_embedding_dimension(),
-                    distance=Distance.COSINE
+            logger.info(f"Creating new collection '{collection_name}'")
+            self._create_collection(collection_name, storage_profile)
+            return
+        self.create_payload_indexes(collection_name, existing=set(info.payload_schema or {}))
+
+    def create_payload_indexes(self, collection_name: str, existing: set = frozenset()):
+        """
+        Indexes the payload fields of PAYLOAD_INDEXES that are not in `existing`.
+        """
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                logger.info(f"Creating the payload index of '{field_name}' in '{collection_name}'")
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=True
                 )
-            )
 
-    def create_collection(self, project_id: str):
+    def create_collection(self, project_id: str, storage_profile: str = None):
         """
-        Creates a new Qdrant collection for the given project_id.
+        Creates a new Qdrant collection for the given project_id with the given storage profile.
         """
+        self._create_collection(project_id, storage_profile)
+
+    def _create_collection(self, collection_name: str, storage_profile: str = None):
+        profile = self._profile(storage_profile)
         self.client.create_collection(
-            collection_name=project_id,
+            collection_name=collection_name,
             vectors_config=VectorParams(
                 size=self.model.get_sentence_embedding_dimension(),
-                distance=Distance.COSINE
-            )
+                distance=Distance.COSINE,
+                on_disk=profile.get('vectors_on_disk', False)
+            ),
+            on_disk_payload=profile.get('payload_on_disk', False),
+            quantization_config=self._quantization_config(profile),
+            hnsw_config=self._hnsw_config(profile)
+        )
+        self.create_payload_indexes(collection_name)
+
+    def apply_storage_profile(self, project_id: str, storage_profile: str):
+        """
+        Migrates an existing collection to the given storage profile. Qdrant rebuilds the
+        affected segments in the background.
+        """
+        profile = self._profile(storage_profile)
+        self.client.update_collection(
+            collection_name=self._collection_name(project_id),
+            vectors_config={"": VectorParamsDiff(on_disk=profile.get('vectors_on_disk', False))},
+            collection_params=CollectionParamsDiff(on_disk_payload=profile.get('payload_on_disk', False)),
+            quantization_config=self._quantization_config(profile) or Disabled.DISABLED,
+            hnsw_config=self._hnsw_config(profile)
         )
 
     def delete_collection(self, project_id: str):
@@ -54,21 +239,390 @@ class QdrantManager:
         """
         self.client.delete_collection(collection_name=project_id)
 
+    def _stored_vector_size(self, project_id: str) -> int:
+        """
+        Returns the vector size of the collection holding the project, or None when it
+        does not exist.
+        """
+        try:
+            info = self.client.get_collection(self._collection_name(project_id))
+        except Exception:
+            return None
+        return info.config.params.vectors.size
+
+    def replace_collection(self, project_id: str, staging_id: str, storage_profile: str = None, batch_size: int = 1000):
+        """
+        Copies the staging project's points with their vectors into the project, deletes
+        the project's points the staging project does not hold, then deletes the staging
+        project. The project stays searchable during the copy unless its collection holds
+        vectors of another size, in which case it is created again first.
+        """
+        if self._stored_vector_size(project_id) != self.model.get_sentence_embedding_dimension():
+            self.delete_collection(project_id)
+            self.create_collection(project_id, storage_profile)
+
+        copied, batch = set(), []
+        for point in self.iter_points(staging_id, batch_size=batch_size, with_vectors=True):
+            batch.append(point)
+            copied.add(point['id'])
+            if len(batch) >= batch_size:
+                self.upsert_points(project_id, batch)
+                batch = []
+        if batch:
+            self.upsert_points(project_id, batch)
+
+        stale = [point['id'] for point in self.iter_points(project_id, batch_size=batch_size) if point['id'] not in copied]
+        self.delete_points(project_id, stale)
+        self.delete_collection(staging_id)
+
     def get_collections(self):
         """
         Returns a list of all existing Qdrant collections.
         """
         return self.client.get_collections().collections
 
-    def upsert_points(self, project_id: str, points: list, batch_size: int = 100):
+    @staticmethod
+    def _point_bytes(point: dict) -> int:
         """
-        Upserts the given points to the specified Qdrant collection in batches.
+        Estimates the bytes a point adds to an upsert request from its float32 vector and
+        its payload text, which make up nearly all of it, without serializing the point.
         """
-        for i in range(0, len(points), batch_size):
-            batch = points[i:i + batch_size]
+        return len(point['vector']) * 4 + len(point['payload'].get('text', '')) + POINT_OVERHEAD_BYTES
+
+    def _upsert_batches(self, points: list, max_points: int) -> list:
+        """
+        Groups the points into batches bounded by both the point count and the estimated
+        size of the upsert request, see _point_bytes.
+        """
+        batches, batch, batch_bytes = [], [], 0
+        for point in points:
+            point_bytes = self._point_bytes(point)
+            if batch and (len(batch) >= max_points or batch_bytes + point_bytes > self.upsert_max_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(point)
+            batch_bytes += point_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _upsert_with_retries(self, project_id: str, batch: list):
+        """
+        Upserts one batch, retrying transient errors with exponential backoff and jitter.
+        """
+        for attempt in range(self.upsert_retries + 1):
             try:
-                self.client.upsert(collection_name=project_id, points=batch)
+                self.client.upsert(
+                    collection_name=self._collection_name(project_id),
+                    points=[PointStruct(**point) for point in batch],
+                    wait=True
+                )
+                return
             except Exception as e:
-                error_message = f"Error upserting batch {i // batch_size + 1} in '{project_id}': {str(e)}"
-                logger.error(error_message)
-                raise
+                # Client errors such as a malformed point fail the same way on every attempt
+                status_code = getattr(e, 'status_code', None)
+                permanent = status_code is not None and 400 <= status_code < 500 and status_code != 429
+                if permanent or attempt == self.upsert_retries:
+                    raise
+                delay = self.upsert_backoff * 2 ** attempt * random.uniform(1, 1.5)
+                logger.warning(
+                    f"Upsert of {len(batch)} points in '{project_id}' failed ({e}), "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{self.upsert_retries})"
+                )
+                time.sleep(delay)
+
+    def upsert_points(self, project_id: str, points: list, batch_size: int = None, on_batch=None):
+        """
+        Upserts the given points to the specified Qdrant collection with concurrent batched
+        requests. `on_batch(batch)` is called in the calling thread as each batch is
+        committed. If a batch still fails after its retries, the batches not sent yet are
+        cancelled and the error is raised.
+        """
+        batches = self._upsert_batches(points, batch_size or self.upsert_max_points)
+        futures = {
+            self._upsert_executor.submit(self._upsert_with_retries, project_id, batch): index
+            for index, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            error = future.exception()
+            if error is not None:
+                for pending in futures:
+                    pending.cancel()
+                logger.error(f"Error upserting batch {futures[future] + 1} of {len(batches)} in '{project_id}': {error}")
+                raise error
+            if on_batch is not None:
+                on_batch(batches[futures[future]])
+
+    def delete_points(self, project_id: str, point_ids: list, batch_size: int = 1000):
+        """
+        Deletes the points with the given IDs from the specified Qdrant collection in batches.
+        """
+        for i in range(0, len(point_ids), batch_size):
+            batch = point_ids[i:i + batch_size]
+            self.client.delete(
+                collection_name=self._collection_name(project_id),
+                points_selector=PointIdsList(points=batch)
+            )
+
+    def delete_document(self, project_id: str, pdf_name: str):
+        """
+        Deletes every point of the given document with one filtered request.
+        """
+        self.client.delete(
+            collection_name=self._collection_name(project_id),
+            points_selector=FilterSelector(
+                filter=self._query_filter(project_id, SearchFilter(pdf_names=[pdf_name]))
+            )
+        )
+
+    def count_points(self, project_id: str) -> int:
+        """
+        Returns the exact number of points stored in the project.
+        """
+        return self.client.count(
+            collection_name=self._collection_name(project_id),
+            count_filter=self._query_filter(project_id),
+            exact=True
+        ).count
+
+    def iter_points(self, project_id: str, batch_size: int = 1000, with_vectors: bool = False):
+        """
+        Yields every point of the specified Qdrant collection, with its vector when
+        `with_vectors` is set.
+        """
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self._collection_name(project_id),
+                scroll_filter=self._query_filter(project_id),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            for record in points:
+                point_id, payload = self._app_point(record.id, record.payload)
+                point = {"id": point_id, "payload": payload}
+                if with_vectors:
+                    point["vector"] = record.vector
+                yield point
+            if offset is None:
+                return
+
+    def search(self, project_id: str, query_vector: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Runs a similarity search in the specified Qdrant collection, restricted to the
+        points matching `search_filter`.
+        """
+        return self._hits(self.client.search(
+            collection_name=self._collection_name(project_id),
+            query_vector=query_vector,
+            query_filter=self._query_filter(project_id, search_filter),
+            limit=limit,
+            search_params=self.search_params
+        ))
+
+    async def search_async(self, project_id: str, query_vector: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Same as search() through the async client, so a waiting search holds no thread.
+        """
+        if self.async_client is None:
+            return await super().search_async(project_id, query_vector, limit=limit, search_filter=search_filter)
+        return self._hits(await self.async_client.search(
+            collection_name=self._collection_name(project_id),
+            query_vector=query_vector,
+            query_filter=self._query_filter(project_id, search_filter),
+            limit=limit,
+            search_params=self.search_params
+        ))
+
+    def search_batch(self, project_id: str, query_vectors: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Runs several similarity searches in the collection with a single request.
+        """
+        query_filter = self._query_filter(project_id, search_filter)
+        results = self.client.search_batch(
+            collection_name=self._collection_name(project_id),
+            requests=[
+                SearchRequest(
+                    vector=query_vector,
+                    filter=query_filter,
+                    limit=limit,
+                    with_payload=True,
+                    params=self.search_params
+                )
+                for query_vector in query_vectors
+            ]
+        )
+        return [self._hits(points) for points in results]
+
+
+class SharedQdrantManager(QdrantManager):
+    """
+    Keeps every project in one shared Qdrant collection instead of one collection per
+    project, for deployments with thousands of small projects where per-collection
+    overhead (segments, HNSW graphs, file handles) dominates.
+
+    Each point carries its project in the TENANT_FIELD payload field, indexed as the
+    collection's tenant key so Qdrant groups each project's points together, and every
+    search, scroll and deletion is filtered on it. The collection's HNSW graph is built
+    per project (payload_m) instead of globally (m=0), since no search spans projects.
+
+    The app's point IDs are only unique within a project, so points are stored under an
+    ID derived from the project and the app's ID, which is kept in the POINT_ID_FIELD
+    payload field and handed back by searches and scrolls.
+
+    The shared collection is created with `default_profile`; the storage profile asked
+    for a project is ignored.
+    """
+
+    def __init__(self, client: QdrantClient, embedding_model, collection_name: str = 'projects', **kwargs):
+        super().__init__(client, embedding_model, **kwargs)
+        self.collection_name = collection_name
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    @staticmethod
+    def stored_point_id(project_id: str, point_id) -> str:
+        """
+        Returns the ID a project's point is stored under in the shared collection.
+        """
+        return str(uuid.uuid5(TENANT_POINT_NAMESPACE, f"{project_id}\x1f{point_id}"))
+
+    def _collection_name(self, project_id: str) -> str:
+        return self.collection_name
+
+    def _query_filter(self, project_id: str, search_filter: SearchFilter = None):
+        tenant = FieldCondition(key=TENANT_FIELD, match=MatchValue(value=project_id))
+        return Filter(must=[tenant] + self._conditions(search_filter))
+
+    def _app_point(self, stored_id, payload: dict) -> tuple:
+        payload = dict(payload or {})
+        payload.pop(TENANT_FIELD, None)
+        return payload.pop(POINT_ID_FIELD, stored_id), payload
+
+    def _hits(self, points: list) -> list:
+        hits = []
+        for point in points:
+            point_id, payload = self._app_point(point.id, point.payload)
+            hits.append(SearchHit(point_id, point.score, payload))
+        return hits
+
+    @staticmethod
+    def _hnsw_config(profile: dict):
+        params = {
+            'm': 0,
+            'payload_m': profile.get('hnsw_m') or 16,
+            'ef_construct': profile.get('hnsw_ef_construct'),
+            'on_disk': profile.get('hnsw_on_disk'),
+        }
+        return HnswConfigDiff(**{key: value for key, value in params.items() if value is not None})
+
+    def create_payload_indexes(self, collection_name: str, existing: set = frozenset()):
+        """
+        Indexes the tenant key, then the fields of PAYLOAD_INDEXES.
+        """
+        if TENANT_FIELD not in existing:
+            logger.info(f"Creating the tenant index of '{TENANT_FIELD}' in '{collection_name}'")
+            self.client.create_payload_index(
+                collection_name=collection_name,
+                field_name=TENANT_FIELD,
+                field_schema=KeywordIndexParams(type=KeywordIndexType.KEYWORD, is_tenant=True),
+                wait=True
+            )
+        super().create_payload_indexes(collection_name, existing)
+
+    def _ensure_shared_collection(self):
+        """
+        Creates the shared collection and its indexes on first use.
+        """
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self._ensure_collection(self.collection_name, self.default_profile)
+                self._ready = True
+
+    def ensure_collection_exists(self, project_id: str, storage_profile: str = None):
+        """
+        Makes sure the shared collection exists. Projects need nothing more.
+        """
+        self._ensure_shared_collection()
+
+    def create_collection(self, project_id: str, storage_profile: str = None):
+        """
+        Makes sure the shared collection exists; the project has no points yet.
+        """
+        if storage_profile and storage_profile != self.default_profile:
+            logger.info(
+                f"Project '{project_id}' uses the shared collection's storage profile "
+                f"'{self.default_profile}' instead of '{storage_profile}'"
+            )
+        self._ensure_shared_collection()
+
+    def apply_storage_profile(self, project_id: str, storage_profile: str):
+        """
+        Raises ValueError: the shared collection holds every project with its default
+        profile, so one project cannot be migrated to another profile.
+        """
+        raise ValueError(
+            f"Project '{project_id}' is stored in the shared collection '{self.collection_name}' "
+            f"with its profile '{self.default_profile}', storage profiles only apply to per-project collections"
+        )
+
+    def delete_collection(self, project_id: str):
+        """
+        Deletes every point of the project from the shared collection.
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=self._query_filter(project_id))
+        )
+
+    def retained_vector_size(self, project_id: str) -> int:
+        """
+        Returns the vector size of the shared collection, which outlives the deletion of
+        any project, or None when it does not exist yet.
+        """
+        return self._stored_vector_size(project_id)
+
+    def get_collections(self) -> list:
+        """
+        Returns the projects that have points in the shared collection, counted with a
+        facet of the tenant index. Projects without points are only known to the
+        ProjectRegistry.
+        """
+        try:
+            self.client.get_collection(self.collection_name)
+        except Exception:
+            return []
+        response = self.client.facet(collection_name=self.collection_name, key=TENANT_FIELD, limit=1_000_000, exact=True)
+        return [Collection(name=hit.value) for hit in sorted(response.hits, key=lambda hit: hit.value)]
+
+    def upsert_points(self, project_id: str, points: list, batch_size: int = None, on_batch=None):
+        """
+        Upserts the project's points into the shared collection, tagged with the project.
+        `on_batch` receives the points as they were given.
+        """
+        originals = {}
+        stored = []
+        for point in points:
+            stored_id = self.stored_point_id(project_id, point["id"])
+            originals[stored_id] = point
+            stored.append({
+                "id": stored_id,
+                "vector": point["vector"],
+                "payload": {**point["payload"], TENANT_FIELD: project_id, POINT_ID_FIELD: str(point["id"])}
+            })
+        committed = None
+        if on_batch is not None:
+            committed = lambda batch: on_batch([originals[point["id"]] for point in batch])
+        super().upsert_points(project_id, stored, batch_size=batch_size, on_batch=committed)
+
+    def delete_points(self, project_id: str, point_ids: list, batch_size: int = 1000):
+        """
+        Deletes the project's points with the given IDs from the shared collection.
+        """
+        super().delete_points(
+            project_id, [self.stored_point_id(project_id, point_id) for point_id in point_ids], batch_size
+        )
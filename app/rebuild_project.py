@@ -0,0 +1,195 @@
+"""
+rebuild_project.py
+
+Chunks and embeds every document of a project again from the page store, without the
+PDFs, e.g. after changing CHUNK_MAX_WORDS, CHUNK_OVERLAP_SENTENCES, CHUNK_SIZE_UNIT or
+the SENTENCE_TRANSFORMER in config.py.
+
+The documents are rebuilt into a staging project, '<project_id>__rebuild', while the
+project keeps answering queries. Once every document is rebuilt, the staging points and
+keyword index replace the project's and the document registry is rewritten; when the
+rebuild fails, the staging project is deleted and the project is left as it was. A
+per-project collection holding vectors of another size is created again during the
+swap, so another model can be used. The shared Qdrant collection keeps its vector size,
+so a model whose vector size differs from it is refused before anything is built. The
+embeddings are computed by an embedding pool with one process per core. The project's
+cached answers are dropped in every server process.
+
+Documents ingested before the page store existed have no stored pages; the rebuild of
+their project stops unless --drop-missing is given, which removes them from it.
+
+Usage:
+    python rebuild_project.py <project_id> [<project_id> ...] [--workers 0] [--documents 2]
+    python rebuild_project.py --all [--drop-missing] [--prune-pages]
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import app as components
+from embedding_cache import CachedEncoder
+from embedding_pool import EmbeddingPool
+from ingestion_pipeline import IngestionPipeline
+from pdf_processor import PDFProcessor, NullEmitter, chunking_options
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Appended to a project's name to build its rebuild aside
+STAGING_SUFFIX = '__rebuild'
+
+
+def rebuild_document(project_id: str, document: dict, encoder, batch_size: int) -> tuple:
+    """
+    Chunks and embeds one document from its stored pages into the given project. Returns
+    the rebuild stats and the new chunk points of the document.
+    """
+    pages = components.page_store.load(document['content_hash'], config.PDF_TEXT_ENGINE)
+    stats = {}
+    chunks = PDFProcessor.iter_page_chunks(
+        pages, len(pages), document['pdf_name'], NullEmitter(), None, stats=stats,
+        **chunking_options(*components.tokenization.get())
+    )
+    pipeline = IngestionPipeline(
+        encoder,
+        components.vector_store,
+        NullEmitter(),
+        None,
+        batch_size=batch_size,
+        queue_size=config.INGESTION_QUEUE_SIZE,
+        lexical_index=components.lexical_index
+    )
+    pipeline.run(project_id, chunks, document['content_hash'])
+    return {"pages": len(pages), "chunks": stats.get('chunks', 0), **pipeline.stats}, pipeline.chunk_points
+
+
+def rebuild_project(project_id: str, encoder, batch_size: int, documents_at_once: int, drop_missing: bool) -> bool:
+    """
+    Rebuilds one project into a staging project and swaps it in once every document is
+    rebuilt. Returns False when the project was left as it was because of missing pages,
+    because its vector store cannot hold the model's vectors or because the rebuild failed.
+    """
+    dimension = components.model.get_sentence_embedding_dimension()
+    retained = components.vector_store.retained_vector_size(project_id)
+    if retained is not None and retained != dimension:
+        logger.error(
+            f"'{project_id}': the model's vectors have {dimension} dimensions, but the shared collection "
+            f"'{config.SHARED_COLLECTION}' holds vectors of {retained}. Set a new SHARED_COLLECTION to "
+            f"rebuild with this model"
+        )
+        return False
+
+    documents = components.document_registry.list_documents(project_id)
+    missing = [
+        document['pdf_name'] for document in documents
+        if not components.page_store.has(document['content_hash'], config.PDF_TEXT_ENGINE)
+    ]
+    if missing and not drop_missing:
+        logger.error(
+            f"'{project_id}': no stored pages for {missing}. Upload them again, or pass --drop-missing to "
+            f"rebuild without them"
+        )
+        return False
+
+    started = time.perf_counter()
+    storage_profile = components.project_registry.storage_profile(project_id)
+    staging_id = f"{project_id}{STAGING_SUFFIX}"
+    # Left over by a rebuild that was interrupted
+    components.vector_store.delete_collection(staging_id)
+    components.lexical_index.delete_project(staging_id)
+    components.vector_store.create_collection(staging_id, storage_profile)
+    present = [document for document in documents if document['pdf_name'] not in missing]
+    try:
+        # A few documents at once keep the pool busy while each one is chunked and upserted
+        with ThreadPoolExecutor(max_workers=documents_at_once) as executor:
+            results = list(executor.map(
+                lambda document: (document, *rebuild_document(staging_id, document, encoder, batch_size)),
+                present
+            ))
+    except Exception:
+        logger.exception(f"'{project_id}': the rebuild failed, the project is left as it was")
+        components.vector_store.delete_collection(staging_id)
+        components.lexical_index.delete_project(staging_id)
+        return False
+
+    try:
+        components.vector_store.replace_collection(project_id, staging_id, storage_profile)
+        components.lexical_index.replace_project(project_id, staging_id)
+        for name in missing:
+            components.document_registry.delete_document(project_id, name)
+            logger.warning(f"'{project_id}': dropped '{name}', which has no stored pages")
+        totals = {"pages": 0, "chunks": 0, "embed_seconds": 0.0}
+        for document, stats, chunk_points in results:
+            components.document_registry.save_document(
+                project_id, document['pdf_name'], document['content_hash'], chunk_points
+            )
+            logger.info(f"'{project_id}': rebuilt '{document['pdf_name']}' ({stats['pages']} pages, {stats['chunks']} chunks)")
+            for key in totals:
+                totals[key] += stats[key]
+        components.vector_store.flush(project_id)
+    finally:
+        # Answers cached before or during the rebuild cite the old chunks
+        if components.answer_cache is not None:
+            components.answer_cache.invalidate_project(project_id)
+
+    seconds = time.perf_counter() - started
+    logger.info(
+        f"Rebuilt '{project_id}': {len(present)} documents, {totals['pages']} pages, {totals['chunks']} chunks "
+        f"in {seconds:.1f}s ({totals['chunks'] / seconds if seconds else 0:.0f} chunks/s)"
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-chunk and re-embed projects from the page store.")
+    parser.add_argument('projects', nargs='*', help="Projects to rebuild")
+    parser.add_argument('--all', action='store_true', help="Rebuild every project")
+    parser.add_argument('--workers', type=int, default=0, help="Embedding processes, 0 uses every core")
+    parser.add_argument('--documents', type=int, default=2, help="Documents rebuilt at the same time")
+    parser.add_argument('--drop-missing', action='store_true', help="Remove the documents without stored pages instead of skipping their project")
+    parser.add_argument('--prune-pages', action='store_true', help="Delete the stored pages of files no project holds anymore")
+    args = parser.parse_args()
+
+    if components.page_store is None:
+        parser.error("The page store is disabled, set PAGE_STORE_ENABLED in config.py")
+    projects = components.project_registry.list() if args.all else args.projects
+    if not projects and not args.prune_pages:
+        parser.error("Name at least one project or pass --all")
+
+    skipped = []
+    if projects:
+        # Forked before this process loads its own model for the tokenizer
+        workers = args.workers or os.cpu_count()
+        pool = EmbeddingPool(
+            config.SENTENCE_TRANSFORMER,
+            config.EMBEDDING_BACKEND,
+            quantization=config.EMBEDDING_ONNX_QUANTIZATION,
+            workers=workers,
+            threads_per_worker=1,
+            min_slice_size=config.EMBEDDING_POOL_SLICE_SIZE,
+            export_folder=config.EMBEDDING_ONNX_FOLDER
+        )
+        encoder = CachedEncoder(pool, components.embedding_cache) if components.embedding_cache is not None else pool
+        # One slice per worker in every batch
+        batch_size = max(config.INGESTION_BATCH_SIZE, workers * config.EMBEDDING_POOL_SLICE_SIZE)
+        try:
+            skipped = [
+                project_id for project_id in projects
+                if not rebuild_project(project_id, encoder, batch_size, args.documents, args.drop_missing)
+            ]
+        finally:
+            pool.close()
+
+    if args.prune_pages:
+        removed = components.page_store.prune(components.document_registry.content_hashes())
+        logger.info(f"Pruned the pages of {removed} files, page store: {components.page_store.stats()}")
+    if skipped:
+        raise SystemExit(f"Not rebuilt, see the errors above: {skipped}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+retrieval.py
+
+Combines dense vector search and BM25 keyword search with reciprocal-rank fusion.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(result_lists: list, k: int = 60) -> list:
+    """
+    Merges ranked hit lists. Every hit scores sum(1 / (k + rank)) over the lists it
+    appears in, hits being matched by point ID. Returns (hit, fused_score, ranks) tuples
+    by descending fused score, where ranks holds the 1-based rank in each list or None.
+    """
+    fused = {}
+    for list_index, hits in enumerate(result_lists):
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(str(hit.id), [hit, 0.0, [None] * len(result_lists)])
+            entry[1] += 1.0 / (k + rank)
+            entry[2][list_index] = rank
+    return sorted((tuple(entry) for entry in fused.values()), key=lambda entry: entry[1], reverse=True)
+
+
+class HybridRetriever:
+    """
+    Runs the dense search and, when a lexical index is given, the BM25 search of a question,
+    each with its own candidate budget, and fuses both rankings.
+
+    Each retriever has a relevance floor applied before fusion: dense hits need a cosine
+    score of at least the question's threshold and keyword hits a BM25 score of at least
+    `lexical_min_score`. A question none of whose hits clear their floor has no results,
+    so callers can answer that nothing relevant was found.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        lexical_index=None,
+        dense_candidates: int = 20,
+        lexical_candidates: int = 20,
+        result_limit: int = 20,
+        rrf_k: int = 60,
+        lexical_min_score: float = 0.0
+    ):
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.dense_candidates = dense_candidates
+        self.lexical_candidates = lexical_candidates
+        self.result_limit = result_limit
+        self.rrf_k = rrf_k
+        self.lexical_min_score = lexical_min_score
+
+    def retrieve(self, project_id: str, question: str, query_vector: list, threshold: float, search_filter=None) -> tuple:
+        """
+        Returns the fused results and the latency of each retriever in milliseconds.
+        Every result is a dict with the chunk payload, its fused score and the dense
+        cosine score (None when only the keyword search found it). Dense hits below
+        `threshold` and keyword hits below `lexical_min_score` are discarded before
+        fusion, so the results are empty when no hit is relevant. Both retrievers only search the chunks
+        matching the optional `search_filter` (a vector_store.SearchFilter).
+        """
+        started = time.perf_counter()
+        dense_hits = self.vector_store.search(
+            project_id, query_vector, limit=self.dense_candidates, search_filter=search_filter
+        )
+        dense_ms = (time.perf_counter() - started) * 1000
+        return self._combine(project_id, question, dense_hits, threshold, search_filter, {'dense_ms': dense_ms})
+
+    async def retrieve_async(self, project_id: str, question: str, query_vector: list, threshold: float, search_filter=None) -> tuple:
+        """
+        Coroutine version of retrieve(). The dense search awaits the vector store's async
+        search while the keyword search and the fusion, which read the local SQLite index,
+        run in a worker thread.
+        """
+        started = time.perf_counter()
+        dense_hits = await self.vector_store.search_async(
+            project_id, query_vector, limit=self.dense_candidates, search_filter=search_filter
+        )
+        dense_ms = (time.perf_counter() - started) * 1000
+        return await asyncio.to_thread(
+            self._combine, project_id, question, dense_hits, threshold, search_filter, {'dense_ms': dense_ms}
+        )
+
+    def retrieve_batch(self, queries: list) -> list:
+        """
+        Retrieves many questions at once. `queries` holds (project_id, question, query_vector,
+        threshold, search_filter) tuples; the dense searches of each project and filter run
+        as one batched search. Returns one (results, timings) pair per query, in order,
+        where dense_ms is the latency of the batched search the question was part of.
+        """
+        by_search = {}
+        for position, (project_id, _, _, _, search_filter) in enumerate(queries):
+            by_search.setdefault((project_id, search_filter), []).append(position)
+
+        dense = [None] * len(queries)
+        for (project_id, search_filter), positions in by_search.items():
+            started = time.perf_counter()
+            hit_lists = self.vector_store.search_batch(
+                project_id,
+                [queries[position][2] for position in positions],
+                limit=self.dense_candidates,
+                search_filter=search_filter
+            )
+            dense_ms = (time.perf_counter() - started) * 1000
+            for position, hits in zip(positions, hit_lists):
+                dense[position] = (hits, dense_ms)
+
+        return [
+            self._combine(project_id, question, dense[position][0], threshold, search_filter, {'dense_ms': dense[position][1]})
+            for position, (project_id, question, _, threshold, search_filter) in enumerate(queries)
+        ]
+
+    def _combine(self, project_id: str, question: str, dense_hits: list, threshold: float, search_filter, timings: dict) -> tuple:
+        """
+        Runs the keyword search of the question and fuses it with its dense hits.
+        """
+        dense_hits = [hit for hit in dense_hits if hit.score >= threshold]
+
+        lexical_hits = []
+        if self.lexical_index is not None and self.lexical_candidates > 0:
+            started = time.perf_counter()
+            lexical_hits = self.lexical_index.search(
+                project_id, question, limit=self.lexical_candidates, search_filter=search_filter
+            )
+            lexical_hits = [hit for hit in lexical_hits if hit.score >= self.lexical_min_score]
+            timings['lexical_ms'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        fused = reciprocal_rank_fusion([dense_hits, lexical_hits], k=self.rrf_k)[:self.result_limit]
+        dense_scores = {str(hit.id): hit.score for hit in dense_hits}
+        results = [
+            {
+                "score": dense_scores.get(str(hit.id)),
+                "fused_score": fused_score,
+                "dense_rank": ranks[0],
+                "lexical_rank": ranks[1],
+                "chunk": hit.payload
+            }
+            for hit, fused_score, ranks in fused
+        ]
+        timings['fusion_ms'] = (time.perf_counter() - started) * 1000
+        return results, timings
@@ -0,0 +1,122 @@
+"""
+startup.py
+
+Lazy initialization of the app's heavy components and startup reporting.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import nltk
+
+logger = logging.getLogger(__name__)
+
+# Marks a Lazy whose object is not created yet
+_UNSET = object()
+
+
+class Lazy:
+    """
+    Creates an object with `factory` the first time it is used, exactly once even when
+    several threads ask for it at the same time. Attribute access and calls are forwarded
+    to the object, so a Lazy can stand in for it, e.g. `model.encode(...)`.
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the object, creating it on the first call.
+        """
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    started = time.perf_counter()
+                    self._value = self._factory()
+                    logger.info(f"Loaded the {self._name} in {time.perf_counter() - started:.2f}s")
+                value = self._value
+        return value
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not _UNSET
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+
+def ensure_nltk_data(resources: tuple, data_dir: str = None, download: bool = True):
+    """
+    Makes sure the NLTK data is installed. Tokenizers are named alone ('punkt'), other
+    resources by their path ('corpora/stopwords'). The local copies are looked up first,
+    so a host with the data bundled (see the Dockerfile) or already downloaded never goes
+    to the network. Missing resources are downloaded into `data_dir` when `download` is
+    set; a RuntimeError names the ones that are still missing.
+    """
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        if data_dir not in nltk.data.path:
+            nltk.data.path.insert(0, data_dir)
+
+    def missing_resources() -> list:
+        missing = []
+        for resource in resources:
+            try:
+                nltk.data.find(resource if '/' in resource else f'tokenizers/{resource}')
+            except LookupError:
+                missing.append(resource)
+        return missing
+
+    missing = missing_resources()
+    if missing and download:
+        for resource in missing:
+            logger.info(f"Downloading the NLTK '{resource}' data")
+            nltk.download(resource.rsplit('/', 1)[-1], download_dir=data_dir, quiet=True)
+        missing = missing_resources()
+    if missing:
+        raise RuntimeError(
+            f"NLTK data {missing} not found in {nltk.data.path}. Install it with "
+            f"`python -m nltk.downloader {' '.join(resource.rsplit('/', 1)[-1] for resource in missing)}` "
+            f"or enable NLTK_DOWNLOAD in config.py"
+        )
+
+
+def memory_usage() -> dict:
+    """
+    Returns the resident (RSS) and proportional (PSS) memory of this process in MB. PSS
+    splits the pages shared with other processes between them, so it shows how much of
+    a forked worker's model is shared with its siblings. Values the platform does not
+    report are None.
+    """
+    usage = {"rss_mb": None, "pss_mb": None}
+    for path, key, field in (('/proc/self/status', 'rss_mb', 'VmRSS:'), ('/proc/self/smaps_rollup', 'pss_mb', 'Pss:')):
+        try:
+            with open(path) as source:
+                for line in source:
+                    if line.startswith(field):
+                        usage[key] = int(line.split()[1]) / 1024
+                        break
+        except OSError:
+            pass
+    return usage
+
+
+def log_startup(label: str, started: float):
+    """
+    Logs the time since `started` (a time.perf_counter() value) and the memory of the process.
+    """
+    usage = memory_usage()
+    memory = ", ".join(
+        f"{name} {usage[key]:.0f} MB" for name, key in (('RSS', 'rss_mb'), ('PSS', 'pss_mb')) if usage[key] is not None
+    )
+    logger.info(f"{label} in {time.perf_counter() - started:.2f}s (pid {os.getpid()}{', ' + memory if memory else ''})")
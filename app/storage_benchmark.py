@@ -0,0 +1,147 @@
+"""
+storage_benchmark.py
+
+Measures the memory saved and the recall lost by each storage profile on a sample of a project's vectors.
+
+Every profile is loaded into a temporary collection with the sampled vectors, and its
+search results are compared with an exact search over the original float32 vectors.
+
+Usage:
+    python storage_benchmark.py <project_id> [--profiles int8 binary] [--points 20000] [--queries 100] [--k 10]
+"""
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+import qdrant_client
+from qdrant_client.http.models import OptimizersConfigDiff, SearchParams, QuantizationSearchParams
+
+import config
+from qdrant_manager import QdrantManager
+
+
+class _Dimension:
+    """
+    Stands in for the embedding model, which QdrantManager only asks for the vector size.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.size
+
+
+def sample_vectors(client, project_id: str, count: int) -> np.ndarray:
+    """
+    Reads up to `count` vectors of the collection.
+    """
+    vectors = []
+    offset = None
+    while len(vectors) < count:
+        points, offset = client.scroll(
+            collection_name=project_id,
+            limit=min(1000, count - len(vectors)),
+            offset=offset,
+            with_payload=False,
+            with_vectors=True
+        )
+        vectors.extend(point.vector for point in points)
+        if offset is None:
+            break
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def ram_bytes(profile: dict, points: int, dimension: int) -> int:
+    """
+    Estimates the RAM used by the vectors of a collection stored with the given profile.
+    """
+    total = 0 if profile.get('vectors_on_disk') else points * dimension * 4
+    if profile.get('quantization_always_ram', True):
+        if profile.get('quantization') == 'scalar':
+            total += points * dimension
+        elif profile.get('quantization') == 'binary':
+            total += points * math.ceil(dimension / 8)
+    return total
+
+
+def wait_until_indexed(client, collection_name: str, points: int, timeout: float = 600):
+    """
+    Waits for Qdrant to build the index and quantized vectors of the temporary collection.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(collection_name)
+        if info.status == 'green' and (info.indexed_vectors_count or 0) >= points:
+            return
+        time.sleep(1)
+    raise TimeoutError(f"Collection '{collection_name}' was not indexed within {timeout} seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the storage profiles on a project's vectors.")
+    parser.add_argument('project_id')
+    parser.add_argument('--profiles', nargs='+', default=list(config.STORAGE_PROFILES))
+    parser.add_argument('--points', type=int, default=20000, help="Vectors loaded into each temporary collection")
+    parser.add_argument('--queries', type=int, default=100, help="Held-out vectors used as queries")
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    client = qdrant_client.QdrantClient(config.DB_ADDR+":"+str(config.DB_PORT))
+    total_points = client.count(args.project_id, exact=True).count
+
+    vectors = sample_vectors(client, args.project_id, args.points + args.queries)
+    if len(vectors) <= args.queries:
+        parser.error(f"'{args.project_id}' holds only {len(vectors)} vectors")
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+    dimension = corpus.shape[1]
+
+    # Exact cosine neighbours on the original vectors
+    normalized = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    normalized_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-normalized_queries @ normalized.T, axis=1)[:, :args.k]
+
+    manager = QdrantManager(client, _Dimension(dimension), storage_profiles=config.STORAGE_PROFILES)
+    full_ram = ram_bytes({}, total_points, dimension)
+    report = {"project_id": args.project_id, "points": total_points, "sampled": len(corpus), "k": args.k, "profiles": {}}
+
+    for name in args.profiles:
+        collection_name = f"{args.project_id}__bench_{name}"
+        try:
+            manager.create_collection(collection_name, name)
+            client.update_collection(collection_name, optimizers_config=OptimizersConfigDiff(indexing_threshold=1))
+            manager.upsert_points(collection_name, [
+                {"id": i, "vector": vector.tolist(), "payload": {}} for i, vector in enumerate(corpus)
+            ])
+            wait_until_indexed(client, collection_name, len(corpus))
+
+            result = {}
+            for rescore in (True, False):
+                params = SearchParams(quantization=QuantizationSearchParams(
+                    rescore=rescore, oversampling=config.SEARCH_OVERSAMPLING
+                ))
+                found = 0
+                started = time.perf_counter()
+                for query, expected in zip(queries, truth):
+                    hits = client.search(collection_name, query_vector=query.tolist(), limit=args.k, search_params=params)
+                    found += len({hit.id for hit in hits} & set(expected.tolist()))
+                elapsed = time.perf_counter() - started
+                key = 'rescored' if rescore else 'not_rescored'
+                result[f"recall_{key}"] = found / (len(queries) * args.k)
+                result[f"latency_ms_{key}"] = elapsed / len(queries) * 1000
+
+            profile_ram = ram_bytes(config.STORAGE_PROFILES[name], total_points, dimension)
+            result["vector_ram_mb"] = profile_ram / 2**20
+            result["ram_saved"] = 1 - profile_ram / full_ram if full_ram else 0.0
+            report["profiles"][name] = result
+        finally:
+            client.delete_collection(collection_name)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
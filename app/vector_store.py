@@ -0,0 +1,123 @@
+"""
+vector_store.py
+
+Defines the interface shared by the vector-store backends.
+"""
+
+import asyncio
+from collections import namedtuple
+
+# Mirrors the attributes of Qdrant's CollectionDescription and ScoredPoint used by the app
+Collection = namedtuple('Collection', ['name'])
+SearchHit = namedtuple('SearchHit', ['id', 'score', 'payload'])
+# Restricts a search to the chunks of some documents and/or pages. Each field left to None
+# does not restrict the search; the page range includes both bounds
+SearchFilter = namedtuple('SearchFilter', ['pdf_names', 'min_page', 'max_page'], defaults=(None, None, None))
+
+
+class VectorStore:
+    """
+    Base class of the vector-store backends. Every project is stored as a collection of
+    points, each point being a dict with an "id", a "vector" and a "payload".
+    """
+
+    # Batches handed to on_batch() are durable, so ingestion jobs can checkpoint them.
+    # Backends that only persist on flush() set it to False
+    writes_through = True
+
+    def ensure_collection_exists(self, project_id: str, storage_profile: str = None):
+        """
+        Creates the project's collection if it does not exist yet.
+        """
+        raise NotImplementedError
+
+    def create_collection(self, project_id: str, storage_profile: str = None):
+        """
+        Creates a new collection for the given project_id. `storage_profile` names one of
+        config.STORAGE_PROFILES; backends that do not support profiles ignore it.
+        """
+        raise NotImplementedError
+
+    def delete_collection(self, project_id: str):
+        """
+        Deletes the project's collection.
+        """
+        raise NotImplementedError
+
+    def get_collections(self) -> list:
+        """
+        Returns the existing collections, each with a `name` attribute.
+        """
+        raise NotImplementedError
+
+    def retained_vector_size(self, project_id: str) -> int:
+        """
+        Returns the vector size the project's points must keep after delete_collection(),
+        or None when deleting the collection lets it be created again with any size.
+        """
+        return None
+
+    def replace_collection(self, project_id: str, staging_id: str, storage_profile: str = None):
+        """
+        Replaces every point of the project with the points of the staging project, which
+        is deleted. Used to swap in a project built aside, so a failed build leaves the
+        project as it was.
+        """
+        raise NotImplementedError
+
+    def upsert_points(self, project_id: str, points: list, batch_size: int = None, on_batch=None):
+        """
+        Inserts or replaces the given points. When given, `on_batch(batch)` is called with
+        each batch of points once it is stored.
+        """
+        raise NotImplementedError
+
+    def delete_points(self, project_id: str, point_ids: list):
+        """
+        Deletes the points with the given IDs.
+        """
+        raise NotImplementedError
+
+    def delete_document(self, project_id: str, pdf_name: str):
+        """
+        Deletes every point of the given document.
+        """
+        raise NotImplementedError
+
+    def iter_points(self, project_id: str, batch_size: int = 1000):
+        """
+        Yields every stored point of the project as a dict with "id" and "payload".
+        """
+        raise NotImplementedError
+
+    def search(self, project_id: str, query_vector: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Returns up to `limit` hits by descending cosine similarity, each with `id`,
+        `score` and `payload` attributes. A `search_filter` is applied by the search
+        itself, so the `limit` hits all match it.
+        """
+        raise NotImplementedError
+
+    async def search_async(self, project_id: str, query_vector: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Coroutine version of search() for the async query server. Backends without an
+        async client run search() in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.search, project_id, query_vector, limit=limit, search_filter=search_filter
+        )
+
+    def search_batch(self, project_id: str, query_vectors: list, limit: int = 20, search_filter: SearchFilter = None) -> list:
+        """
+        Runs several searches in the same project and returns one hit list per query vector.
+        Backends override this to answer all the queries in a single request.
+        """
+        return [
+            self.search(project_id, query_vector, limit=limit, search_filter=search_filter)
+            for query_vector in query_vectors
+        ]
+
+    def flush(self, project_id: str):
+        """
+        Persists pending writes. Backends that write through can keep this no-op.
+        """
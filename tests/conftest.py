@@ -0,0 +1,235 @@
+"""
+Shared fixtures of the test suite.
+
+The app is imported fresh for every test that uses it, in its own temporary working
+directory, with a small deterministic embedding model and a canned LLM in place of the
+sentence transformer and OpenAI. Qdrant runs in process (QdrantClient(":memory:")).
+"""
+
+import hashlib
+import importlib
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+sys.path.insert(0, APP_DIR)
+
+DIMENSION = 32
+
+
+class FakeTokenizer:
+    """
+    Counts whitespace-separated words as tokens.
+    """
+
+    def num_special_tokens_to_add(self, pair: bool = False) -> int:
+        return 2
+
+    def __call__(self, sentences: list, add_special_tokens: bool = False) -> dict:
+        return {'input_ids': [sentence.split() for sentence in sentences]}
+
+
+class FakeEmbeddingModel:
+    """
+    Embeds a text as the normalized sum of random vectors seeded by its words, so texts
+    sharing words are close. Records how many texts it encoded.
+    """
+
+    max_seq_length = 256
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self.encoded = 0
+        self.tokenizer = FakeTokenizer()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(word.lower().encode('utf-8')).digest()[:4], 'little')
+        return np.random.default_rng(seed).standard_normal(self.dimension)
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        self.encoded += len(sentences)
+        vectors = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for word in sentence.split():
+                vectors[row] += self._word_vector(word.strip('.,?!'))
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+class FakeCompletions:
+    """
+    Answers every prompt with the same text, like the OpenAI chat completions API.
+    """
+
+    answer = "The answer, from ('manual', page 1, chunk 0)."
+
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model: str, messages: list, stream: bool = False):
+        self.calls += 1
+        if stream:
+            return iter([
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                for piece in (self.answer[:10], self.answer[10:])
+            ])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.answer))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10)
+        )
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path: str, pages: list):
+    """
+    Writes a PDF with one page per list of text lines, in Helvetica.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        text = "BT /F1 11 Tf 14 TL 50 780 Td " + " ".join(f"({_escape(line)}) '" for line in lines) + " ET"
+        content = text.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        data += b"%010d 00000 n \n" % offset
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as target:
+        target.write(bytes(data))
+
+
+# Three pages about different subjects, so questions find their page
+MANUAL_PAGES = [
+    [
+        "The pump must be serviced every six months by a certified technician.",
+        "Service intervals are shorter in dusty environments.",
+        "The technician records every service in the maintenance log.",
+    ],
+    [
+        "Error code E-042 means the pressure sensor is disconnected.",
+        "Check the sensor cable before replacing the sensor.",
+        "The controller retries the sensor three times before it stops the pump.",
+    ],
+    [
+        "Safety gloves and goggles are required when the housing is open.",
+        "Never open the housing while the pump is running.",
+        "Disconnect the power supply before any maintenance work.",
+    ],
+]
+
+
+@pytest.fixture
+def manual_pdf(tmp_path):
+    path = str(tmp_path / 'manual.pdf')
+    write_pdf(path, MANUAL_PAGES)
+    return path
+
+
+def import_app(work_dir: str, monkeypatch, settings: dict = None):
+    """
+    Imports a fresh copy of the app in `work_dir` with the given config values.
+    """
+    import config
+
+    monkeypatch.chdir(work_dir)
+    overrides = {
+        'INGESTION_BATCH_SIZE': 2,
+        'INGESTION_WORKERS': 1,
+        'STARTUP_PRELOAD': False,
+        'PROJECT_REGISTRY_TTL_SECONDS': 0,
+        # The tests never download NLTK data, keyword queries keep their stopwords without it
+        'NLTK_DOWNLOAD': False,
+        **(settings or {}),
+    }
+    for name, value in overrides.items():
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    app = importlib.import_module('app')
+
+    # The model and clients are created on first use, from the factories patched here
+    model = FakeEmbeddingModel()
+    monkeypatch.setattr(app, 'load_embedding_model', lambda *args, **kwargs: model)
+    if config.VECTOR_STORE == 'qdrant':
+        import qdrant_client
+        client = qdrant_client.QdrantClient(':memory:')
+        monkeypatch.setattr(app, 'qdrant_client', SimpleNamespace(QdrantClient=lambda *args, **kwargs: client))
+    completions = FakeCompletions()
+    monkeypatch.setattr(app, 'open_ai_client', SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    app.app.config['TESTING'] = True
+    return SimpleNamespace(module=app, model=model, completions=completions, client=app.app.test_client())
+
+
+BACKENDS = {
+    'qdrant': {'VECTOR_STORE': 'qdrant', 'QDRANT_LAYOUT': 'collections'},
+    'qdrant-shared': {'VECTOR_STORE': 'qdrant', 'QDRANT_LAYOUT': 'shared'},
+    'faiss': {'VECTOR_STORE': 'faiss'},
+}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request, tmp_path, monkeypatch):
+    """
+    The app on each vector-store backend, with its test client.
+    """
+    yield import_app(str(tmp_path), monkeypatch, BACKENDS[request.param])
+    sys.modules.pop('app', None)
+
+
+def wait_for_job(client, job_id: str, timeout: float = 30) -> dict:
+    """
+    Polls a job until it is done or failed and returns it.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def upload(client, project_id: str, pdf_path: str, file_name: str = 'manual.pdf', **fields) -> dict:
+    """
+    Uploads a PDF and waits for its ingestion job.
+    """
+    with open(pdf_path, 'rb') as source:
+        response = client.post('/upload_pdf', data={
+            'project_id': project_id,
+            'file': (source, file_name),
+            **fields
+        }, content_type='multipart/form-data')
+    assert response.status_code == 202, response.get_json()
+    return wait_for_job(client, response.get_json()['job_id'])
@@ -0,0 +1,58 @@
+"""
+Tests of the answer cache.
+"""
+
+import numpy as np
+
+from answer_cache import AnswerCache, chunk_signature
+
+
+def test_near_duplicate_questions_with_the_same_chunks_hit():
+    cache = AnswerCache(max_distance=0.05)
+    signature = chunk_signature([{'chunk': {'pdf_name': 'Manual', 'page': 1, 'chunk_id': 0}}])
+    question = np.array([1.0, 0.0, 0.0])
+
+    cache.put('manuals', question, signature, 'Every six months.')
+
+    assert cache.get('manuals', question + np.array([0.0, 0.01, 0.0]), signature) == 'Every six months.'
+    assert cache.get('manuals', np.array([0.0, 1.0, 0.0]), signature) is None
+    assert cache.get('manuals', question, frozenset({('Manual', 2, 0)})) is None
+    assert cache.get('reports', question, signature) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 3
+
+
+def test_expired_evicted_and_invalidated_entries_are_dropped():
+    signature = frozenset({('Manual', 1, 0)})
+    first, second = np.array([1.0, 0.0]), np.array([0.0, 1.0])
+
+    cache = AnswerCache(max_entries=1)
+    cache.put('manuals', first, signature, 'first')
+    cache.put('manuals', second, signature, 'second')
+    assert cache.get('manuals', first, signature) is None
+    assert cache.get('manuals', second, signature) == 'second'
+
+    cache.invalidate_project('manuals')
+    assert cache.get('manuals', second, signature) is None
+
+    cache = AnswerCache(ttl_seconds=-1)
+    cache.put('manuals', first, signature, 'first')
+    assert cache.get('manuals', first, signature) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_answer_cache_invalidation_reaches_other_processes(tmp_path):
+    db_path = str(tmp_path / 'answers.db')
+    worker, other_worker = AnswerCache(db_path=db_path), AnswerCache(db_path=db_path)
+    signature = frozenset({('Manual', 1, 0)})
+    question = np.array([1.0, 0.0, 0.0])
+
+    worker.put('manuals', question, signature, 'Every six months.')
+    worker.put('reports', question, signature, 'In the annual report.')
+    assert worker.get('manuals', question + 0.001, signature) == 'Every six months.'
+
+    other_worker.invalidate_project('manuals')
+    assert worker.get('manuals', question, signature) is None
+    assert worker.get('reports', question, signature) == 'In the annual report.'
+
+    worker.put('manuals', question, signature, 'Every three months.')
+    assert worker.get('manuals', question, signature) == 'Every three months.'
@@ -0,0 +1,143 @@
+"""
+Tests of the asyncio query server on the FAISS backend.
+"""
+
+import asyncio
+import importlib
+import json
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from conftest import BACKENDS, FakeCompletions, import_app, upload
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    """
+    The canned LLM behind the AsyncOpenAI interface.
+    """
+
+    async def create(self, model: str, messages: list, stream: bool = False):
+        response = super().create(model, messages, stream=stream)
+        if not stream:
+            return response
+        return FakeAsyncStream(list(response))
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks: list):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch, manual_pdf):
+    backend = import_app(str(tmp_path), monkeypatch, BACKENDS['faiss'])
+    backend.client.post('/add_project', data={'project_id': 'manuals'})
+    upload(backend.client, 'manuals', manual_pdf)
+    # The service creates its AsyncOpenAI client at startup, replaced right after
+    monkeypatch.setattr(backend.module, 'OPEN_AI_API_KEY', 'test')
+    monkeypatch.delitem(sys.modules, 'async_server', raising=False)
+    async_server = importlib.import_module('async_server')
+    yield backend, async_server
+    sys.modules.pop('async_server', None)
+    sys.modules.pop('app', None)
+
+
+def run_with_client(async_server, test):
+    """
+    Serves the async app on a local port and runs `test(client, completions)` against it.
+    """
+    async def main():
+        application = async_server.make_app()
+        completions = FakeAsyncCompletions()
+
+        async def fake_llm(application):
+            application['service'].llm_client = SimpleNamespace(
+                chat=SimpleNamespace(completions=completions), close=lambda: asyncio.sleep(0)
+            )
+
+        application.on_startup.append(fake_llm)
+        async with TestClient(TestServer(application)) as client:
+            return await test(client, completions)
+
+    return asyncio.run(main())
+
+
+def test_questions_are_answered_and_cached(served, monkeypatch):
+    backend, async_server = served
+    # The answer cache reads SQLite, which must not block the event loop
+    cache = backend.module.answer_cache
+    generation = cache._generation
+    threads = []
+    monkeypatch.setattr(cache, '_generation', lambda project_id: threads.append(threading.current_thread()) or generation(project_id))
+
+    async def test(client, completions):
+        question = {'project_id': 'manuals', 'question': 'What does error code E-042 mean?', 'threshold': 0.0}
+        first = await client.post('/query', json=question)
+        assert first.status == 200
+        body = await first.json()
+        assert body['answer'] == completions.answer
+        assert any('E-042' in result['chunk']['text'] for result in body['results'])
+
+        again = await (await client.post('/query', json=question)).json()
+        assert again['answer'] == completions.answer
+        assert completions.calls == 1
+
+        assert (await client.post('/query', json={'question': 'E-042?'})).status == 400
+        exposition = await (await client.get('/metrics')).text()
+        assert 'pdf_queries_total{route="async",outcome="cached"} 1' in exposition
+
+    run_with_client(async_server, test)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_answers_are_streamed(served):
+    _, async_server = served
+
+    async def test(client, completions):
+        response = await client.post('/query_stream', data={
+            'project_id': 'manuals', 'question': 'Which gloves are required?', 'threshold': '0.0'
+        })
+        events = [
+            (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in (await response.text()).strip().split('\n\n')
+        ]
+        assert [name for name, _ in events] == ['sources', 'token', 'token', 'done']
+        assert ''.join(data['text'] for name, data in events if name == 'token') == completions.answer
+
+    run_with_client(async_server, test)
+
+
+def test_slow_stages_time_out(served, monkeypatch):
+    _, async_server = served
+    monkeypatch.setitem(async_server.config.ASYNC_STAGE_TIMEOUTS, 'llm', 0.05)
+
+    async def test(client, completions):
+        create = completions.create
+
+        async def slow_create(*args, **kwargs):
+            await asyncio.sleep(1)
+            return await create(*args, **kwargs)
+
+        completions.create = slow_create
+        response = await client.post('/query', json={
+            'project_id': 'manuals', 'question': 'How often is the pump serviced?', 'threshold': 0.0
+        })
+        assert response.status == 504
+
+    run_with_client(async_server, test)
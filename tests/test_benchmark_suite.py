@@ -0,0 +1,49 @@
+"""
+Tests of the benchmark report comparison.
+"""
+
+import importlib
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def benchmark_suite(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', SimpleNamespace(SentenceTransformer=None))
+    monkeypatch.delitem(sys.modules, 'embedding_backends', raising=False)
+    monkeypatch.delitem(sys.modules, 'benchmark_suite', raising=False)
+    yield importlib.import_module('benchmark_suite')
+    sys.modules.pop('benchmark_suite', None)
+    sys.modules.pop('embedding_backends', None)
+
+
+def test_regressions_depend_on_the_direction_of_each_metric(benchmark_suite):
+    baseline = {
+        'ingestion': {'pages_per_second': 100.0, 'peak_rss_mb': 500},
+        'query': {'total_ms': {'p95': 40.0}},
+        'commit': 'abc',
+        'settings': {'fast': True},
+    }
+    current = {
+        'ingestion': {'pages_per_second': 90.0, 'peak_rss_mb': 510},
+        'query': {'total_ms': {'p95': 50.0}},
+        'commit': 'def',
+        'settings': {'fast': True},
+    }
+
+    comparison = benchmark_suite.compare(current, baseline)
+
+    assert set(comparison) == {'ingestion.pages_per_second', 'ingestion.peak_rss_mb', 'query.total_ms.p95'}
+    assert comparison['ingestion.pages_per_second']['regression']
+    assert not comparison['ingestion.peak_rss_mb']['regression']
+    assert comparison['query.total_ms.p95']['change'] == pytest.approx(0.25)
+    assert comparison['query.total_ms.p95']['regression']
+
+
+def test_percentiles(benchmark_suite):
+    stats = benchmark_suite.percentiles(list(range(1, 101)))
+    assert stats['p50'] == pytest.approx(50.5)
+    assert stats['mean'] == pytest.approx(50.5)
+    assert benchmark_suite.percentiles([]) == {}
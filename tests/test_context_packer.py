@@ -0,0 +1,72 @@
+"""
+Tests of the prompt context packer.
+"""
+
+from types import SimpleNamespace
+
+import context_packer
+from context_packer import estimate_tokens, pack_context, pack_prompt, strip_overlap
+
+
+def chunk(page, chunk_id, text, pdf_name='manual'):
+    return {'pdf_name': pdf_name, 'page': page, 'chunk_id': chunk_id, 'text': text}
+
+
+def test_the_shared_overlap_sentence_is_kept_once():
+    first = 'The pump starts. The valve opens.'
+    second = 'The valve opens. The tank fills.'
+
+    assert strip_overlap(first, second, 1) == 'The tank fills.'
+    assert strip_overlap(first, 'Unrelated text.', 1) == 'Unrelated text.'
+
+
+def test_consecutive_chunks_are_merged_in_reading_order():
+    ranked = [
+        chunk(1, 1, 'The valve opens. The tank fills.'),
+        chunk(3, 0, 'Wear safety gloves.'),
+        chunk(1, 0, 'The pump starts. The valve opens.'),
+        chunk(1, 1, 'The valve opens. The tank fills.'),
+    ]
+
+    packed = pack_context(ranked, token_budget=1000)
+
+    assert [(c['page'], c['chunk_id']) for c in packed] == [(1, 0), (1, 1), (3, 0)]
+    assert packed[1]['text'] == 'The tank fills.'
+
+
+def test_chunks_beyond_the_budget_are_left_out():
+    ranked = [chunk(page, 0, 'word ' * 40) for page in range(1, 6)]
+    per_chunk = estimate_tokens("--- (PDF 'manual', page 1, chunk 0) ---\n" + 'word ' * 40 + "\n\n")
+
+    packed = pack_context(ranked, token_budget=per_chunk * 2)
+
+    assert [c['page'] for c in packed] == [1, 2]
+
+
+def test_a_chunk_that_does_not_fit_is_skipped():
+    ranked = [chunk(1, 0, 'word ' * 40), chunk(2, 0, 'word ' * 400), chunk(3, 0, 'word ' * 40)]
+    per_chunk = estimate_tokens("--- (PDF 'manual', page 1, chunk 0) ---\n" + 'word ' * 40 + "\n\n")
+
+    packed = pack_context(ranked, token_budget=per_chunk * 2)
+
+    assert [c['page'] for c in packed] == [1, 3]
+
+
+def test_tokens_are_counted_with_the_model_tokenizer(monkeypatch):
+    encoding = SimpleNamespace(encode=lambda text, **kwargs: text.split())
+    monkeypatch.setattr(context_packer, '_encoding', lambda model: encoding if model == 'gpt' else None)
+
+    assert estimate_tokens('three word text', 'gpt') == 3
+    # Without a tokenizer, non-ASCII text is counted a token per character
+    assert estimate_tokens('abcdefgh', 'other') == 2
+    assert estimate_tokens('שלום עולם') == 9
+
+
+def test_the_prompt_cites_every_packed_chunk():
+    prompt = pack_prompt('What is E-042?', [chunk(2, 0, 'Error code E-042 means the filter is blocked.')], 1000)
+
+    assert prompt == (
+        "Excerpts:\n--- (PDF 'manual', page 2, chunk 0) ---\n"
+        "Error code E-042 means the filter is blocked.\n\n"
+        "User question: What is E-042?\n\n"
+    )
@@ -0,0 +1,36 @@
+"""
+Tests of the document registry and the content-addressed point IDs.
+"""
+
+from document_registry import DocumentRegistry, chunk_key, file_content_hash, point_id
+
+CHUNK = {"pdf_name": "Manual", "page": 2, "chunk_id": 0, "text": "Error code E-042 means the sensor is disconnected."}
+
+
+def test_point_ids_are_derived_from_the_content():
+    assert point_id('hash', CHUNK) == point_id('hash', dict(CHUNK))
+    assert point_id('hash', CHUNK) != point_id('other hash', CHUNK)
+    assert point_id('hash', CHUNK) != point_id('hash', {**CHUNK, 'text': 'Another text.'})
+    assert point_id('hash', CHUNK) != point_id('hash', {**CHUNK, 'pdf_name': 'Another name'})
+    assert chunk_key(CHUNK) != chunk_key({**CHUNK, 'page': 3})
+
+
+def test_file_content_hash(tmp_path):
+    path = tmp_path / 'manual.pdf'
+    path.write_bytes(b'%PDF-1.4 manual')
+    assert file_content_hash(str(path)) == file_content_hash(str(path), block_size=3)
+
+
+def test_saving_a_revision_replaces_the_previous_one(tmp_path):
+    registry = DocumentRegistry(str(tmp_path / 'documents.db'))
+    assert registry.get_content_hash('manuals', 'Manual') is None
+
+    registry.save_document('manuals', 'Manual', 'first', {'a': '1', 'b': '2'})
+    registry.save_document('manuals', 'Manual', 'second', {'b': '2', 'c': '3'})
+    registry.save_document('reports', 'Manual', 'other', {'d': '4'})
+    assert registry.get_content_hash('manuals', 'Manual') == 'second'
+    assert registry.get_chunk_points('manuals', 'Manual') == {'b': '2', 'c': '3'}
+
+    registry.delete_project('manuals')
+    assert registry.get_content_hash('manuals', 'Manual') is None
+    assert registry.get_chunk_points('reports', 'Manual') == {'d': '4'}
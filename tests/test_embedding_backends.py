@@ -0,0 +1,52 @@
+"""
+Tests of the embedding backend selection.
+"""
+
+import importlib
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import FakeEmbeddingModel
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    loaded = []
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', SimpleNamespace(
+        SentenceTransformer=lambda *args, **kwargs: loaded.append((args, kwargs)) or SimpleNamespace(),
+        export_dynamic_quantized_onnx_model=None
+    ))
+    monkeypatch.delitem(sys.modules, 'embedding_backends', raising=False)
+    module = importlib.import_module('embedding_backends')
+    module.loaded = loaded
+    yield module
+    sys.modules.pop('embedding_backends', None)
+
+
+def test_cached_embeddings_are_keyed_by_backend(backends):
+    assert backends.cache_model_name('all-MiniLM-L6-v2') == 'all-MiniLM-L6-v2'
+    assert backends.cache_model_name('all-MiniLM-L6-v2', 'onnx') == 'all-MiniLM-L6-v2@onnx'
+    assert backends.cache_model_name('all-MiniLM-L6-v2', 'onnx', 'avx2') == 'all-MiniLM-L6-v2@onnx-qint8-avx2'
+    # Quantization only applies to the ONNX backend
+    assert backends.backend_id('torch', 'avx2') == 'torch'
+    assert backends.onnx_file_name('avx512') == 'onnx/model_qint8_avx512.onnx'
+
+
+def test_the_torch_backend_loads_the_plain_model(backends):
+    backends.load_embedding_model('all-MiniLM-L6-v2')
+    assert backends.loaded == [(('all-MiniLM-L6-v2',), {})]
+
+
+def test_unknown_backends_and_quantization_targets_are_rejected(backends, tmp_path):
+    with pytest.raises(ValueError, match='Unknown embedding backend'):
+        backends.load_embedding_model('all-MiniLM-L6-v2', backend='tensorrt')
+    with pytest.raises(ValueError, match='Unknown quantization target'):
+        backends.export_onnx_model('all-MiniLM-L6-v2', str(tmp_path), quantization='sse4')
+
+
+def test_token_budget_leaves_room_for_the_special_tokens(backends):
+    model = FakeEmbeddingModel()
+    assert backends.token_budget(model) == model.max_seq_length - 2
+    assert backends.token_counter(model)(['a b c', 'd']) == [3, 1]
@@ -0,0 +1,67 @@
+"""
+Tests of the micro-batching query encoder.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from conftest import FakeEmbeddingModel
+from embedding_batcher import EmbeddingBatcher
+
+
+class BlockingModel(FakeEmbeddingModel):
+    """
+    Holds its first encode until released, so the next texts queue up behind it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.batch_sizes = []
+
+    def encode(self, sentences, **kwargs):
+        if not self.batch_sizes:
+            self.started.set()
+            assert self.release.wait(5)
+        self.batch_sizes.append(len(sentences))
+        return super().encode(sentences, **kwargs)
+
+
+def test_concurrent_texts_are_encoded_together():
+    model = BlockingModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=50, max_batch_size=8)
+    first = batcher.submit('first question')
+    assert model.started.wait(5)
+    futures = [batcher.submit(f'question {index}') for index in range(10)]
+    model.release.set()
+
+    assert np.allclose(first.result(5), FakeEmbeddingModel().encode(['first question'])[0])
+    for index, future in enumerate(futures):
+        assert np.allclose(future.result(5), FakeEmbeddingModel().encode([f'question {index}'])[0])
+    assert model.batch_sizes == [1, 8, 2]
+    assert batcher.stats()['items'] == 11
+
+
+def test_encode_one_from_many_threads():
+    model = FakeEmbeddingModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=20, max_batch_size=64)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        vectors = list(executor.map(lambda index: batcher.encode_one(f'question {index}', timeout=5), range(32)))
+    assert all(vector.shape == (model.dimension,) for vector in vectors)
+    assert batcher.stats()['batches'] < 32
+
+
+def test_an_encoding_error_reaches_every_caller():
+    class FailingModel(FakeEmbeddingModel):
+        def encode(self, sentences, **kwargs):
+            raise RuntimeError("out of memory")
+
+    batcher = EmbeddingBatcher(FailingModel(), max_wait_ms=20)
+    futures = [batcher.submit(f'question {index}') for index in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
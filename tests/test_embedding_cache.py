@@ -0,0 +1,102 @@
+"""
+Tests of the persistent embedding cache.
+"""
+
+import os
+
+import numpy as np
+
+from conftest import FakeEmbeddingModel
+from embedding_cache import CachedEncoder, EmbeddingCache
+
+
+def test_only_missing_texts_are_encoded(tmp_path):
+    model = FakeEmbeddingModel()
+    encoder = CachedEncoder(model, EmbeddingCache(str(tmp_path / 'embeddings.db'), 'model', 1024 * 1024))
+
+    first = encoder.encode(['pump service', 'sensor error'])
+    second = encoder.encode(['sensor error', 'safety gloves', 'safety gloves'])
+    assert model.encoded == 3
+    assert np.array_equal(second[0], first[1])
+    assert np.array_equal(second[1], second[2])
+    assert encoder.cache.stats()['hits'] == 1
+    assert encoder.get_sentence_embedding_dimension() == model.dimension
+
+
+def test_cache_outlives_the_process_and_is_keyed_by_model(tmp_path):
+    db_path = str(tmp_path / 'embeddings.db')
+    model = FakeEmbeddingModel()
+    CachedEncoder(model, EmbeddingCache(db_path, 'model', 1024 * 1024)).encode(['pump service'])
+
+    CachedEncoder(model, EmbeddingCache(db_path, 'model', 1024 * 1024)).encode(['pump service'])
+    assert model.encoded == 1
+    CachedEncoder(model, EmbeddingCache(db_path, 'other model', 1024 * 1024)).encode(['pump service'])
+    assert model.encoded == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    vector = np.ones(1, dtype=np.float32)
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'), 'model', 4 * 1000)
+    for index in range(1000):
+        cache.put_many({cache.key(f'text {index}'): vector})
+    # Used again, so it outlives the entries stored before it
+    cache.get_many([cache.key('text 0')])
+    cache.put_many({cache.key(f'new text {index}'): vector for index in range(100)})
+
+    assert cache.stats()['bytes'] <= 4 * 900
+    assert cache.key('text 0') in cache.get_many([cache.key('text 0')])
+    assert cache.key('text 1') not in cache.get_many([cache.key('text 1')])
+    assert cache.key('text 999') in cache.get_many([cache.key('text 999')])
+
+
+def test_embedding_cache_opens_a_connection_per_process(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'), 'model', 1024 * 1024)
+    cache.put_many({cache.key('parent'): np.ones(4, dtype=np.float32)})
+
+    pid = os.fork()
+    if pid == 0:
+        # The forked worker reads and writes through its own connection
+        try:
+            found = cache.get_many([cache.key('parent')])
+            cache.put_many({cache.key('child'): np.zeros(4, dtype=np.float32)})
+            os._exit(0 if cache._conn_pid == os.getpid() and len(found) == 1 else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    assert cache._conn_pid == os.getpid()
+    found = cache.get_many([cache.key('parent'), cache.key('child')])
+    assert sorted(vector.tolist() for vector in found.values()) == [[0.0] * 4, [1.0] * 4]
+    assert cache.stats()['bytes'] == 32
+
+
+def test_lookups_write_their_recency_with_the_next_put(tmp_path):
+    db_path = str(tmp_path / 'embeddings.db')
+    cache = EmbeddingCache(db_path, 'model', 1024 * 1024)
+    cache.put_many({cache.key('pump service'): np.ones(4, dtype=np.float32)})
+    conn = cache._connection()
+    stored = conn.execute("SELECT last_used FROM embeddings").fetchone()[0]
+
+    changes = conn.total_changes
+    cache.get_many([cache.key('pump service')])
+    assert conn.total_changes == changes
+    assert conn.execute("SELECT last_used FROM embeddings").fetchone()[0] == stored
+
+    cache.put_many({cache.key('sensor error'): np.ones(4, dtype=np.float32)})
+    used = conn.execute(
+        "SELECT last_used FROM embeddings WHERE key = ?", (cache.key('pump service'),)
+    ).fetchone()[0]
+    assert used > stored
+
+
+def test_size_is_a_running_total_shared_by_every_cache_on_the_file(tmp_path):
+    db_path = str(tmp_path / 'embeddings.db')
+    first = EmbeddingCache(db_path, 'model', 1024 * 1024)
+    second = EmbeddingCache(db_path, 'model', 1024 * 1024)
+    first.put_many({first.key('pump service'): np.ones(4, dtype=np.float32)})
+    second.put_many({second.key('pump service'): np.ones(4, dtype=np.float32)})
+    second.put_many({second.key('sensor error'): np.ones(2, dtype=np.float32)})
+
+    assert first.stats()['bytes'] == second.stats()['bytes'] == 24
+    assert EmbeddingCache(db_path, 'model', 1024 * 1024).stats()['bytes'] == 24
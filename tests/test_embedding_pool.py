@@ -0,0 +1,34 @@
+"""
+Tests of the multi-process embedding pool.
+"""
+
+import importlib
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+from conftest import FakeEmbeddingModel
+
+
+def test_slices_are_encoded_by_the_workers_in_order(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', SimpleNamespace(SentenceTransformer=None))
+    monkeypatch.delitem(sys.modules, 'embedding_backends', raising=False)
+    monkeypatch.delitem(sys.modules, 'embedding_pool', raising=False)
+    embedding_pool = importlib.import_module('embedding_pool')
+    # The forked workers inherit the patched loader
+    monkeypatch.setattr(embedding_pool, 'load_embedding_model', lambda *args, **kwargs: FakeEmbeddingModel())
+
+    pool = embedding_pool.EmbeddingPool('fake', workers=2, min_slice_size=3, pin_threads=False)
+    try:
+        sentences = [f"sentence number {i}" for i in range(10)]
+        embeddings = pool.encode(sentences, show_progress_bar=False)
+
+        assert pool.get_sentence_embedding_dimension() == FakeEmbeddingModel().get_sentence_embedding_dimension()
+        assert embeddings.dtype == np.float32
+        np.testing.assert_allclose(embeddings, FakeEmbeddingModel().encode(sentences), rtol=1e-6)
+        assert pool.encode([]).shape == (0, pool.get_sentence_embedding_dimension())
+    finally:
+        pool.close()
+        sys.modules.pop('embedding_pool', None)
+        sys.modules.pop('embedding_backends', None)
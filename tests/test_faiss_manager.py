@@ -0,0 +1,102 @@
+"""
+Tests of the local FAISS vector store.
+"""
+
+import pytest
+
+from conftest import FakeEmbeddingModel
+from faiss_manager import FaissManager
+from vector_store import SearchFilter
+
+
+def points(texts: list, pdf_name: str = 'Manual') -> list:
+    model = FakeEmbeddingModel()
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{index:012d}",
+            "vector": vector.tolist(),
+            "payload": {"pdf_name": pdf_name, "page": index % 3 + 1, "chunk_id": index, "text": text}
+        }
+        for index, (text, vector) in enumerate(zip(texts, model.encode(texts)))
+    ]
+
+
+TEXTS = [f"chunk {index} about {subject}" for index, subject in enumerate(
+    ['pumps', 'sensors', 'gloves', 'cables', 'valves', 'filters'] * 10
+)]
+
+
+def query(text: str) -> list:
+    return FakeEmbeddingModel().encode([text])[0].tolist()
+
+
+def store(tmp_path, **kwargs) -> FaissManager:
+    return FaissManager(str(tmp_path / 'faiss'), FakeEmbeddingModel(), **kwargs)
+
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    vector_store = store(tmp_path)
+    vector_store.create_collection('manuals')
+    vector_store.upsert_points('manuals', points(TEXTS))
+    hits = vector_store.search('manuals', query(TEXTS[7]), limit=5)
+    assert hits[0].payload['text'] == TEXTS[7]
+    assert hits[0].score == pytest.approx(1.0, abs=1e-5)
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+    assert [collection.name for collection in vector_store.get_collections()] == ['manuals']
+    with pytest.raises(ValueError):
+        vector_store.create_collection('manuals')
+
+
+def test_replaced_and_deleted_points_are_not_found(tmp_path):
+    vector_store = store(tmp_path)
+    vector_store.create_collection('manuals')
+    stored = points(TEXTS[:6])
+    vector_store.upsert_points('manuals', stored)
+    replaced = dict(stored[0], payload={**stored[0]['payload'], 'text': 'replaced'})
+    vector_store.upsert_points('manuals', [replaced])
+    vector_store.delete_points('manuals', [stored[1]['id']])
+
+    hits = vector_store.search('manuals', query(TEXTS[0]), limit=10)
+    assert len(hits) == 5
+    assert [hit.payload['text'] for hit in hits if hit.id == stored[0]['id']] == ['replaced']
+    assert stored[1]['id'] not in {hit.id for hit in hits}
+
+
+def test_flushed_index_is_read_back(tmp_path):
+    vector_store = store(tmp_path)
+    vector_store.create_collection('manuals')
+    vector_store.upsert_points('manuals', points(TEXTS))
+    vector_store.flush('manuals')
+
+    reopened = store(tmp_path)
+    assert reopened.search('manuals', query(TEXTS[3]), limit=1)[0].payload['text'] == TEXTS[3]
+    reopened.delete_collection('manuals')
+    assert reopened.get_collections() == []
+
+
+@pytest.mark.parametrize('large_index_type', ['ivf', 'hnsw'])
+def test_large_projects_are_rebuilt_as_approximate_indexes(tmp_path, large_index_type):
+    vector_store = store(tmp_path, large_index_type=large_index_type, large_index_threshold=40, ivf_nprobe=64)
+    vector_store.create_collection('manuals')
+    stored = points(TEXTS)
+    vector_store.upsert_points('manuals', stored[:30])
+    vector_store.upsert_points('manuals', stored[30:])
+    vector_store.delete_points('manuals', [stored[5]['id']])
+
+    assert vector_store.search('manuals', query(TEXTS[42]), limit=1)[0].payload['text'] == TEXTS[42]
+    assert stored[5]['id'] not in {hit.id for hit in vector_store.search('manuals', query(TEXTS[5]), limit=10)}
+
+
+def test_searches_are_filtered_and_documents_deleted(tmp_path):
+    vector_store = store(tmp_path)
+    vector_store.create_collection('manuals')
+    vector_store.upsert_points('manuals', points(TEXTS[:6], 'Manual'))
+    vector_store.upsert_points('manuals', [dict(point, id=point['id'][:-2] + '99') for point in points(TEXTS[:1], 'Guide')])
+
+    filtered = vector_store.search(
+        'manuals', query(TEXTS[0]), limit=10, search_filter=SearchFilter(pdf_names=('Manual',), min_page=2, max_page=2)
+    )
+    assert {(hit.payload['pdf_name'], hit.payload['page']) for hit in filtered} == {('Manual', 2)}
+
+    vector_store.delete_document('manuals', 'Manual')
+    assert {hit.payload['pdf_name'] for hit in vector_store.search('manuals', query(TEXTS[0]), limit=10)} == {'Guide'}
@@ -0,0 +1,120 @@
+"""
+Tests of the streaming extract -> chunk -> embed -> upsert pipeline.
+"""
+
+import threading
+import time
+
+import pytest
+
+from conftest import FakeEmbeddingModel
+from ingestion_pipeline import IngestionPipeline
+from pdf_processor import NullEmitter
+from vector_store import VectorStore
+
+
+class RecordingStore(VectorStore):
+    """
+    Keeps the upserted points in memory. `upsert_points` can be replaced to delay or fail.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def upsert_points(self, project_id: str, points: list, on_batch=None, **kwargs):
+        self.batches.append(points)
+        if on_batch is not None:
+            on_batch(points)
+
+
+def make_chunks(count: int, drawn: list = None):
+    for index in range(count):
+        if drawn is not None:
+            drawn.append(index)
+        yield {"pdf_name": "Manual", "page": index // 4 + 1, "chunk_id": index % 4, "text": f"chunk number {index}"}
+
+
+def pipeline(store, **kwargs) -> IngestionPipeline:
+    return IngestionPipeline(FakeEmbeddingModel(), store, NullEmitter(), None, **kwargs)
+
+
+def test_chunks_are_embedded_and_upserted_in_batches():
+    store = RecordingStore()
+    stats = pipeline(store, batch_size=3, queue_size=1).run('manuals', make_chunks(10), 'hash')
+    # Batches that queue up while an upsert runs are sent together
+    assert all(len(batch) % 3 == 0 for batch in store.batches[:-1])
+    assert stats['chunks'] == stats['embedded'] == stats['upserted'] == 10
+    assert [point['payload']['text'] for batch in store.batches for point in batch] == [
+        f"chunk number {index}" for index in range(10)
+    ]
+    assert len(store.batches[0][0]['vector']) == FakeEmbeddingModel().dimension
+
+
+def test_a_slow_upsert_holds_back_the_chunking():
+    store = RecordingStore()
+    release = threading.Event()
+    drawn = []
+    upsert = store.upsert_points
+
+    def slow_upsert(project_id, points, **kwargs):
+        assert release.wait(5)
+        upsert(project_id, points, **kwargs)
+
+    store.upsert_points = slow_upsert
+    worker = threading.Thread(
+        target=pipeline(store, batch_size=2, queue_size=1).run, args=('manuals', make_chunks(100, drawn), 'hash')
+    )
+    worker.start()
+    worker.join(0.5)
+    # One batch in each queue, one being embedded, one being upserted and one being built
+    assert len(drawn) <= 2 * 5 + 1
+    release.set()
+    worker.join(5)
+    assert sum(len(batch) for batch in store.batches) == 100
+
+
+def test_a_failed_stage_stops_the_pipeline():
+    store = RecordingStore()
+    drawn = []
+
+    def failing_upsert(project_id, points, **kwargs):
+        raise ConnectionError("Qdrant is unavailable")
+
+    store.upsert_points = failing_upsert
+    with pytest.raises(ConnectionError):
+        pipeline(store, batch_size=2, queue_size=1).run('manuals', make_chunks(1000, drawn), 'hash')
+    assert len(drawn) < 1000
+
+
+def test_unchanged_chunks_are_not_embedded_again():
+    store = RecordingStore()
+    first = pipeline(store, batch_size=3)
+    first.run('manuals', make_chunks(6), 'hash')
+    assert len(first.chunk_points) == 6
+
+    store.batches.clear()
+    revised = list(make_chunks(6))
+    revised[4]['text'] = "a revised chunk"
+    second = pipeline(store, batch_size=3)
+    stats = second.run('manuals', iter(revised), 'revised hash', existing_points=first.chunk_points)
+    assert stats['unchanged'] == 5
+    assert second.model.encoded == 1
+    assert [point['payload']['text'] for batch in store.batches for point in batch] == ["a revised chunk"]
+    kept = {key: point for key, point in second.chunk_points.items() if key in first.chunk_points}
+    assert len(kept) == 5 and all(first.chunk_points[key] == point for key, point in kept.items())
+
+
+def test_waits_for_the_embed_queue_are_not_chunking_time():
+    store = RecordingStore()
+    upsert = store.upsert_points
+
+    def slow_upsert(project_id, points, **kwargs):
+        time.sleep(0.05)
+        upsert(project_id, points, **kwargs)
+
+    store.upsert_points = slow_upsert
+    started = time.perf_counter()
+    stats = pipeline(store, batch_size=2, queue_size=1).run('manuals', make_chunks(20), 'hash')
+
+    assert stats['upserted'] == 20
+    assert stats['chunk_seconds'] < (time.perf_counter() - started) / 2
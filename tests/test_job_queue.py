@@ -0,0 +1,176 @@
+"""
+Tests of the ingestion job queue.
+"""
+
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue, QueueFullError, JOB_DONE, JOB_EXPIRED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+from pdf_processor import NullEmitter
+
+
+def wait_for_status(queue: JobQueue, job_id: str, statuses: tuple, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while queue.get(job_id)['status'] not in statuses:
+        assert time.monotonic() < deadline, queue.get(job_id)
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_jobs_record_their_progress_and_outcome(tmp_path):
+    def handler(reporter, project_id, file_name, fail=False):
+        reporter.emit('processing_progress', {'progress': 50})
+        reporter.emit('status', {'message': 'Halfway'})
+        if fail:
+            raise ValueError("Not a PDF")
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), handler, NullEmitter(), workers=1)
+    done = queue.submit('manuals', 'manual.pdf')
+    failed = queue.submit('manuals', 'broken.pdf', fail=True)
+
+    job = wait_for_status(queue, done, (JOB_DONE,))
+    assert (job['progress'], job['message'], job['project_id'], job['file_name']) == (50, 'Halfway', 'manuals', 'manual.pdf')
+    assert job['run_seconds'] >= 0
+    assert wait_for_status(queue, failed, (JOB_FAILED,))['error'] == "Not a PDF"
+    assert queue.get('unknown') is None
+
+
+def test_a_full_queue_rejects_jobs(tmp_path):
+    release = threading.Event()
+    queue = JobQueue(str(tmp_path / 'jobs.db'), lambda *args, **kwargs: release.wait(5), NullEmitter(), workers=1, max_queued=2)
+    running = queue.submit('manuals', 'first.pdf')
+    wait_for_status(queue, running, (JOB_RUNNING,))
+    queue.submit('manuals', 'second.pdf')
+    queue.submit('manuals', 'third.pdf')
+    assert queue.queued_count() == 2
+    with pytest.raises(QueueFullError):
+        queue.submit('manuals', 'fourth.pdf')
+
+    # The bound counts the waiting jobs of every process sharing the job table
+    other = JobQueue(str(tmp_path / 'jobs.db'), lambda *args, **kwargs: None, NullEmitter(), max_queued=2)
+    assert other.queued_count() == 2
+    with pytest.raises(QueueFullError):
+        other.submit('reports', 'report.pdf')
+    release.set()
+
+
+def test_projects_take_turns(tmp_path):
+    release = threading.Event()
+    order = []
+
+    def handler(reporter, project_id, file_name):
+        order.append(file_name)
+        release.wait(5)
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), handler, NullEmitter(), workers=1)
+    first = queue.submit('manuals', 'manual 1')
+    wait_for_status(queue, first, (JOB_RUNNING,))
+    jobs = [queue.submit('manuals', 'manual 2'), queue.submit('manuals', 'manual 3'), queue.submit('reports', 'report 1')]
+    release.set()
+    for job_id in jobs:
+        wait_for_status(queue, job_id, (JOB_DONE,))
+    assert order == ['manual 1', 'manual 2', 'report 1', 'manual 3']
+
+
+def test_failed_jobs_resume_from_their_checkpoint(tmp_path):
+    checkpoints = []
+
+    def handler(reporter, project_id, file_name):
+        checkpoints.append(reporter.load_checkpoint())
+        reporter.checkpoint({'Manual/1/0': 'point-0'})
+        if len(checkpoints) == 1:
+            raise ConnectionError("Qdrant is unavailable")
+        reporter.emit('processing_complete', {'message': 'Done'})
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), handler, NullEmitter(), workers=1)
+    job_id = queue.submit('manuals', 'manual.pdf')
+    wait_for_status(queue, job_id, (JOB_FAILED,))
+
+    queue.resume(job_id)
+    assert wait_for_status(queue, job_id, (JOB_DONE,))['error'] is None
+    assert checkpoints == [{}, {'Manual/1/0': 'point-0'}]
+    assert queue.get_checkpoint(job_id) == {}
+    with pytest.raises(ValueError):
+        queue.resume(job_id)
+
+
+def test_resume_failed_job_once(tmp_path):
+    attempts = []
+    release = threading.Event()
+
+    def handler(reporter, project_id, file_name, **kwargs):
+        attempts.append(file_name)
+        if len(attempts) == 1:
+            raise ConnectionError("Qdrant is unavailable")
+        release.wait(5)
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), handler, NullEmitter(), workers=1)
+    job_id = queue.submit('manuals', 'manual.pdf')
+    assert wait_for_status(queue, job_id, (JOB_FAILED,))['error'] == "Qdrant is unavailable"
+
+    # Slow job reads widen the window between checking a job and queueing it
+    get = queue.get
+    queue.get = lambda job_id: time.sleep(0.05) or get(job_id)
+    results = []
+
+    def resume():
+        try:
+            queue.resume(job_id)
+            results.append('resumed')
+        except ValueError:
+            results.append('rejected')
+
+    threads = [threading.Thread(target=resume) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ['rejected'] * 7 + ['resumed']
+
+    queue.get = get
+    release.set()
+    assert wait_for_status(queue, job_id, (JOB_DONE,))['status'] == JOB_DONE
+    assert attempts == ['manual.pdf', 'manual.pdf']
+    with pytest.raises(ValueError):
+        queue.resume(job_id)
+
+
+def test_recovery_is_an_explicit_startup_step(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    release = threading.Event()
+    serving = JobQueue(db_path, lambda *args, **kwargs: release.wait(5), NullEmitter(), workers=1)
+    running = serving.submit('manuals', 'running.pdf')
+    wait_for_status(serving, running, (JOB_RUNNING,))
+    queued = serving.submit('manuals', 'queued.pdf')
+
+    # Another process opening the same job table, e.g. a command-line tool, leaves the jobs alone
+    other = JobQueue(db_path, lambda *args, **kwargs: None, NullEmitter())
+    assert other.get(running)['status'] == JOB_RUNNING
+    assert other.get(queued)['status'] == JOB_QUEUED
+
+    # A server starting after a crash fails the jobs that lost their worker
+    restarted = JobQueue(db_path, lambda *args, **kwargs: None, NullEmitter())
+    assert restarted.recover_interrupted() == 2
+    assert restarted.get(running)['status'] == JOB_FAILED
+    assert restarted.get(queued)['error'] == 'Interrupted by a server restart'
+    release.set()
+
+
+def test_failed_jobs_expire(tmp_path):
+    def handler(reporter, project_id, file_name, pdf_path):
+        reporter.checkpoint({'Manual/1/0': 'point-0'})
+        raise ConnectionError("Qdrant is unavailable")
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), handler, NullEmitter(), workers=1)
+    job_id = queue.submit('manuals', 'manual.pdf', pdf_path='uploads/manual.pdf')
+    wait_for_status(queue, job_id, (JOB_FAILED,))
+    assert queue.expire_failed(3600) == []
+
+    assert queue.expire_failed(0) == [{'pdf_path': 'uploads/manual.pdf'}]
+    assert queue.get(job_id)['status'] == JOB_EXPIRED
+    assert queue.get_checkpoint(job_id) == {}
+    assert queue.expire_failed(0) == []
+    with pytest.raises(ValueError):
+        queue.resume(job_id)
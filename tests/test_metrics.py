@@ -0,0 +1,57 @@
+"""
+Tests of the Prometheus metrics.
+"""
+
+import pytest
+
+from metrics import MetricsRegistry, span
+
+
+def test_metrics_are_rendered_in_the_text_format():
+    registry = MetricsRegistry()
+    pages = registry.counter('pages_total', 'Pages read')
+    queries = registry.counter('queries_total', 'Questions by outcome', ('outcome',))
+    registry.callback('queued', 'Queued jobs', lambda: {(): 3})
+
+    pages.inc(5)
+    queries.inc(outcome='answered')
+    queries.inc(outcome='answered')
+    queries.inc(outcome='say "no"')
+
+    assert registry.render().splitlines() == [
+        '# HELP pages_total Pages read',
+        '# TYPE pages_total counter',
+        'pages_total 5',
+        '# HELP queries_total Questions by outcome',
+        '# TYPE queries_total counter',
+        'queries_total{outcome="answered"} 2',
+        'queries_total{outcome="say \\"no\\""} 1',
+        '# HELP queued Queued jobs',
+        '# TYPE queued gauge',
+        'queued 3',
+    ]
+
+    with pytest.raises(ValueError):
+        queries.inc()
+    with pytest.raises(ValueError):
+        registry.counter('pages_total', 'Pages read again')
+
+
+def test_spans_fill_cumulative_buckets_even_when_the_block_raises():
+    registry = MetricsRegistry()
+    stages = registry.histogram('stage_seconds', 'Stage latency', ('stage',), buckets=(0.5, 1))
+    timings = {}
+
+    with span(stages, timings, stage='encode'):
+        pass
+    with pytest.raises(RuntimeError):
+        with span(stages, stage='encode'):
+            raise RuntimeError('failed')
+    stages.observe(0.75, stage='encode')
+
+    lines = registry.render().splitlines()
+    assert 'stage_seconds_bucket{stage="encode",le="0.5"} 2' in lines
+    assert 'stage_seconds_bucket{stage="encode",le="1"} 3' in lines
+    assert 'stage_seconds_bucket{stage="encode",le="+Inf"} 3' in lines
+    assert 'stage_seconds_count{stage="encode"} 3' in lines
+    assert timings['encode_ms'] >= 0
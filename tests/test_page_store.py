@@ -0,0 +1,76 @@
+"""
+Tests of the page store.
+"""
+
+import json
+import sqlite3
+import zlib
+
+from page_store import PageStore, _encode_page
+
+
+PAGES = [
+    ('Raw text. Second sentence.', 'Raw text. Second sentence.', ['Raw text.', 'Second sentence.']),
+    ('', None, None),
+    # A sentence that is not a substring of the cleaned text is stored as is
+    ('Odd page', 'Odd page', ['Odd', 'unmatched sentence']),
+]
+
+
+def test_pages_round_trip_per_hash_and_engine(tmp_path):
+    store = PageStore(str(tmp_path / 'pages.db'))
+    store.save('hash-1', 'pdfplumber', PAGES)
+
+    assert store.load('hash-1', 'pdfplumber') == PAGES
+    assert store.has('hash-1', 'pdfplumber')
+    assert not store.has('hash-1', 'pdfium')
+    assert store.load('hash-2', 'pdfplumber') is None
+
+    stats = store.stats()
+    assert (stats['documents'], stats['pages']) == (1, 3)
+    assert stats['stored_bytes'] > 0
+
+
+def test_prune_keeps_the_listed_documents(tmp_path):
+    store = PageStore(str(tmp_path / 'pages.db'))
+    store.save('hash-1', 'pdfplumber', PAGES)
+    store.save('hash-2', 'pdfplumber', PAGES)
+    store.save('hash-2', 'pdfium', PAGES)
+
+    assert store.prune({'hash-2'}) == 1
+    assert store.stats()['documents'] == 2
+    assert not store.has('hash-1', 'pdfplumber')
+
+
+def test_pages_are_written_as_they_are_appended(tmp_path):
+    store = PageStore(str(tmp_path / 'pages.db'))
+    writer = store.writer('hash-1', 'pdfplumber')
+    writer.pages_per_commit = 2
+    for page in PAGES:
+        writer.append(page)
+
+    # Two pages are written, but the document is only loaded once finished
+    assert writer._rows == [writer._rows[0]]
+    assert store.load('hash-1', 'pdfplumber') is None
+    assert store.stats()['documents'] == 0
+    writer.finish()
+    assert store.load('hash-1', 'pdfplumber') == PAGES
+
+    # A new record of the file replaces the old one
+    store.save('hash-1', 'pdfplumber', PAGES[:1])
+    assert store.load('hash-1', 'pdfplumber') == PAGES[:1]
+
+
+def test_document_records_of_earlier_versions_are_split_into_pages(tmp_path):
+    db_path = str(tmp_path / 'pages.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE pages (content_hash TEXT NOT NULL, engine TEXT NOT NULL, page_count INTEGER NOT NULL, "
+            "raw_bytes INTEGER NOT NULL, data BLOB NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (content_hash, engine))"
+        )
+        raw = json.dumps([_encode_page(page) for page in PAGES]).encode('utf-8')
+        conn.execute("INSERT INTO pages VALUES ('hash-1', 'pdfplumber', 3, ?, ?, 0)", (len(raw), zlib.compress(raw)))
+
+    store = PageStore(db_path)
+    assert store.load('hash-1', 'pdfplumber') == PAGES
+    assert PageStore(db_path).stats()['documents'] == 1
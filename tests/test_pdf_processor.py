@@ -0,0 +1,121 @@
+"""
+Tests of the PDF text extraction and chunking.
+"""
+
+import pytest
+
+import config
+import pdf_processor
+from conftest import MANUAL_PAGES, write_pdf
+from pdf_processor import NullEmitter, PDFProcessor, PdfiumExtractor, chunking_options, is_garbled, open_extractor
+
+
+def long_manual(path: str, copies: int = 3) -> str:
+    """
+    Writes the manual's pages several times, with a sentence running over a page break.
+    """
+    pages = [list(lines) for lines in MANUAL_PAGES * copies]
+    pages[3] = pages[3] + ["The controller then"]
+    pages[4] = ["waits ten seconds before the next attempt."] + pages[4]
+    write_pdf(path, pages)
+    return path
+
+
+def test_parallel_extraction_matches_the_sequential_chunks(tmp_path):
+    pdf_path = long_manual(str(tmp_path / 'long manual.pdf'))
+    sequential = PDFProcessor.chunk_pdf_text(pdf_path, 'long manual.pdf', NullEmitter(), None, max_words=20)
+    parallel = PDFProcessor.chunk_pdf_text(
+        pdf_path, 'long manual.pdf', NullEmitter(), None, max_words=20, workers=2, pages_per_task=2
+    )
+    assert parallel == sequential
+    assert {chunk['page'] for chunk in parallel} == set(range(1, 10))
+    assert any('The controller then waits ten seconds' in chunk['text'] for chunk in parallel)
+    assert {chunk['pdf_name'] for chunk in parallel} == {'LongManual'}
+
+
+def test_documents_share_one_pool_with_a_bounded_window(tmp_path, monkeypatch):
+    pdf_path = long_manual(str(tmp_path / 'long manual.pdf'))
+    pool = pdf_processor.extraction_pool(2)
+    submitted = []
+    submit = pool.submit
+    monkeypatch.setattr(pool, 'submit', lambda *args: submitted.append(args) or submit(*args))
+
+    pages = PDFProcessor._iter_pages_parallel(pdf_path, 9, workers=2, pages_per_task=1, engine='pdfplumber')
+    next(pages)
+    # Two page ranges per process, and one more once the first is taken
+    assert len(submitted) == 5
+    assert len(list(pages)) == 8
+    assert len(submitted) == 9
+
+    assert pdf_processor.extraction_pool(2) is pool
+
+
+def test_token_chunks_are_filled_up_to_the_limit_and_truncations_counted():
+    sentences = ['one two three.', 'four five.', 'six seven eight nine.', 'ten.']
+    stats = {}
+
+    chunks = PDFProcessor._chunk_sentences(
+        sentences, max_words=300, overlap_sentences=0, max_tokens=5,
+        token_counter=lambda texts: [len(text.split()) for text in texts], token_limit=3, stats=stats
+    )
+
+    assert chunks == ['one two three. four five.', 'six seven eight nine. ten.']
+    assert stats == {
+        'chunks': 2, 'tokens': 10, 'max_chunk_tokens': 5, 'truncated_chunks': 2, 'truncated_tokens': 4
+    }
+
+
+def test_word_chunks_are_not_tokenized():
+    def token_counter(texts):
+        raise AssertionError("Chunks sized by words are not tokenized")
+
+    stats = {}
+    chunks = PDFProcessor._chunk_sentences(
+        ['one two three.', 'four five.'], max_words=3, overlap_sentences=0,
+        token_counter=token_counter, token_limit=3, stats=stats
+    )
+
+    assert chunks == ['one two three.', 'four five.']
+    assert stats == {'chunks': 2}
+
+
+def test_pdfium_chunks_match_pdfplumber(tmp_path):
+    pdf_path = long_manual(str(tmp_path / 'long manual.pdf'))
+    pdfplumber_chunks = PDFProcessor.chunk_pdf_text(pdf_path, 'long manual.pdf', NullEmitter(), None, max_words=20)
+    pdfium_chunks = PDFProcessor.chunk_pdf_text(
+        pdf_path, 'long manual.pdf', NullEmitter(), None, max_words=20, engine='pdfium'
+    )
+    assert [chunk['text'].split() for chunk in pdfium_chunks] == [chunk['text'].split() for chunk in pdfplumber_chunks]
+
+
+def test_garbled_and_right_to_left_pages_fall_back_to_pdfplumber(tmp_path):
+    assert is_garbled('')
+    assert is_garbled('��� abc')
+    assert not is_garbled('Replace the pump seal.')
+    assert PdfiumExtractor.needs_fallback('שלום')
+
+    pdf_path = str(tmp_path / 'manual.pdf')
+    write_pdf(pdf_path, MANUAL_PAGES)
+    extractor = open_extractor(pdf_path, 'pdfium')
+    try:
+        extractor.raw_page_text = lambda page_index: '�' * 10
+        assert 'E-042' in extractor.page_text(1)
+        assert extractor.fallback_pages == 1
+    finally:
+        extractor.close()
+
+    with pytest.raises(ValueError, match='Unknown PDF text engine'):
+        open_extractor(pdf_path, 'poppler')
+
+
+def test_chunking_options_follow_the_size_unit(monkeypatch):
+    count = object()
+    monkeypatch.setattr(config, 'CHUNK_SIZE_UNIT', 'words')
+    assert chunking_options(254, count)['max_tokens'] is None
+
+    monkeypatch.setattr(config, 'CHUNK_SIZE_UNIT', 'tokens')
+    monkeypatch.setattr(config, 'CHUNK_MAX_TOKENS', 0)
+    assert chunking_options(254, count)['max_tokens'] == 254
+    monkeypatch.setattr(config, 'CHUNK_MAX_TOKENS', 128)
+    options = chunking_options(254, count)
+    assert (options['max_tokens'], options['token_limit'], options['token_counter']) == (128, 254, count)
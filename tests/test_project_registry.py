@@ -0,0 +1,35 @@
+"""
+Tests of the cached project registry.
+"""
+
+from project_registry import ProjectRegistry
+
+
+def test_projects_are_seeded_once_and_shared_between_processes(tmp_path):
+    db_path = str(tmp_path / 'projects.db')
+    seeded = []
+
+    def seed():
+        seeded.append(True)
+        return ['manuals']
+
+    registry = ProjectRegistry(db_path, ttl_seconds=0, seed=seed)
+    assert registry.list() == ['manuals']
+    assert registry.add('reports', 'int8')
+    assert not registry.add('reports')
+
+    # Another worker sees the change once its copy expires
+    other = ProjectRegistry(db_path, ttl_seconds=0, seed=seed)
+    other.remove('manuals')
+    assert registry.list() == ['reports']
+    assert seeded == [True]
+
+
+def test_the_project_list_is_served_from_memory_within_the_ttl(tmp_path):
+    db_path = str(tmp_path / 'projects.db')
+    registry = ProjectRegistry(db_path, ttl_seconds=3600)
+    registry.add('manuals')
+
+    ProjectRegistry(db_path).add('reports')
+    assert registry.list() == ['manuals']
+    assert not registry.exists('reports')
@@ -0,0 +1,208 @@
+"""
+Tests of the Qdrant vector store against the in-process Qdrant client.
+"""
+
+import threading
+
+import pytest
+import qdrant_client
+from qdrant_client.http.exceptions import UnexpectedResponse
+
+import config
+from conftest import FakeEmbeddingModel
+from qdrant_manager import POINT_OVERHEAD_BYTES, QdrantManager, SharedQdrantManager
+from vector_store import SearchFilter
+
+
+def points(count: int, pdf_name: str = 'Manual') -> list:
+    model = FakeEmbeddingModel()
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{index:012d}",
+            "vector": model.encode([f"chunk {index}"])[0].tolist(),
+            "payload": {"pdf_name": pdf_name, "page": index % 3 + 1, "chunk_id": index, "text": f"chunk {index}"}
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def profiled_store():
+    return QdrantManager(qdrant_client.QdrantClient(':memory:'), FakeEmbeddingModel(), storage_profiles=config.STORAGE_PROFILES)
+
+
+@pytest.mark.parametrize('profile', list(config.STORAGE_PROFILES))
+def test_collections_follow_their_storage_profile(profiled_store, profile):
+    # The in-process client ignores the storage settings, so the request is checked
+    requests = []
+    create_collection = profiled_store.client.create_collection
+
+    def recording_create_collection(**kwargs):
+        requests.append(kwargs)
+        return create_collection(**kwargs)
+
+    profiled_store.client.create_collection = recording_create_collection
+    profiled_store.create_collection('manuals', profile)
+    settings = config.STORAGE_PROFILES[profile]
+    request = requests[0]
+    assert request['vectors_config'].size == FakeEmbeddingModel().dimension
+    assert request['vectors_config'].on_disk == settings.get('vectors_on_disk', False)
+    assert request['on_disk_payload'] == settings.get('payload_on_disk', False)
+    quantization = request['quantization_config']
+    if settings.get('quantization') == 'scalar':
+        assert quantization.scalar.type == 'int8'
+    elif settings.get('quantization') == 'binary':
+        assert quantization.binary is not None
+    else:
+        assert quantization is None
+
+    profiled_store.upsert_points('manuals', points(6))
+    query = points(6)[4]['vector']
+    assert str(profiled_store.search('manuals', query, limit=1)[0].id) == points(6)[4]['id']
+
+
+def test_unknown_profiles_are_rejected(profiled_store):
+    with pytest.raises(ValueError):
+        profiled_store.create_collection('manuals', 'compressed')
+
+
+@pytest.fixture(params=['collections', 'shared'])
+def store(request):
+    if request.param == 'shared':
+        return SharedQdrantManager(qdrant_client.QdrantClient(':memory:'), FakeEmbeddingModel(), upsert_in_flight=2, upsert_backoff=0)
+    return QdrantManager(qdrant_client.QdrantClient(':memory:'), FakeEmbeddingModel(), upsert_in_flight=2, upsert_backoff=0)
+
+
+def test_storage_profiles_are_applied_to_per_project_collections_only(store):
+    store.storage_profiles = config.STORAGE_PROFILES
+    store.create_collection('manuals')
+    updates = []
+    store.client.update_collection = lambda **kwargs: updates.append(kwargs)
+
+    if isinstance(store, SharedQdrantManager):
+        with pytest.raises(ValueError, match='shared collection'):
+            store.apply_storage_profile('manuals', 'int8')
+        assert updates == []
+    else:
+        store.apply_storage_profile('manuals', 'int8')
+        assert updates[0]['collection_name'] == 'manuals'
+        assert updates[0]['quantization_config'].scalar.type == 'int8'
+
+
+def test_batches_are_bounded_by_count_and_size(store):
+    assert [len(batch) for batch in store._upsert_batches(points(5), max_points=2)] == [2, 2, 1]
+
+    store.upsert_max_bytes = 1
+    assert [len(batch) for batch in store._upsert_batches(points(3), max_points=10)] == [1, 1, 1]
+
+
+def test_point_size_is_estimated_from_the_vector_and_text(store):
+    point = {'id': 'a', 'vector': [0.1] * 384, 'payload': {'pdf_name': 'Manual', 'text': 'x' * 1000}}
+    assert store._point_bytes(point) == 384 * 4 + 1000 + POINT_OVERHEAD_BYTES
+
+
+def test_transient_upsert_failures_are_retried(store):
+    store.create_collection('manuals')
+    upsert = store.client.upsert
+    failures = []
+
+    def flaky_upsert(collection_name, points, wait=True):
+        if len(failures) < 2:
+            failures.append(collection_name)
+            raise ConnectionError("Qdrant is unavailable")
+        return upsert(collection_name=collection_name, points=points, wait=wait)
+
+    store.client.upsert = flaky_upsert
+    committed = []
+    store.upsert_points('manuals', points(6), batch_size=2, on_batch=committed.extend)
+
+    assert len(failures) == 2
+    assert sorted(point['payload']['chunk_id'] for point in committed) == list(range(6))
+    assert store.count_points('manuals') == 6
+
+
+def test_client_errors_are_not_retried(store):
+    store.create_collection('manuals')
+    attempts = []
+
+    def rejecting_upsert(collection_name, points, wait=True):
+        attempts.append(collection_name)
+        raise UnexpectedResponse(400, 'Bad Request', b'{}', {})
+
+    store.client.upsert = rejecting_upsert
+    with pytest.raises(UnexpectedResponse):
+        store.upsert_points('manuals', points(1))
+    assert len(attempts) == 1
+
+
+def test_searches_are_filtered_and_documents_deleted(store):
+    store.create_collection('manuals')
+    store.upsert_points('manuals', points(4, 'Manual'))
+    store.upsert_points('manuals', [dict(point, id=point['id'][:-2] + '99') for point in points(1, 'Guide')])
+    query = points(1)[0]['vector']
+
+    filtered = store.search('manuals', query, limit=10, search_filter=SearchFilter(pdf_names=('Manual',), min_page=2, max_page=2))
+    assert {(hit.payload['pdf_name'], hit.payload['page']) for hit in filtered} == {('Manual', 2)}
+    assert len(store.search_batch('manuals', [query, query], limit=10, search_filter=SearchFilter(pdf_names=('Guide',)))[1]) == 1
+
+    store.delete_document('manuals', 'Manual')
+    assert {hit.payload['pdf_name'] for hit in store.search('manuals', query, limit=10)} == {'Guide'}
+
+
+def test_projects_are_kept_apart(store):
+    store.create_collection('manuals')
+    store.create_collection('reports')
+    store.upsert_points('manuals', points(4, 'Manual'))
+    store.upsert_points('reports', points(3, 'Report'))
+    query = points(1)[0]['vector']
+
+    hits = store.search('manuals', query, limit=10)
+    assert {hit.payload['pdf_name'] for hit in hits} == {'Manual'}
+    assert {str(hit.id) for hit in hits} == {point['id'] for point in points(4)}
+    assert sorted(collection.name for collection in store.get_collections()) == ['manuals', 'reports']
+
+    store.delete_collection('manuals')
+    assert store.count_points('reports') == 3
+    assert [collection.name for collection in store.get_collections()] == ['reports']
+
+
+def test_on_batch_follows_each_committed_batch(store):
+    store.create_collection('manuals')
+    upsert = store.client.upsert
+    release = threading.Event()
+    committed = []
+
+    def slow_last_batch(collection_name, points, wait=True):
+        if any(point.payload['chunk_id'] == 5 for point in points):
+            # The last batch is only stored once the first ones were reported
+            assert release.wait(5)
+        return upsert(collection_name=collection_name, points=points, wait=wait)
+
+    def on_batch(batch):
+        committed.append([point['payload']['chunk_id'] for point in batch])
+        if len(committed) == 2:
+            release.set()
+
+    store.client.upsert = slow_last_batch
+    store.upsert_points('manuals', points(6), batch_size=2, on_batch=on_batch)
+    assert sorted(committed) == [[0, 1], [2, 3], [4, 5]]
+    assert committed[-1] == [4, 5]
+    assert store.count_points('manuals') == 6
+
+
+def test_failed_batch_raises_after_reporting_the_stored_ones(store):
+    store.create_collection('manuals')
+    upsert = store.client.upsert
+
+    def failing_upsert(collection_name, points, wait=True):
+        if any(point.payload['chunk_id'] == 4 for point in points):
+            raise ConnectionError("Qdrant is unavailable")
+        return upsert(collection_name=collection_name, points=points, wait=wait)
+
+    store.client.upsert = failing_upsert
+    store.upsert_retries = 0
+    committed = []
+    with pytest.raises(ConnectionError):
+        store.upsert_points('manuals', points(6), batch_size=2, on_batch=committed.extend)
+    assert {point['payload']['chunk_id'] for point in committed} <= {0, 1, 2, 3, 5}
+    assert 4 not in {point['payload']['chunk_id'] for point in committed}
@@ -0,0 +1,112 @@
+"""
+Tests of rebuild_project.py on every vector-store backend.
+"""
+
+import importlib
+import sys
+
+import pytest
+
+from conftest import upload
+
+
+@pytest.fixture
+def rebuild(backend):
+    """
+    rebuild_project.py bound to the app under test.
+    """
+    sys.modules.pop('rebuild_project', None)
+    yield importlib.import_module('rebuild_project')
+    sys.modules.pop('rebuild_project', None)
+
+
+def ask(client):
+    return client.post('/query_project', data={
+        'project_id': 'manuals', 'question': 'What does error code E-042 mean?', 'threshold': '0.0'
+    })
+
+
+def test_rebuild_chunks_the_stored_pages_again(backend, rebuild, manual_pdf, monkeypatch):
+    client = backend.client
+    assert upload(client, 'manuals', manual_pdf)['status'] == 'done'
+    documents = client.get('/documents?project_id=manuals').get_json()['documents']
+
+    # Smaller chunks give more points, without reading the PDF again
+    monkeypatch.setattr(backend.module.config, 'CHUNK_MAX_WORDS', 10)
+    monkeypatch.setattr(backend.module.PDFProcessor, 'extract_page_text', None)
+    assert rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=False)
+
+    rebuilt = client.get('/documents?project_id=manuals').get_json()['documents']
+    assert rebuilt[0]['chunk_count'] > documents[0]['chunk_count']
+    vector_store = backend.module.vector_store.get()
+    vector_store.flush('manuals')
+    assert len(list(vector_store.iter_points('manuals'))) == rebuilt[0]['chunk_count']
+
+    assert 'E-042' in ask(client).get_data(as_text=True)
+
+
+def test_rebuild_drops_the_cached_answers(backend, rebuild, manual_pdf):
+    client = backend.client
+    assert upload(client, 'manuals', manual_pdf)['status'] == 'done'
+    ask(client)
+    ask(client)
+    assert backend.completions.calls == 1
+
+    assert rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=False)
+    assert 'E-042' in ask(client).get_data(as_text=True)
+    assert backend.completions.calls == 2
+
+
+def test_projects_with_missing_pages_are_left_untouched(backend, rebuild, manual_pdf):
+    client = backend.client
+    assert upload(client, 'manuals', manual_pdf)['status'] == 'done'
+    backend.module.page_store.prune(set())
+
+    assert not rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=False)
+    assert client.get('/documents?project_id=manuals').get_json()['documents']
+
+    assert rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=True)
+    assert client.get('/documents?project_id=manuals').get_json()['documents'] == []
+
+
+def test_rebuild_refuses_a_vector_size_the_shared_collection_cannot_hold(backend, rebuild, manual_pdf):
+    client = backend.client
+    assert upload(client, 'manuals', manual_pdf)['status'] == 'done'
+    vector_store = backend.module.vector_store.get()
+    stored = len(list(vector_store.iter_points('manuals')))
+
+    backend.model.dimension = 16
+    rebuilt = rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=False)
+    if backend.module.config.QDRANT_LAYOUT == 'shared' and backend.module.config.VECTOR_STORE == 'qdrant':
+        assert not rebuilt
+        assert len(list(vector_store.iter_points('manuals'))) == stored
+        assert backend.module.document_registry.list_documents('manuals')
+    else:
+        # Collections of their own are created again with the new size
+        assert rebuilt
+        vector_store.flush('manuals')
+        assert len(list(vector_store.iter_points('manuals'))) == stored
+
+
+def test_a_failed_rebuild_leaves_the_project_as_it_was(backend, rebuild, manual_pdf, monkeypatch):
+    client = backend.client
+    assert upload(client, 'manuals', manual_pdf)['status'] == 'done'
+    documents = client.get('/documents?project_id=manuals').get_json()['documents']
+    vector_store = backend.module.vector_store.get()
+    stored = len(list(vector_store.iter_points('manuals')))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("embedding failed")
+
+    encode = backend.model.encode
+    monkeypatch.setattr(backend.module.config, 'CHUNK_MAX_WORDS', 10)
+    monkeypatch.setattr(backend.model, 'encode', fail)
+    assert not rebuild.rebuild_project('manuals', backend.model, batch_size=2, documents_at_once=1, drop_missing=False)
+
+    assert client.get('/documents?project_id=manuals').get_json()['documents'] == documents
+    assert len(list(vector_store.iter_points('manuals'))) == stored
+    staging_id = f"manuals{rebuild.STAGING_SUFFIX}"
+    assert staging_id not in [collection.name for collection in vector_store.get_collections()]
+    assert backend.module.lexical_index.search('manuals', 'E-042')
+    monkeypatch.setattr(backend.model, 'encode', encode)
+    assert 'E-042' in ask(client).get_data(as_text=True)
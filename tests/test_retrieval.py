@@ -0,0 +1,141 @@
+"""
+Tests of the BM25 lexical index and the hybrid retriever.
+"""
+
+import sqlite3
+
+import pytest
+
+from lexical_index import LexicalIndex
+from retrieval import HybridRetriever, reciprocal_rank_fusion
+from vector_store import SearchFilter, SearchHit
+
+
+def point(point_id, text, pdf_name='manual', page=1, chunk_id=0):
+    return {
+        'id': point_id,
+        'payload': {'pdf_name': pdf_name, 'page': page, 'chunk_id': chunk_id, 'text': text}
+    }
+
+
+class FixedStore:
+    """Vector store returning the same ranked hits for every search."""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def search(self, project_id, query_vector, limit=5, search_filter=None):
+        return self.hits[:limit]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LexicalIndex(str(tmp_path / 'lexical.db'))
+
+
+def test_identifiers_are_found_by_keyword(index):
+    index.add_points('manuals', [
+        point('a', 'Replace the seal of pump AB-123.', chunk_id=0),
+        point('b', 'Error code E-042 means the filter is blocked.', chunk_id=1),
+    ])
+    index.add_points('other', [point('c', 'Error code E-042 in another project.')])
+
+    hits = index.search('manuals', 'What does E-042 mean?')
+
+    assert [hit.id for hit in hits] == ['b']
+    assert hits[0].payload['chunk_id'] == 1
+
+
+def test_points_are_replaced_and_deleted(index):
+    index.add_points('manuals', [point('a', 'pump AB-123'), point('b', 'valve CD-456')])
+    index.add_points('manuals', [point('a', 'pump XY-789')])
+
+    assert index.search('manuals', 'AB-123') == []
+    assert [hit.id for hit in index.search('manuals', 'XY-789')] == ['a']
+
+    index.delete_points('manuals', ['a'])
+    assert index.search('manuals', 'XY-789') == []
+
+    index.delete_project('manuals')
+    assert index.search('manuals', 'CD-456') == []
+
+
+def test_keyword_searches_are_filtered_by_document_and_page(index):
+    index.add_points('manuals', [
+        point('a', 'Error code E-042 in the manual.', pdf_name='Manual', page=2),
+        point('b', 'Error code E-042 in the guide.', pdf_name='Guide', page=2),
+        point('c', 'Error code E-042 on another page.', pdf_name='Guide', page=5),
+    ])
+
+    hits = index.search('manuals', 'E-042', search_filter=SearchFilter(pdf_names=('Guide',), max_page=3))
+    assert [hit.id for hit in hits] == ['b']
+
+    index.delete_document('manuals', 'Guide')
+    assert [hit.id for hit in index.search('manuals', 'E-042')] == ['a']
+
+
+def test_each_project_has_its_own_term_statistics(index):
+    index.add_points('manuals', [point('a', 'pump seal'), point('b', 'pump valve'), point('c', 'pump filter')])
+    index.add_points('reports', [point('d', 'pump seal')])
+    scores = {hit.id: hit.score for hit in index.search('reports', 'pump')}
+
+    # A term in every chunk of a project is not evidence, however rare it is elsewhere
+    index.add_points('other', [point(f'x{i}', f'gasket {i}') for i in range(50)])
+    assert {hit.id: hit.score for hit in index.search('reports', 'pump')} == scores
+
+    with sqlite3.connect(index.db_path) as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid, text FROM points WHERE project_id = ? AND point_id = ?", ('reports', 'd')
+        ).fetchall()
+    assert 'USING INDEX' in plan[0][-1]
+
+
+def test_indexes_of_the_shared_table_are_moved_to_project_tables(tmp_path):
+    db_path = str(tmp_path / 'lexical.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE VIRTUAL TABLE chunks USING fts5(point_id UNINDEXED, project_id UNINDEXED, "
+            "pdf_name UNINDEXED, page UNINDEXED, chunk_id UNINDEXED, text)"
+        )
+        conn.execute("INSERT INTO chunks VALUES ('a', 'manuals', 'Manual', 3, 1, 'Error code E-042')")
+
+    hits = LexicalIndex(db_path).search('manuals', 'E-042')
+    assert [(hit.id, hit.payload['page']) for hit in hits] == [('a', 3)]
+
+
+def test_queries_leave_out_stopwords_and_short_terms(tmp_path):
+    index = LexicalIndex(str(tmp_path / 'lexical.db'), stopwords=frozenset({'what', 'does', 'the'}))
+    assert index.build_query('What does the E-042 code mean on a V2 pump?') == '"e-042" OR "code" OR "mean" OR "v2" OR "pump"'
+    assert index.build_query('What does the') == ''
+
+
+def test_reciprocal_rank_fusion_prefers_hits_in_both_lists():
+    dense = [SearchHit('a', 0.9, {}), SearchHit('b', 0.8, {})]
+    lexical = [SearchHit('b', 5.0, {}), SearchHit('c', 4.0, {})]
+
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+
+    assert [hit.id for hit, _, _ in fused] == ['b', 'a', 'c']
+    assert fused[0][2] == [2, 1]
+    assert fused[2][2] == [None, 2]
+
+
+def test_dense_hits_below_the_threshold_are_dropped(index):
+    index.add_points('manuals', [point('c', 'Error code E-042')])
+    store = FixedStore([SearchHit('a', 0.9, {'text': 'a'}), SearchHit('b', 0.1, {'text': 'b'})])
+    retriever = HybridRetriever(store, index)
+
+    results, timings = retriever.retrieve('manuals', 'E-042', [0.0], threshold=0.5)
+
+    assert {result['chunk']['text'] for result in results} == {'a', 'Error code E-042'}
+    assert set(timings) == {'dense_ms', 'lexical_ms', 'fusion_ms'}
+
+
+def test_weak_keyword_hits_alone_are_not_results(index):
+    index.add_points('manuals', [point(str(i), f'pump {i}') for i in range(5)] + [point('e', 'Error code E-042')])
+    retriever = HybridRetriever(FixedStore([SearchHit('a', 0.1, {'text': 'a'})]), index, lexical_min_score=1.0)
+
+    results, _ = retriever.retrieve('manuals', 'pump', [0.0], threshold=0.5)
+    assert results == []
+    results, _ = retriever.retrieve('manuals', 'E-042', [0.0], threshold=0.5)
+    assert [result['chunk']['text'] for result in results] == ['Error code E-042']
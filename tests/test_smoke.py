@@ -0,0 +1,181 @@
+"""
+End-to-end smoke tests of every vector-store backend through the Flask routes.
+"""
+
+import json
+import os
+
+from conftest import upload, wait_for_job
+
+
+def query(client, project_id: str, question: str, **fields):
+    return client.post('/query_project', data={
+        'project_id': project_id, 'question': question, 'threshold': '0.0', **fields
+    })
+
+
+def test_upload_and_query(backend, manual_pdf):
+    client = backend.client
+    assert client.post('/add_project', data={'project_id': 'manuals'}).status_code == 200
+
+    job = upload(client, 'manuals', manual_pdf)
+    assert job['status'] == 'done', job
+    assert job['progress'] == 100
+
+    response = query(client, 'manuals', 'What does error code E-042 mean?')
+    assert response.status_code == 200
+    assert 'E-042' in response.get_data(as_text=True)
+    assert backend.completions.calls == 1
+
+    # The same question is answered from the answer cache
+    assert 'E-042' in query(client, 'manuals', 'What does error code E-042 mean?').get_data(as_text=True)
+    assert backend.completions.calls == 1
+
+    exposition = client.get('/metrics').get_data(as_text=True)
+    assert 'pdf_ingested_documents_total{outcome="ingested"} 1' in exposition
+    assert 'pdf_llm_tokens_total{kind="prompt"} 100' in exposition
+    assert 'pdf_query_stage_seconds_count{route="query",stage="total"} 2' in exposition
+
+    # Uploading the same file again changes nothing
+    assert upload(client, 'manuals', manual_pdf)['message'] == 'PDF is already up to date'
+
+    assert client.post('/delete_project', data={'project_id': 'manuals'}).status_code == 200
+    assert client.get('/jobs/unknown').status_code == 404
+
+
+def test_uploads_beyond_the_queue_bound_are_rejected(backend, manual_pdf, monkeypatch):
+    monkeypatch.setattr(backend.module.job_queue, 'max_queued', 0)
+    with open(manual_pdf, 'rb') as source:
+        response = backend.client.post('/upload_pdf', data={
+            'project_id': 'manuals', 'file': (source, 'manual.pdf')
+        }, content_type='multipart/form-data')
+    assert response.status_code == 429
+
+
+def test_projects_are_added_with_a_known_storage_profile(backend):
+    client = backend.client
+    response = client.post('/add_project', data={'project_id': 'manuals', 'storage_profile': 'compressed'})
+    assert response.status_code == 400
+    assert client.post('/add_project', data={'project_id': 'manuals', 'storage_profile': 'int8'}).status_code == 200
+    assert 'manuals' in client.get('/').get_data(as_text=True)
+
+
+def test_answers_are_streamed_as_server_sent_events(backend, manual_pdf):
+    client = backend.client
+    client.post('/add_project', data={'project_id': 'manuals'})
+    upload(client, 'manuals', manual_pdf)
+
+    response = client.post('/query_project_stream', data={
+        'project_id': 'manuals', 'question': 'What does error code E-042 mean?', 'threshold': '0.0'
+    })
+    assert response.mimetype == 'text/event-stream'
+
+    events = [
+        (block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+        for block in response.get_data(as_text=True).strip().split('\n\n')
+    ]
+    names = [name for name, _ in events]
+    assert names[0] == 'sources' and names[-1] == 'done'
+    assert any('E-042' in result['chunk']['text'] for result in events[0][1]['results'])
+    assert ''.join(data['text'] for name, data in events if name == 'token') == backend.completions.answer
+    assert events[-1][1]['ttft_ms'] is not None
+
+
+def test_question_batches_are_answered_per_project(backend, manual_pdf):
+    client = backend.client
+    client.post('/add_project', data={'project_id': 'manuals'})
+    upload(client, 'manuals', manual_pdf)
+
+    response = client.post('/query_batch', json={
+        'project_id': 'manuals',
+        'threshold': 0.0,
+        'questions': [
+            'What does error code E-042 mean?',
+            {'question': 'Which gloves are needed?', 'project_id': 'unknown'},
+            {'question': 'How is the pump serviced?', 'threshold': 1.01},
+        ]
+    })
+    assert response.status_code == 200
+    results = response.get_json()['results']
+
+    assert results[0]['answer'] == backend.completions.answer
+    assert any('E-042' in result['chunk']['text'] for result in results[0]['results'])
+    assert results[1]['error'] == "Project 'unknown' does not exist."
+    assert 'answer' in results[2]
+
+    assert client.post('/query_batch', json={'questions': []}).status_code == 400
+
+
+def test_failed_uploads_can_be_resumed(backend, manual_pdf, monkeypatch):
+    client = backend.client
+    client.post('/add_project', data={'project_id': 'manuals'})
+    vector_store = backend.module.vector_store
+    upsert_points = vector_store.upsert_points
+    calls = []
+
+    def failing_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ConnectionError("Qdrant is unavailable")
+        return upsert_points(*args, **kwargs)
+
+    monkeypatch.setattr(vector_store, 'upsert_points', failing_once)
+    job = upload(client, 'manuals', manual_pdf)
+    assert job['status'] == 'failed', job
+
+    response = client.post(f"/jobs/{job['id']}/resume")
+    assert response.status_code == 202
+    assert wait_for_job(client, job['id'])['status'] == 'done'
+    assert client.post(f"/jobs/{job['id']}/resume").status_code == 409
+    assert 'E-042' in query(client, 'manuals', 'What does error code E-042 mean?').get_data(as_text=True)
+
+
+def test_failed_uploads_expire(backend, manual_pdf, monkeypatch):
+    client = backend.client
+    client.post('/add_project', data={'project_id': 'manuals'})
+
+    def failing(*args, **kwargs):
+        raise ConnectionError("Qdrant is unavailable")
+
+    monkeypatch.setattr(backend.module.vector_store, 'upsert_points', failing)
+    job = upload(client, 'manuals', manual_pdf)
+    assert job['status'] == 'failed', job
+    upload_folder = backend.module.app.config['UPLOAD_FOLDER']
+    assert len(os.listdir(upload_folder)) == 1
+
+    monkeypatch.setattr(backend.module.config, 'FAILED_JOB_RETENTION_HOURS', 0)
+    backend.module.expire_failed_uploads()
+    assert os.listdir(upload_folder) == []
+    assert client.get(f"/jobs/{job['id']}").get_json()['status'] == 'expired'
+    assert client.post(f"/jobs/{job['id']}/resume").status_code == 409
+
+
+def test_questions_are_filtered_and_documents_deleted(backend, manual_pdf, tmp_path):
+    client = backend.client
+    client.post('/add_project', data={'project_id': 'manuals'})
+    upload(client, 'manuals', manual_pdf)
+    upload(client, 'manuals', manual_pdf, file_name='pump guide.pdf')
+
+    documents = client.get('/documents?project_id=manuals').get_json()['documents']
+    assert [document['pdf_name'] for document in documents] == ['Manual', 'PumpGuide']
+
+    response = query(client, 'manuals', 'What does error code E-042 mean?', documents='PumpGuide', page_from='2', page_to='2')
+    page = response.get_data(as_text=True)
+    assert 'E-042' in page
+    assert 'Manual' not in page.replace(backend.completions.answer, '')
+    assert query(client, 'manuals', 'E-042?', page_from='two').status_code == 400
+
+    assert client.post('/delete_document', data={'project_id': 'manuals', 'pdf_name': 'PumpGuide'}).status_code == 200
+    assert [d['pdf_name'] for d in client.get('/documents?project_id=manuals').get_json()['documents']] == ['Manual']
+    # The same file stored under two names has points of its own under each
+    assert 'E-042' in query(client, 'manuals', 'What does error code E-042 mean?', documents='Manual').get_data(as_text=True)
+
+    # A new revision under another name replaces the old document
+    job = upload(client, 'manuals', manual_pdf, file_name='manual v2.pdf', replaces='Manual')
+    assert job['status'] == 'done', job
+    assert [d['pdf_name'] for d in client.get('/documents?project_id=manuals').get_json()['documents']] == ['ManualV2']
+    response = client.post('/query_batch', json={
+        'project_id': 'manuals', 'threshold': 0.0, 'answer': False,
+        'questions': ['What does error code E-042 mean?']
+    })
+    assert {r['chunk']['pdf_name'] for r in response.get_json()['results'][0]['results']} == {'ManualV2'}
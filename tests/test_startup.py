@@ -0,0 +1,94 @@
+"""
+Tests of the lazy component initialization, the NLTK data check and the server settings.
+"""
+
+import os
+import runpy
+import threading
+
+import nltk
+import pytest
+
+import config
+from conftest import import_app
+from startup import Lazy, ensure_nltk_data, memory_usage
+
+
+def test_lazy_objects_are_created_once_on_first_use():
+    created = []
+    release = threading.Event()
+
+    def factory():
+        created.append(threading.current_thread().name)
+        release.wait(5)
+        return {'name': 'model'}
+
+    lazy = Lazy('model', factory)
+    assert not lazy.loaded
+
+    threads = [threading.Thread(target=lazy.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert lazy.loaded
+    assert lazy.get()['name'] == 'model'
+    # Attributes are forwarded to the object
+    assert list(lazy.keys()) == ['name']
+
+
+def test_local_nltk_data_is_used_without_downloading(monkeypatch, tmp_path):
+    downloads = []
+    monkeypatch.setattr(nltk, 'download', lambda resource, **kwargs: downloads.append(resource))
+    monkeypatch.setattr(nltk.data, 'path', list(nltk.data.path))
+
+    ensure_nltk_data(('punkt_tab',))
+    assert downloads == []
+
+    with pytest.raises(RuntimeError, match='nltk.downloader not_a_corpus'):
+        ensure_nltk_data(('corpora/not_a_corpus',), data_dir=str(tmp_path))
+    assert downloads == ['not_a_corpus']
+    downloads.clear()
+
+    with pytest.raises(RuntimeError, match='not_a_resource'):
+        ensure_nltk_data(('not_a_resource',), data_dir=str(tmp_path), download=False)
+    assert downloads == []
+    assert nltk.data.path[0] == str(tmp_path)
+
+    with pytest.raises(RuntimeError):
+        ensure_nltk_data(('not_a_resource',), data_dir=str(tmp_path))
+    assert downloads == ['not_a_resource']
+
+
+def test_memory_usage_is_reported_in_megabytes():
+    usage = memory_usage()
+    assert set(usage) == {'rss_mb', 'pss_mb'}
+    assert usage['rss_mb'] is None or usage['rss_mb'] > 0
+
+
+def test_server_workers_share_the_embedding_processes(monkeypatch, tmp_path):
+    app = import_app(str(tmp_path), monkeypatch).module
+    monkeypatch.setattr(os, 'cpu_count', lambda: 16)
+    monkeypatch.setattr(config, 'EMBEDDING_POOL_THREADS', 2)
+    monkeypatch.setattr(config, 'EMBEDDING_POOL_WORKERS', 8)
+
+    assert app.embedding_pool_workers(1) == 8
+    assert app.embedding_pool_workers(2) == 4
+    assert app.embedding_pool_workers(16) == 1
+    # No more processes than the worker's share of the cores
+    monkeypatch.setattr(config, 'EMBEDDING_POOL_WORKERS', 32)
+    assert app.embedding_pool_workers(4) == 2
+
+
+def test_gunicorn_refuses_faiss_with_several_workers(monkeypatch):
+    conf = os.path.join(os.path.dirname(config.__file__), 'gunicorn.conf.py')
+    monkeypatch.setattr(config, 'VECTOR_STORE', 'faiss')
+    monkeypatch.setattr(config, 'SERVER_WORKERS', 2)
+    with pytest.raises(RuntimeError, match='SERVER_WORKERS = 1'):
+        runpy.run_path(conf)
+
+    monkeypatch.setattr(config, 'SERVER_WORKERS', 1)
+    assert runpy.run_path(conf)['workers'] == 1